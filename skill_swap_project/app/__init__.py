@@ -1,21 +1,24 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from flask_socketio import SocketIO
-from flask_migrate import Migrate
 from flask_bcrypt import Bcrypt
 import os
 from dotenv import load_dotenv
+from .utils.rate_limit import RateLimiter
+from .utils.server_session import init_server_sessions
+from .utils.replicas import RoutingSession, replicas
+from .utils.pool_metrics import InstrumentedQueuePool, pool_metrics
+from .utils.metrics import InstrumentedSocketIO, metrics
 
 # Load environment variables
 load_dotenv()
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
-socketio = SocketIO()
-migrate = Migrate()
+socketio = InstrumentedSocketIO()
 bcrypt = Bcrypt()
+limiter = RateLimiter()
 
 def create_app(config_name='development'):
     """Application factory pattern"""
@@ -30,21 +33,135 @@ def create_app(config_name='development'):
         app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
     
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    
+    # Connection pool per worker and bind (sizes, waits and lifetimes are published on /metrics/db-pool)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),  # Below MySQL's wait_timeout
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+    }
+    if app.config['SQLALCHEMY_DATABASE_URI'] in ('sqlite://', 'sqlite:///:memory:'):
+        # In-memory SQLite runs on a single static connection, so pool options do not apply
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+    
+    # Read replicas (comma-separated URLs); read-only requests use one that has caught up
+    replica_urls = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    app.config['SQLALCHEMY_BINDS'] = {f'replica_{i}': url for i, url in enumerate(replica_urls, 1)}
+    app.config['REPLICA_BINDS'] = list(app.config['SQLALCHEMY_BINDS'])
+    app.config['REPLICA_MAX_LAG'] = float(os.environ.get('REPLICA_MAX_LAG', 5))
+    app.config['REPLICA_CHECK_INTERVAL'] = float(os.environ.get('REPLICA_CHECK_INTERVAL', 1))
+    app.config['REPLICA_SQLITE_SYNC_INTERVAL'] = float(os.environ.get('REPLICA_SQLITE_SYNC_INTERVAL', 0))
+    
     app.config['UPLOAD_FOLDER'] = os.path.join(app.root_path, 'static', 'uploads')
+    app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
+    app.config['MAX_PHOTO_BYTES'] = int(os.environ.get('MAX_PHOTO_BYTES', 5 * 1024 * 1024))
+    
+    # Platform broadcast fan-out (sockets are spread over shard rooms, emitted in paced batches)
+    app.config['PLATFORM_BROADCAST_SHARDS'] = int(os.environ.get('PLATFORM_BROADCAST_SHARDS', 64))
+    app.config['PLATFORM_BROADCAST_BATCH'] = int(os.environ.get('PLATFORM_BROADCAST_BATCH', 8))
+    app.config['PLATFORM_BROADCAST_PAUSE'] = float(os.environ.get('PLATFORM_BROADCAST_PAUSE', 0.05))
+    
+    # Password hashing (hashes with other parameters are upgraded on login)
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
     
-    # Session configuration
-    app.config['SESSION_TYPE'] = 'filesystem'
+    # Rate limiting ('memory' per process, or 'sqlite' shared by all workers on a host)
+    app.config['RATE_LIMIT_ENABLED'] = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+    app.config['RATE_LIMIT_BACKEND'] = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+    app.config['RATE_LIMIT_SQLITE_PATH'] = os.environ.get('RATE_LIMIT_SQLITE_PATH')
+    
+    # Bloom filter over registered emails (sized for growth, built and refreshed in the background)
+    app.config['EMAIL_BLOOM_CAPACITY'] = int(os.environ.get('EMAIL_BLOOM_CAPACITY', 1000000))
+    app.config['EMAIL_BLOOM_ERROR_RATE'] = float(os.environ.get('EMAIL_BLOOM_ERROR_RATE', 0.01))
+    app.config['EMAIL_BLOOM_REFRESH_INTERVAL'] = int(os.environ.get('EMAIL_BLOOM_REFRESH_INTERVAL', 5))
+    app.config['EMAIL_BLOOM_REFRESH_OVERLAP'] = int(os.environ.get('EMAIL_BLOOM_REFRESH_OVERLAP', 1000))  # Ids re-read for out-of-order commits
+    app.config['EMAIL_BLOOM_REBUILD_INTERVAL'] = int(os.environ.get('EMAIL_BLOOM_REBUILD_INTERVAL', 3600))
+    
+    # Identity cache for Flask-Login's user_loader
+    app.config['IDENTITY_CACHE_SIZE'] = int(os.environ.get('IDENTITY_CACHE_SIZE', 10000))
+    app.config['IDENTITY_CACHE_TTL'] = int(os.environ.get('IDENTITY_CACHE_TTL', 60))
+    app.config['IDENTITY_CACHE_STAMP'] = os.environ.get('IDENTITY_CACHE_STAMP')
+    
+    # Session configuration ('sqlite' keeps sessions server-side, 'cookie' uses Flask's signed cookie)
+    app.config['SESSION_TYPE'] = os.environ.get('SESSION_TYPE', 'sqlite')
+    app.config['SESSION_SQLITE_PATH'] = os.environ.get('SESSION_SQLITE_PATH')
+    app.config['SESSION_SWEEP_INTERVAL'] = 300  # Seconds between expired-session sweeps
+    app.config['SESSION_SWEEP_BATCH_SIZE'] = 1000
     app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # 1 hour
     
+    # Static assets are fingerprinted by content hash and served with immutable caching
+    app.config['ASSET_FINGERPRINTING'] = os.environ.get('ASSET_FINGERPRINTING', '1') == '1'
+    
+    # Release id mixed into conditional GET ETags with the asset manifest hash (set per deploy, e.g. the git SHA)
+    app.config['APP_VERSION'] = os.environ.get('APP_VERSION', '')
+    
+    # Per-request query counting (Server-Timing header, N+1 warnings in the log)
+    app.config['QUERY_STATS_ENABLED'] = os.environ.get('QUERY_STATS_ENABLED', '1') == '1'
+    app.config['QUERY_N_PLUS_ONE_THRESHOLD'] = int(os.environ.get('QUERY_N_PLUS_ONE_THRESHOLD', 5))
+    
+    # Prometheus metrics on /metrics (admins, or scrapers with "Authorization: Bearer $METRICS_TOKEN")
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') == '1'
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    
+    # Head-sampled request tracing, appended as JSON lines (default: instance/traces.jsonl)
+    app.config['TRACE_SAMPLE_RATE'] = float(os.environ.get('TRACE_SAMPLE_RATE', 0.01))
+    app.config['TRACE_FILE'] = os.environ.get('TRACE_FILE')
+    app.config['TRACE_FILE_MAX_BYTES'] = int(os.environ.get('TRACE_FILE_MAX_BYTES', 50 * 1024 * 1024))  # Then rotated to TRACE_FILE.1
+    app.config['TRACE_TRUSTED_SOURCES'] = os.environ.get('TRACE_TRUSTED_SOURCES', '')  # Addresses/networks whose traceparent sampled flag is honored
+    
+    # On-demand CPU/memory profiling of every worker (admin API, jobs picked up after requests)
+    app.config['PROFILER_ENABLED'] = os.environ.get('PROFILER_ENABLED', '1') == '1'
+    app.config['PROFILER_POLL_INTERVAL'] = float(os.environ.get('PROFILER_POLL_INTERVAL', 2))
+    app.config['PROFILER_MAX_SECONDS'] = int(os.environ.get('PROFILER_MAX_SECONDS', 60))
+    
+    # Deleted accounts are purged in the background, in batches with a pause in between
+    app.config['ACCOUNT_PURGE_BATCH_SIZE'] = int(os.environ.get('ACCOUNT_PURGE_BATCH_SIZE', 500))
+    app.config['ACCOUNT_PURGE_PAUSE'] = float(os.environ.get('ACCOUNT_PURGE_PAUSE', 0.05))
+    
+    # Closed swaps and their chat move to compressed archive rows after SWAP_ARCHIVE_AFTER_DAYS
+    app.config['SWAP_ARCHIVE_ENABLED'] = os.environ.get('SWAP_ARCHIVE_ENABLED', '1') == '1'
+    app.config['SWAP_ARCHIVE_AFTER_DAYS'] = int(os.environ.get('SWAP_ARCHIVE_AFTER_DAYS', 180))
+    app.config['SWAP_ARCHIVE_BATCH_SIZE'] = int(os.environ.get('SWAP_ARCHIVE_BATCH_SIZE', 200))
+    app.config['SWAP_ARCHIVE_PAUSE'] = float(os.environ.get('SWAP_ARCHIVE_PAUSE', 0.1))
+    app.config['SWAP_ARCHIVE_INTERVAL'] = int(os.environ.get('SWAP_ARCHIVE_INTERVAL', 3600))
+    
+    # "Recommended for you" lists, precomputed in the background for users whose inputs changed
+    app.config['RECOMMENDATIONS_ENABLED'] = os.environ.get('RECOMMENDATIONS_ENABLED', '1') == '1'
+    app.config['RECOMMENDATIONS_PER_USER'] = int(os.environ.get('RECOMMENDATIONS_PER_USER', 10))
+    app.config['RECOMMENDATION_CANDIDATE_LIMIT'] = int(os.environ.get('RECOMMENDATION_CANDIDATE_LIMIT', 500))
+    app.config['RECOMMENDATION_BATCH_SIZE'] = int(os.environ.get('RECOMMENDATION_BATCH_SIZE', 100))
+    app.config['RECOMMENDATION_MAX_AGE'] = int(os.environ.get('RECOMMENDATION_MAX_AGE', 86400))
+    app.config['RECOMMENDATION_REFRESH_INTERVAL'] = int(os.environ.get('RECOMMENDATION_REFRESH_INTERVAL', 60))
+    
+    # Swap funnel time-in-state sketches are merged into the database in the background this often (seconds)
+    app.config['SWAP_FUNNEL_FLUSH_INTERVAL'] = int(os.environ.get('SWAP_FUNNEL_FLUSH_INTERVAL', 60))
+    
+    # Trending skills: per-bucket event counts kept in memory for a week, merged across workers by a background flush
+    app.config['TRENDING_BUCKET_SECONDS'] = int(os.environ.get('TRENDING_BUCKET_SECONDS', 300))
+    app.config['TRENDING_FLUSH_INTERVAL'] = int(os.environ.get('TRENDING_FLUSH_INTERVAL', 30))
+    app.config['TRENDING_TOP_K'] = int(os.environ.get('TRENDING_TOP_K', 50))
+    app.config['TRENDING_REFRESH_OVERLAP'] = int(os.environ.get('TRENDING_REFRESH_OVERLAP', 120))  # Covers late commits and clock skew
+    
+    # Rendered fragment cache (user cards, profile sections), per process
+    app.config['FRAGMENT_CACHE_ENABLED'] = os.environ.get('FRAGMENT_CACHE_ENABLED', '1') == '1'
+    app.config['FRAGMENT_CACHE_MAX_BYTES'] = int(os.environ.get('FRAGMENT_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    
     # Ensure upload directory exists
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
+    # Server-side session store
+    init_server_sessions(app)
+    
     # Initialize extensions with app
     db.init_app(app)
+    replicas.init_app(app)
+    pool_metrics.init_app(app)
     login_manager.init_app(app)
     socketio.init_app(app, cors_allowed_origins="*")
-    migrate.init_app(app, db)
     bcrypt.init_app(app)
+    limiter.init_app(app)
     
     # Configure login manager
     login_manager.login_view = 'auth.login'
@@ -58,6 +175,7 @@ def create_app(config_name='development'):
     from .routes.swaps import swaps_bp
     from .routes.admin import admin_bp
     from .routes.feedback import feedback_bp
+    from .routes.metrics import metrics_bp
     
     app.register_blueprint(main_bp)
     app.register_blueprint(auth_bp)
@@ -65,12 +183,63 @@ def create_app(config_name='development'):
     app.register_blueprint(swaps_bp)
     app.register_blueprint(admin_bp)
     app.register_blueprint(feedback_bp)
+    app.register_blueprint(metrics_bp)
+    
+    # Fingerprinted, precompressed static assets (asset_url() in templates)
+    from .utils.assets import assets
+    assets.init_app(app)
+    
+    # Query counter and N+1 detector
+    from .utils.query_stats import query_stats
+    query_stats.init_app(app)
+    
+    # Request latency, status and query histograms
+    metrics.init_app(app)
+    
+    # Sampled traces of requests, views, templates, queries and emits
+    from .utils.tracing import tracer
+    tracer.init_app(app)
     
     # Import models to ensure they're registered with SQLAlchemy
-    from .models import user, skill, user_skill, swap_request, feedback, availability, admin, chat
+    from .models import user, skill, user_skill, swap_request, feedback, availability, admin, chat, swap_metrics, platform_message, user_version, replica_heartbeat, profile_job, account_purge, swap_archive, recommendation, skill_trend, skill_category
+    
+    # Cache loaded principals, invalidated across workers via a version stamp file
+    from .utils.identity_cache import identity_cache
+    identity_cache.init_app(app)
+    
+    # Email availability checks go through a Bloom filter built in the background
+    from .utils.email_index import email_index
+    email_index.init_app(app)
+    
+    # Rendered fragments keyed on change stamps
+    from .utils.fragment_cache import fragment_cache
+    fragment_cache.init_app(app)
+    
+    # Profile jobs requested by admins
+    from .utils.profiler import profiler
+    profiler.init_app(app)
+    
+    # Old closed swaps are moved to the archive tables in the background
+    from .utils.swap_archive import swap_archiver
+    swap_archiver.init_app(app)
+    
+    # Recommendation lists are refreshed in the background
+    from .utils.recommendations import recommender
+    recommender.init_app(app)
+    
+    # Persist swap funnel latency sketches periodically
+    swap_metrics.swap_funnel.init_app(app)
+    
+    # Flush and merge trending skill counters periodically, in the background
+    skill_trend.skill_trends.init_app(app)
+    
+    # Setup commands; schema creation and admin seeding are explicit (`flask init-db`, `flask create-admin`)
+    from .cli import register_commands
+    register_commands(app)
     
-    # Create database tables
-    with app.app_context():
-        db.create_all()
+    # Migrations are only needed by `flask db ...`, so workers skip importing Alembic
+    if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+        from flask_migrate import Migrate
+        Migrate(app, db)
     
     return app 
\ No newline at end of file
@@ -0,0 +1,108 @@
+import json
+import os
+import time
+import click
+from . import db
+
+def register_commands(app):
+    """Register the setup and maintenance commands (`flask init-db`, `flask create-admin`, `flask slow-traces`, `flask purge-accounts`, `flask archive-swaps`, `flask refresh-recommendations`, `flask build-taxonomy`)"""
+
+    @app.cli.command('init-db')
+    def init_db():
+        """Create all database tables that do not exist yet"""
+        from . import models  # Register every model with SQLAlchemy
+        db.create_all()
+        click.echo(f'Database ready ({len(db.metadata.tables)} tables).')
+
+    @app.cli.command('create-admin')
+    @click.option('--email', default=lambda: os.environ.get('ADMIN_EMAIL', 'admin@skillswap.com'),
+                  show_default='$ADMIN_EMAIL or admin@skillswap.com')
+    @click.option('--password', default=lambda: os.environ.get('ADMIN_PASSWORD', 'admin123'),
+                  show_default='$ADMIN_PASSWORD or admin123')
+    @click.option('--name', default='System Administrator', show_default=True)
+    @click.option('--role', type=click.Choice(['admin', 'super_admin']), default='super_admin', show_default=True)
+    def create_admin(email, password, name, role):
+        """Create an admin account unless one with this email exists"""
+        from .models import Admin
+        if Admin.query.filter_by(email=email).first():
+            click.echo(f'Admin {email} already exists.')
+            return
+        db.session.add(Admin(email=email, password=password, name=name, role=role))
+        db.session.commit()
+        click.echo(f'Admin {email} created. Change the password in production!')
+
+    @app.cli.command('slow-traces')
+    @click.option('--limit', default=20, show_default=True)
+    @click.option('--endpoint', default=None, help='Only traces of this endpoint')
+    def slow_traces(limit, endpoint):
+        """List the slowest sampled requests in the trace file"""
+        from .utils.tracing import tracer
+        # The current trace file and the one it was last rotated to
+        paths = [path for path in (tracer.path + '.1', tracer.path) if tracer.path and os.path.exists(path)]
+        if not paths:
+            click.echo('No traces recorded yet.')
+            return
+        traces = []
+        for path in paths:
+            with open(path, encoding='utf-8') as trace_file:
+                traces.extend(json.loads(line) for line in trace_file if line.strip())
+        if endpoint:
+            traces = [trace for trace in traces if trace['attrs'].get('endpoint') == endpoint]
+        for trace in sorted(traces, key=lambda trace: trace['ms'], reverse=True)[:limit]:
+            db_ms = sum(span[4] for span in trace['spans'] if span[2] == 'db')
+            queries = sum(1 for span in trace['spans'] if span[2] == 'db')
+            click.echo(f"{trace['ms']:>9.1f} ms  db {db_ms:>8.1f} ms / {queries:<3} "
+                       f"{trace['attrs'].get('status', '-')}  {trace['name']}  {trace['trace']}")
+
+    @app.cli.command('purge-accounts')
+    @click.option('--retry-failed', is_flag=True, help='Also retry purges that failed')
+    def purge_accounts(retry_failed):
+        """Run account purges left pending or interrupted (e.g. by a restart)"""
+        from .models import AccountPurge
+        from .utils.account_purge import purge_account
+        if retry_failed:
+            AccountPurge.query.filter_by(status='failed').update({'status': 'pending'})
+            db.session.commit()
+        for purge in AccountPurge.get_resumable():
+            result = purge_account(purge.id, app.config['ACCOUNT_PURGE_BATCH_SIZE'], app.config['ACCOUNT_PURGE_PAUSE'],
+                                   sleep=time.sleep)
+            if result is not None:
+                click.echo(f'Purged user {result.user_id}: {result.get_progress()}')
+
+    @app.cli.command('archive-swaps')
+    @click.option('--days', type=int, default=None, help='Archive swaps closed longer ago than this (default: SWAP_ARCHIVE_AFTER_DAYS)')
+    @click.option('--max-batches', type=int, default=None, help='Stop after this many batches')
+    def archive_swaps(days, max_batches):
+        """Move old closed swaps and their chat to the archive tables"""
+        from .utils.swap_archive import archive_swaps as run_archive
+        days = app.config['SWAP_ARCHIVE_AFTER_DAYS'] if days is None else days
+        moved = run_archive(days, app.config['SWAP_ARCHIVE_BATCH_SIZE'], app.config['SWAP_ARCHIVE_PAUSE'],
+                            max_batches=max_batches, sleep=time.sleep)
+        click.echo(f'Archived {moved} swaps closed more than {days} days ago.')
+
+    @app.cli.command('refresh-recommendations')
+    @click.option('--all', 'refresh_all', is_flag=True, help='Recompute every user, not only the ones due')
+    @click.option('--user-id', type=int, default=None, help='Recompute a single user')
+    def refresh_recommendations(refresh_all, user_id):
+        """Recompute "recommended for you" lists"""
+        from .models import RecommendationState
+        from .utils.recommendations import recommender, refresh_user
+        if user_id is not None:
+            count = refresh_user(user_id, recommender.per_user, recommender.candidate_limit, propagate=True)
+            click.echo(f'User {user_id}: {count} recommendations.')
+            return
+        if refresh_all:
+            RecommendationState.query.update({'stale': True})
+            db.session.commit()
+        click.echo(f'Refreshed {recommender.refresh_due()} users.')
+
+    @app.cli.command('build-taxonomy')
+    @click.option('--recount-only', is_flag=True, help='Only recount every node from user_skills')
+    def build_taxonomy(recount_only):
+        """File uncategorized skills under nodes named by their category labels ('A > B' nests), then recount"""
+        from .models import SkillCategory
+        if not recount_only:
+            for label, filed in SkillCategory.file_by_label().items():
+                click.echo(f'{label}: {filed} skills')
+            db.session.commit()
+        click.echo(f'Recounted {SkillCategory.rebuild_counts()} categories.')
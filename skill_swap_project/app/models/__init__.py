@@ -6,5 +6,19 @@ from .feedback import Feedback
 from .availability import Availability
 from .admin import Admin
 from .chat import ChatMessage
+from .swap_metrics import SwapTransition, SwapLatencySketch
+from .platform_message import PlatformMessage, PlatformMessageCursor
+from .user_version import UserVersion
+from .replica_heartbeat import ReplicaHeartbeat
+from .profile_job import ProfileJob, ProfileResult
+from .account_purge import AccountPurge
+from .swap_archive import SwapArchive
+from .recommendation import Recommendation, RecommendationState
+from .skill_trend import SkillTrendBucket
+from .skill_category import SkillCategory
 
-__all__ = ['User', 'Skill', 'UserSkill', 'SwapRequest', 'Feedback', 'Availability', 'Admin', 'ChatMessage'] 
\ No newline at end of file
+__all__ = ['User', 'Skill', 'UserSkill', 'SwapRequest', 'Feedback', 'Availability', 'Admin', 'ChatMessage',
+           'SwapTransition', 'SwapLatencySketch', 'PlatformMessage', 'PlatformMessageCursor', 'UserVersion',
+           'ReplicaHeartbeat', 'ProfileJob', 'ProfileResult',
+           'AccountPurge', 'SwapArchive', 'Recommendation', 'RecommendationState',
+           'SkillTrendBucket', 'SkillCategory'] 
\ No newline at end of file
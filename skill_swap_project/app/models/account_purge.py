@@ -0,0 +1,67 @@
+import json
+from datetime import datetime, timedelta
+from .. import db
+
+class AccountPurge(db.Model):
+    """AccountPurge model tracking the background purge of a soft-deleted account"""
+    __tablename__ = 'account_purges'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # No foreign key on purpose: the job outlives the personal data it removes
+    user_id = db.Column(db.Integer, nullable=False, unique=True)
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, running, done, failed
+    step = db.Column(db.String(30))  # Step being processed
+    cursor = db.Column(db.Integer)  # Last row id handled by the step (keyset steps)
+    progress = db.Column(db.Text, nullable=False, default='{}')  # Rows handled per step (JSON)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.status = 'pending'
+        self.progress = '{}'
+
+    def get_progress(self):
+        """Get rows handled per step"""
+        return json.loads(self.progress or '{}')
+
+    def add_progress(self, step, rows):
+        """Record rows handled by a batch of a step"""
+        progress = self.get_progress()
+        progress[step] = progress.get(step, 0) + rows
+        self.progress = json.dumps(progress)
+        self.step = step
+
+    def to_dict(self):
+        """Convert purge job to dictionary"""
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'status': self.status,
+            'step': self.step,
+            'cursor': self.cursor,
+            'progress': self.get_progress(),
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    @classmethod
+    def get_resumable(cls, stale_after=300):
+        """Get purges that are pending, or running without progress for `stale_after` seconds (crashed worker)"""
+        stale = datetime.utcnow() - timedelta(seconds=stale_after)
+        return cls.query.filter(
+            (cls.status == 'pending') |
+            ((cls.status == 'running') & (cls.updated_at < stale))
+        ).order_by(cls.id).all()
+
+    @classmethod
+    def get_recent(cls, limit=50):
+        """Get the most recent purge jobs"""
+        return cls.query.order_by(cls.id.desc()).limit(limit).all()
+
+    def __repr__(self):
+        return f'<AccountPurge user={self.user_id} {self.status}>'
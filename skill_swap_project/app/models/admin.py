@@ -1,7 +1,9 @@
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+from sqlalchemy import event
 from .. import db
+from ..utils.passwords import hash_password, verify_password, needs_rehash
+from .user import queue_identity_invalidation
 
 class Admin(UserMixin, db.Model):
     """Admin model for platform administration"""
@@ -24,11 +26,15 @@ class Admin(UserMixin, db.Model):
     
     def set_password(self, password):
         """Hash and set password"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
         """Check if provided password matches hash"""
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        """Check if the stored hash uses outdated parameters"""
+        return needs_rehash(self.password_hash)
     
     def to_dict(self):
         """Convert admin to dictionary"""
@@ -66,4 +72,8 @@ class Admin(UserMixin, db.Model):
         return f'<Admin {self.email}>' 
 
     def get_id(self):
-        return f"admin-{self.id}" 
\ No newline at end of file
+        return f"admin-{self.id}"
+
+# Deactivating or editing an admin drops them from the identity cache
+event.listen(Admin, 'after_update', queue_identity_invalidation)
+event.listen(Admin, 'after_delete', queue_identity_invalidation) 
\ No newline at end of file
@@ -36,11 +36,19 @@ class ChatMessage(db.Model):
     
     @classmethod
     def get_swap_messages(cls, swap_id, limit=50):
-        """Get messages for a specific swap"""
-        return cls.query.filter_by(swap_id=swap_id)\
-                       .order_by(cls.created_at.asc())\
-                       .limit(limit)\
-                       .all()
+        """Get messages for a specific swap (from its archive once the swap has been archived)"""
+        from .swap_request import SwapRequest
+        from .swap_archive import SwapArchive
+        messages = cls.query.filter_by(swap_id=swap_id)\
+                           .order_by(cls.created_at.asc())\
+                           .limit(limit)\
+                           .all()
+        # A live swap has no archive; the views have already loaded it, so the check is an identity map hit
+        if not messages and db.session.get(SwapRequest, swap_id) is None:
+            archive = db.session.get(SwapArchive, swap_id)
+            if archive is not None:
+                return archive.get_messages(limit)
+        return messages
     
     @classmethod
     def create_system_message(cls, swap_id, message):
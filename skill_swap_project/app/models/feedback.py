@@ -6,7 +6,8 @@ class Feedback(db.Model):
     __tablename__ = 'feedback'
     
     id = db.Column(db.Integer, primary_key=True)
-    swap_id = db.Column(db.Integer, db.ForeignKey('swap_requests.id'), nullable=False)
+    # No foreign key: the swap may have moved to swap_archives (same id)
+    swap_id = db.Column(db.Integer, nullable=False, index=True)
     rater_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     rated_user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     rating = db.Column(db.Integer, nullable=False)  # 1-5 stars
@@ -63,7 +64,7 @@ class Feedback(db.Model):
         """Check if user can rate a specific swap"""
         # User can only rate if they participated in the swap and it's completed
         from .swap_request import SwapRequest
-        swap = SwapRequest.query.get(swap_id)
+        swap = SwapRequest.get_or_archived(swap_id)
         if not swap or swap.status != 'completed':
             return False
         
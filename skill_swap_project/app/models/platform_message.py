@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from .. import db
+
+class PlatformMessage(db.Model):
+    """PlatformMessage model for admin broadcasts shown to every user"""
+    __tablename__ = 'platform_messages'
+
+    id = db.Column(db.Integer, primary_key=True)
+    admin_id = db.Column(db.Integer, db.ForeignKey('admins.id'), nullable=True)
+    title = db.Column(db.String(200), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    message_type = db.Column(db.String(20), default='info')  # info, warning, success, danger
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    # Relationships
+    admin = db.relationship('Admin', backref='platform_messages')
+
+    def __init__(self, title, message, message_type='info', admin_id=None):
+        self.title = title
+        self.message = message
+        self.message_type = message_type
+        self.admin_id = admin_id
+
+    def to_dict(self):
+        """Convert message to the payload emitted over Socket.IO"""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'message': self.message,
+            'type': self.message_type,
+            'timestamp': self.created_at.isoformat() if self.created_at else None
+        }
+
+    @classmethod
+    def get_recent(cls, limit=10):
+        """Get the most recent platform messages"""
+        return cls.query.order_by(cls.id.desc()).limit(limit).all()
+
+    @classmethod
+    def get_unseen(cls, user_id, limit=20, max_age_days=30):
+        """Get broadcasts the user has not seen yet, oldest first"""
+        cursor = db.session.get(PlatformMessageCursor, user_id)
+        query = cls.query
+        if cursor:
+            query = query.filter(cls.id > cursor.last_seen_id)
+        else:
+            # Users without a cursor only get recent broadcasts, not the full history
+            query = query.filter(cls.created_at >= datetime.utcnow() - timedelta(days=max_age_days))
+        messages = query.order_by(cls.id.desc()).limit(limit).all()
+        return list(reversed(messages))
+
+    def __repr__(self):
+        return f'<PlatformMessage {self.id}: {self.title}>'
+
+class PlatformMessageCursor(db.Model):
+    """Per-user delivery cursor: the newest platform message the user has seen"""
+    __tablename__ = 'platform_message_cursors'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    last_seen_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __init__(self, user_id, last_seen_id=0):
+        self.user_id = user_id
+        self.last_seen_id = last_seen_id
+
+    @classmethod
+    def mark_seen(cls, user_id, message_id):
+        """Advance a user's cursor (never moves backwards)"""
+        updated = cls.query.filter(cls.user_id == user_id, cls.last_seen_id < message_id)\
+                           .update({'last_seen_id': message_id}, synchronize_session=False)
+        if not updated and db.session.get(cls, user_id) is None:
+            db.session.add(cls(user_id, message_id))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Cursor was created concurrently by another socket of the same user
+            db.session.rollback()
+
+    def __repr__(self):
+        return f'<PlatformMessageCursor {self.user_id}: {self.last_seen_id}>'
@@ -0,0 +1,101 @@
+import json
+from collections import Counter
+from datetime import datetime, timedelta
+from .. import db
+
+class ProfileJob(db.Model):
+    """ProfileJob model for an admin-requested CPU or memory profile run by every live worker"""
+    __tablename__ = 'profile_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)  # cpu, memory
+    seconds = db.Column(db.Float, nullable=False)
+    interval = db.Column(db.Float)  # Sampling interval of cpu jobs
+    requested_by = db.Column(db.Integer, db.ForeignKey('admins.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    # Relationships
+    results = db.relationship('ProfileResult', backref='job', lazy='select',
+                              cascade='all, delete-orphan', order_by='ProfileResult.worker')
+
+    def __init__(self, kind, seconds, interval=None, requested_by=None):
+        self.kind = kind
+        self.seconds = seconds
+        self.interval = interval
+        self.requested_by = requested_by
+
+    def to_dict(self, include_results=False):
+        """Convert job to dictionary"""
+        data = {
+            'id': self.id,
+            'kind': self.kind,
+            'seconds': self.seconds,
+            'interval': self.interval,
+            'requested_by': self.requested_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'workers': {result.worker: result.status for result in self.results}
+        }
+        if include_results:
+            data['results'] = [result.to_dict() for result in self.results]
+        return data
+
+    def collapsed_stacks(self):
+        """Merge the collapsed stacks of every worker (cpu jobs), one 'frame;frame count' line each"""
+        counts = Counter()
+        for result in self.results:
+            if result.status == 'done' and result.output:
+                for line in result.output.splitlines():
+                    stack, _, count = line.rpartition(' ')
+                    counts[stack] += int(count)
+        return '\n'.join(f'{stack} {count}' for stack, count in counts.most_common())
+
+    @classmethod
+    def get_open_jobs(cls, window):
+        """Get jobs recent enough for a worker to still join (created less than `window` seconds ago)"""
+        since = datetime.utcnow() - timedelta(seconds=window)
+        return cls.query.filter(cls.created_at >= since).order_by(cls.id).all()
+
+    @classmethod
+    def get_recent(cls, limit=20):
+        """Get the most recent jobs"""
+        return cls.query.order_by(cls.id.desc()).limit(limit).all()
+
+    def __repr__(self):
+        return f'<ProfileJob {self.id} {self.kind}>'
+
+class ProfileResult(db.Model):
+    """Output of one worker process for a ProfileJob"""
+    __tablename__ = 'profile_results'
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('profile_jobs.id'), nullable=False)
+    worker = db.Column(db.String(100), nullable=False)  # hostname:pid
+    status = db.Column(db.String(10), nullable=False, default='running')  # running, done, failed
+    output = db.Column(db.Text(16777215))  # Collapsed stacks (cpu) or JSON report (memory)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.UniqueConstraint('job_id', 'worker', name='unique_profile_result'),
+    )
+
+    def __init__(self, job_id, worker):
+        self.job_id = job_id
+        self.worker = worker
+        self.status = 'running'
+
+    def to_dict(self):
+        """Convert result to dictionary (memory reports are decoded, cpu stacks stay text)"""
+        output = self.output
+        if output and self.job.kind == 'memory' and self.status == 'done':
+            output = json.loads(output)
+        return {
+            'worker': self.worker,
+            'status': self.status,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'output': output
+        }
+
+    def __repr__(self):
+        return f'<ProfileResult {self.job_id} {self.worker} {self.status}>'
@@ -0,0 +1,68 @@
+import json
+from datetime import datetime
+from .. import db
+
+class Recommendation(db.Model):
+    """Recommendation model for a precomputed swap partner suggestion, the top N kept per user"""
+    __tablename__ = 'recommendations'
+
+    # No foreign key on user_id: rows are rebuilt wholesale and removed by the account purge
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    rank = db.Column(db.Integer, primary_key=True, autoincrement=False)  # 1 = best
+    candidate_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+    reasons = db.Column(db.Text)  # JSON: skills each side offers the other, rating, overlapping hours
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Relationships
+    candidate = db.relationship('User', foreign_keys=[candidate_id])
+
+    def get_reasons(self):
+        """Get why the candidate was recommended"""
+        return json.loads(self.reasons or '{}')
+
+    def to_dict(self):
+        """Convert recommendation to dictionary"""
+        return {
+            'rank': self.rank,
+            'user_id': self.candidate_id,
+            'name': self.candidate.name if self.candidate else None,
+            'score': self.score,
+            'reasons': self.get_reasons(),
+            'computed_at': self.computed_at.isoformat() if self.computed_at else None
+        }
+
+    @classmethod
+    def get_for_user(cls, user_id, limit=None):
+        """Get a user's recommendations, best first (one primary key range read joined with the candidates)"""
+        from .user import User
+        query = cls.query.join(cls.candidate).options(db.contains_eager(cls.candidate)).filter(
+            cls.user_id == user_id,
+            User.is_banned == False,
+            User.deleted_at.is_(None)
+        ).order_by(cls.rank)
+        if limit:
+            query = query.limit(limit)
+        return query.all()
+
+    def __repr__(self):
+        return f'<Recommendation {self.user_id}#{self.rank}: {self.candidate_id} ({self.score})>'
+
+class RecommendationState(db.Model):
+    """When a user's recommendations were last computed, and whether a partner's change made them stale"""
+    __tablename__ = 'recommendation_states'
+
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    refreshed_at = db.Column(db.DateTime, index=True)
+    stale = db.Column(db.Boolean, nullable=False, default=False, index=True)
+
+    @classmethod
+    def mark_stale(cls, user_ids):
+        """Flag users whose lists include, or should now include, someone whose profile changed"""
+        user_ids = list(user_ids)
+        for start in range(0, len(user_ids), 500):
+            cls.query.filter(cls.user_id.in_(user_ids[start:start + 500]), cls.stale == False)\
+                     .update({'stale': True}, synchronize_session=False)
+
+    def __repr__(self):
+        return f'<RecommendationState {self.user_id} {self.refreshed_at}{" stale" if self.stale else ""}>'
@@ -0,0 +1,33 @@
+import time
+from .. import db
+
+class ReplicaHeartbeat(db.Model):
+    """Heartbeat row written to the primary and read back from replicas to measure their lag"""
+    __tablename__ = 'replica_heartbeat'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    # Epoch milliseconds (DATETIME columns drop the fraction on MySQL)
+    beat_ms = db.Column(db.BigInteger, nullable=False)
+
+    def to_dict(self):
+        """Convert heartbeat to dictionary"""
+        return {
+            'id': self.id,
+            'beat_ms': self.beat_ms
+        }
+
+    @classmethod
+    def beat(cls, connection, beat_ms=None):
+        """Write the current time to the heartbeat row (on the given primary connection)"""
+        beat_ms = beat_ms or int(time.time() * 1000)
+        table = cls.__table__
+        updated = connection.execute(table.update().where(table.c.id == 1).values(beat_ms=beat_ms))
+        if updated.rowcount == 0:
+            connection.execute(table.insert().values(id=1, beat_ms=beat_ms))
+        return beat_ms
+
+    @classmethod
+    def read(cls, connection):
+        """Read the last heartbeat applied on the given connection's database (None if absent)"""
+        table = cls.__table__
+        return connection.execute(db.select(table.c.beat_ms).where(table.c.id == 1)).scalar()
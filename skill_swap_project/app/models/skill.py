@@ -8,13 +8,15 @@ class Skill(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
     description = db.Column(db.Text)
-    category = db.Column(db.String(50), default='general')
+    category = db.Column(db.String(50), default='general')  # Free-text label; the taxonomy node is category_id
+    category_id = db.Column(db.Integer, db.ForeignKey('skill_categories.id'), index=True)
     is_approved = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     user_skills = db.relationship('UserSkill', backref='skill', lazy='dynamic')
+    category_node = db.relationship('SkillCategory', backref=db.backref('skills', lazy='dynamic'))
     
     def __init__(self, name, description=None, category='general', is_approved=True):
         self.name = name
@@ -29,6 +31,7 @@ class Skill(db.Model):
             'name': self.name,
             'description': self.description,
             'category': self.category,
+            'category_id': self.category_id,
             'is_approved': self.is_approved,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
@@ -44,6 +47,14 @@ class Skill(db.Model):
         """Get skills by category"""
         return cls.query.filter_by(category=category, is_approved=True).order_by(cls.name).all()
     
+    @classmethod
+    def get_in_category(cls, node, subtree=False):
+        """Get approved skills filed under a taxonomy node (or anywhere in its subtree)"""
+        if not subtree:
+            return cls.query.filter_by(category_id=node.id, is_approved=True).order_by(cls.name).all()
+        return cls.query.join(cls.category_node).filter(node.subtree_condition(), cls.is_approved == True)\
+                        .order_by(cls.name).all()
+    
     @classmethod
     def search_skills(cls, search_term):
         """Search skills by name"""
@@ -0,0 +1,255 @@
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from .. import db
+
+SKILL_TYPES = ('offered', 'wanted')
+
+class SkillCategory(db.Model):
+    """SkillCategory model for a node of the skill taxonomy, e.g. Programming > Python > Django
+
+    ``path`` is the materialized path of ids from the root ('/1/4/9/'), so a
+    subtree is one indexed prefix range. ``offered_count`` and
+    ``wanted_count`` are the user skills filed anywhere in the subtree; they
+    are kept up to date on every flush that adds, removes or re-files
+    UserSkill rows (see _count_user_skills below).
+    """
+    __tablename__ = 'skill_categories'
+
+    id = db.Column(db.Integer, primary_key=True)
+    parent_id = db.Column(db.Integer, db.ForeignKey('skill_categories.id'), index=True)
+    name = db.Column(db.String(50), nullable=False)
+    path = db.Column(db.String(255), nullable=False, default='', index=True)
+    depth = db.Column(db.Integer, nullable=False, default=0)
+    offered_count = db.Column(db.Integer, nullable=False, default=0)
+    wanted_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Relationships
+    parent = db.relationship('SkillCategory', remote_side=[id])
+
+    __table_args__ = (
+        db.UniqueConstraint('parent_id', 'name', name='unique_category_name'),
+    )
+
+    @classmethod
+    def create(cls, name, parent=None):
+        """Add a node under parent (a root when None); the caller commits"""
+        node = cls(name=name[:50], parent_id=parent.id if parent else None,
+                   depth=parent.depth + 1 if parent else 0, offered_count=0, wanted_count=0)
+        db.session.add(node)
+        db.session.flush()  # The path includes the node's own id
+        node.path = f'{parent.path if parent else "/"}{node.id}/'
+        return node
+
+    @staticmethod
+    def path_ids(path):
+        """Ids of a path's nodes, root first"""
+        return [int(node_id) for node_id in path.strip('/').split('/') if node_id]
+
+    def ancestor_ids(self):
+        """Ids of the node's ancestors, root first (the node itself excluded)"""
+        return self.path_ids(self.path)[:-1]
+
+    def get_breadcrumb(self):
+        """Get the node's ancestors and the node itself, root first (one primary key lookup)"""
+        return SkillCategory.query.filter(SkillCategory.id.in_(self.path_ids(self.path)))\
+                                  .order_by(SkillCategory.depth).all()
+
+    def subtree_condition(self):
+        """SQL condition matching this node and everything below it (an index range on path)"""
+        return SkillCategory.path.like(f'{self.path}%')
+
+    def count(self, skill_type):
+        """User skills of a type filed under this node"""
+        return self.offered_count if skill_type == 'offered' else self.wanted_count
+
+    def to_dict(self):
+        """Convert category to dictionary"""
+        return {
+            'id': self.id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'path': self.path,
+            'depth': self.depth,
+            'offered_count': self.offered_count,
+            'wanted_count': self.wanted_count
+        }
+
+    @classmethod
+    def get_children(cls, parent_id=None):
+        """Get the nodes directly under a parent (the roots when None) with their counts"""
+        return cls.query.filter(cls.parent_id == parent_id).order_by(cls.name).all()
+
+    @classmethod
+    def get_tree(cls):
+        """Get every node in depth-first order (sorted by name within a parent)"""
+        nodes = cls.query.all()
+        children = {}
+        for node in nodes:
+            children.setdefault(node.parent_id, []).append(node)
+        ordered, stack = [], sorted(children.get(None, []), key=lambda node: node.name.lower(), reverse=True)
+        while stack:
+            node = stack.pop()
+            ordered.append(node)
+            stack.extend(sorted(children.get(node.id, []), key=lambda child: child.name.lower(), reverse=True))
+        return ordered
+
+    @classmethod
+    def resolve(cls, label, create=False):
+        """Find the node a 'Programming > Python' label names, creating missing levels if asked"""
+        node = None
+        for name in [part.strip()[:50] for part in (label or '').split('>') if part.strip()]:
+            child = cls.query.filter_by(parent_id=node.id if node else None, name=name).first()
+            if child is None:
+                if not create:
+                    return None
+                child = cls.create(name, node)
+            node = child
+        return node
+
+    @classmethod
+    def file_by_label(cls):
+        """File uncategorized skills under the nodes their category labels name, creating them ({label: skills filed}; the caller commits and recounts)"""
+        from .skill import Skill
+        filed = {}
+        labels = [label for (label,) in db.session.query(Skill.category).filter(Skill.category_id.is_(None))
+                                                                      .distinct() if label]
+        for label in labels:
+            node = cls.resolve(label, create=True)
+            if node is not None:
+                # Bulk update skips the re-filing hook, hence the recount afterwards
+                filed[label] = Skill.query.filter(Skill.category_id.is_(None), Skill.category == label)\
+                                          .update({'category_id': node.id}, synchronize_session=False)
+        return filed
+
+    @classmethod
+    def apply_deltas(cls, connection, deltas):
+        """Add {(skill_id, skill_type): change} to the counts of each skill's node and its ancestors"""
+        from .skill import Skill
+        deltas = {key: change for key, change in deltas.items() if change}
+        if not deltas:
+            return
+        skill_ids = {skill_id for skill_id, _ in deltas}
+        paths = dict(connection.execute(
+            db.select(Skill.__table__.c.id, cls.__table__.c.path)
+              .join(cls.__table__, Skill.__table__.c.category_id == cls.__table__.c.id)
+              .where(Skill.__table__.c.id.in_(skill_ids))
+        ).all())
+        node_deltas = {}
+        for (skill_id, skill_type), change in deltas.items():
+            if skill_id not in paths or skill_type not in SKILL_TYPES:
+                continue
+            for node_id in cls.path_ids(paths[skill_id]):
+                node_deltas.setdefault(node_id, Counter())[skill_type] += change
+        cls._update_counts(connection, node_deltas)
+
+    @classmethod
+    def move_skill_counts(cls, connection, old_category_id, new_category_id, before, after):
+        """Move a re-filed skill's user skills ({skill_type: count} before and after the flush) between nodes"""
+        table = cls.__table__
+        category_ids = [category_id for category_id in (old_category_id, new_category_id) if category_id]
+        paths = dict(connection.execute(db.select(table.c.id, table.c.path)
+                                          .where(table.c.id.in_(category_ids))).all()) if category_ids else {}
+        node_deltas = {}
+        for node_id in cls.path_ids(paths.get(old_category_id, '')):
+            node_deltas.setdefault(node_id, Counter()).subtract(before)
+        for node_id in cls.path_ids(paths.get(new_category_id, '')):
+            node_deltas.setdefault(node_id, Counter()).update(after)
+        cls._update_counts(connection, node_deltas)
+
+    @classmethod
+    def _update_counts(cls, connection, node_deltas):
+        rows = [{'node_id': node_id, 'offered': changes['offered'], 'wanted': changes['wanted']}
+                for node_id, changes in sorted(node_deltas.items())
+                if changes['offered'] or changes['wanted']]
+        if not rows:
+            return
+        table = cls.__table__
+        connection.execute(
+            table.update().where(table.c.id == db.bindparam('node_id')).values(
+                offered_count=table.c.offered_count + db.bindparam('offered'),
+                wanted_count=table.c.wanted_count + db.bindparam('wanted')
+            ),
+            rows
+        )
+
+    @classmethod
+    def rebuild_counts(cls):
+        """Recount every node from user_skills (repairs drift; one grouped query, one bulk update)"""
+        from .skill import Skill
+        from .user_skill import UserSkill
+        node_deltas = {node_id: Counter() for (node_id,) in db.session.query(cls.id)}
+        for path, skill_type, count in db.session.query(cls.path, UserSkill.skill_type, db.func.count(UserSkill.id))\
+                                                  .join(Skill, Skill.category_id == cls.id)\
+                                                  .join(UserSkill, UserSkill.skill_id == Skill.id)\
+                                                  .group_by(cls.path, UserSkill.skill_type):
+            for node_id in cls.path_ids(path):
+                if node_id in node_deltas:
+                    node_deltas[node_id][skill_type] += count
+        cls.query.update({'offered_count': 0, 'wanted_count': 0}, synchronize_session=False)
+        cls._update_counts(db.session.connection(), node_deltas)
+        db.session.commit()
+        return len(node_deltas)
+
+    def __repr__(self):
+        return f'<SkillCategory {self.path} {self.name}>'
+
+@event.listens_for(Session, 'before_flush')
+def _file_new_skills(session, flush_context, instances):
+    """File new skills under the node their category label names, when there is one"""
+    from .skill import Skill
+    for obj in list(session.new):
+        if isinstance(obj, Skill) and obj.category_id is None and obj.category_node is None and obj.category:
+            with session.no_autoflush:
+                node = SkillCategory.resolve(obj.category)
+            if node is not None:
+                obj.category_id = node.id
+
+@event.listens_for(Session, 'after_flush')
+def _count_user_skills(session, flush_context):
+    """Apply the flush's added, removed and re-filed user skills to the taxonomy counts, in the same transaction"""
+    from .skill import Skill
+    from .user_skill import UserSkill
+
+    deltas = Counter()
+    moved = {}
+    for obj in session.new:
+        if isinstance(obj, UserSkill):
+            deltas[(obj.skill_id, obj.skill_type)] += 1
+    for obj in session.deleted:
+        if isinstance(obj, UserSkill):
+            state = inspect(obj)
+            skill_id = state.attrs.skill_id.history.deleted or [obj.skill_id]
+            skill_type = state.attrs.skill_type.history.deleted or [obj.skill_type]
+            deltas[(skill_id[0], skill_type[0])] -= 1
+    for obj in session.dirty:
+        if isinstance(obj, UserSkill):
+            state = inspect(obj)
+            skill_id, skill_type = state.attrs.skill_id.history, state.attrs.skill_type.history
+            if skill_id.deleted or skill_type.deleted:
+                deltas[((skill_id.deleted or [obj.skill_id])[0], (skill_type.deleted or [obj.skill_type])[0])] -= 1
+                deltas[(obj.skill_id, obj.skill_type)] += 1
+        elif isinstance(obj, Skill):
+            history = inspect(obj).attrs.category_id.history
+            if history.deleted or (history.added and obj not in session.new):
+                moved[obj.id] = ((history.deleted or [None])[0], obj.category_id)
+    if not deltas and not moved:
+        return
+
+    connection = session.connection()
+    if moved:
+        table = UserSkill.__table__
+        counts = {}
+        for skill_id, skill_type, count in connection.execute(
+                db.select(table.c.skill_id, table.c.skill_type, db.func.count())
+                  .where(table.c.skill_id.in_(moved)).group_by(table.c.skill_id, table.c.skill_type)):
+            counts.setdefault(skill_id, Counter())[skill_type] = count
+        for skill_id, (old_category_id, new_category_id) in moved.items():
+            # The rows are already flushed, so the new node gets them all and the old one loses what it had before
+            after = counts.get(skill_id, Counter())
+            before = Counter({skill_type: after[skill_type] - deltas.pop((skill_id, skill_type), 0)
+                              for skill_type in SKILL_TYPES})
+            SkillCategory.move_skill_counts(connection, old_category_id, new_category_id, before, after)
+    SkillCategory.apply_deltas(connection, deltas)
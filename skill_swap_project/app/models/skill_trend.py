@@ -0,0 +1,331 @@
+import atexit
+import calendar
+import heapq
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .. import db
+
+EVENTS = ('added', 'searched', 'requested')  # Skill added to a profile, searched for, asked for in a swap
+WINDOWS = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+
+class SkillTrendBucket(db.Model):
+    """Count of one skill event in one time bucket, summed over every worker"""
+    __tablename__ = 'skill_trend_buckets'
+
+    id = db.Column(db.Integer, primary_key=True)
+    event = db.Column(db.String(20), nullable=False)
+    skill_name = db.Column(db.String(100), nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False, index=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # Read-back watermark
+
+    __table_args__ = (
+        db.UniqueConstraint('event', 'skill_name', 'bucket_start', name='unique_skill_trend_bucket'),
+    )
+
+    @classmethod
+    def add_counts(cls, connection, counts):
+        """Add {(event, skill_name, bucket_start): count} to the stored buckets (upsert, in the caller's transaction)"""
+        if not counts:
+            return
+        now = datetime.utcnow()
+        table = cls.__table__
+        rows = [{'event': event_name, 'skill_name': skill_name, 'bucket_start': bucket_start, 'count': count,
+                 'updated_at': now}
+                for (event_name, skill_name, bucket_start), count in sorted(counts.items())]
+
+        dialect = connection.dialect.name
+        if dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert
+            stmt = insert(table).values(rows)
+            stmt = stmt.on_duplicate_key_update(count=table.c.count + stmt.inserted['count'], updated_at=now)
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(table).values(rows)
+            stmt = stmt.on_conflict_do_update(index_elements=['event', 'skill_name', 'bucket_start'],
+                                              set_={'count': table.c.count + stmt.excluded['count'], 'updated_at': now})
+        else:
+            for row in rows:
+                updated = connection.execute(table.update().where(
+                    (table.c.event == row['event']) & (table.c.skill_name == row['skill_name']) &
+                    (table.c.bucket_start == row['bucket_start'])
+                ).values(count=table.c.count + row['count'], updated_at=now)).rowcount
+                if not updated:
+                    connection.execute(table.insert(), [row])
+            return
+        connection.execute(stmt)
+
+    def __repr__(self):
+        return f'<SkillTrendBucket {self.event} {self.skill_name} {self.bucket_start}: {self.count}>'
+
+class SkillTrendRecorder:
+    """Sliding-window counts of skill additions, searches and swap requests
+
+    Events are counted in memory per time bucket (TRENDING_BUCKET_SECONDS).
+    Every TRENDING_FLUSH_INTERVAL seconds a request starts a background task
+    that adds this worker's unflushed counts to skill_trend_buckets and reads
+    back every row any worker changed since its last read (the whole week
+    the first time), into a ring buffer holding a week of buckets. Rows carry
+    an updated_at stamp and the read-back overlaps the previous one by
+    TRENDING_REFRESH_OVERLAP seconds, so counts a worker flushes late into an
+    old bucket, or commits after another worker's read, are still picked up.
+    Unflushed counts are written when the process exits.
+
+    Totals per window (hour, day, week) are kept up to date as buckets are
+    replaced or slide out of a window, and the top TRENDING_TOP_K skills of
+    each window and event are re-ranked whenever they change, so top()
+    returns a precomputed list (empty until the first load finished).
+    """
+
+    def __init__(self, bucket_seconds=300, flush_interval=30, top_k=50, refresh_overlap=120):
+        self.bucket_seconds = bucket_seconds
+        self.flush_interval = flush_interval
+        self.top_k = top_k
+        self.refresh_overlap = refresh_overlap
+        self.prune_interval = 3600
+        self._pending = Counter()  # (event, skill_name, bucket) -> count not flushed yet
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._last_prune = 0
+        self._running = False
+        self._reset()
+
+    def init_app(self, app):
+        self.bucket_seconds = app.config.get('TRENDING_BUCKET_SECONDS', self.bucket_seconds)
+        self.flush_interval = app.config.get('TRENDING_FLUSH_INTERVAL', self.flush_interval)
+        self.top_k = app.config.get('TRENDING_TOP_K', self.top_k)
+        self.refresh_overlap = app.config.get('TRENDING_REFRESH_OVERLAP', self.refresh_overlap)
+        self._reset()
+
+        @app.after_request
+        def flush_skill_trends(response):
+            self.maybe_start(app)
+            return response
+
+        atexit.register(self.flush_at_exit, app)
+
+    def _reset(self):
+        self._size = WINDOWS['week'] // self.bucket_seconds + 1
+        self._ring = [None] * self._size  # Slot bucket % size: (bucket, {event: Counter}) or None
+        self._spans = {window: seconds // self.bucket_seconds for window, seconds in WINDOWS.items()}
+        self._totals = {window: {name: Counter() for name in EVENTS} for window in WINDOWS}
+        self._top = {window: {name: [] for name in EVENTS} for window in WINDOWS}
+        self._head = None  # Newest bucket the totals have slid to
+        self._read_at = None  # When the last read-back started (None until the week was loaded)
+
+    @property
+    def loaded(self):
+        """Whether the week of buckets was read back at least once"""
+        return self._read_at is not None
+
+    def _bucket(self, timestamp=None):
+        return int((time.time() if timestamp is None else timestamp) // self.bucket_seconds)
+
+    def _bucket_start(self, bucket):
+        return datetime.utcfromtimestamp(bucket * self.bucket_seconds)
+
+    def record(self, event_name, skill_name, count=1):
+        """Count an event for a skill in the current bucket"""
+        if event_name not in EVENTS or not skill_name:
+            return
+        with self._lock:
+            self._pending[(event_name, skill_name[:100], self._bucket())] += count
+
+    def queue(self, session, event_name, skill_name):
+        """Count an event once the session commits"""
+        session.info.setdefault('skill_trends', []).append((event_name, skill_name))
+
+    def maybe_start(self, app):
+        """Start a background flush when the interval has elapsed (or nothing was loaded yet) and none is running"""
+        if self.loaded and time.monotonic() - self._last_flush < self.flush_interval:
+            return
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._last_flush = time.monotonic()
+        from .. import socketio
+        socketio.start_background_task(self.run, app)
+
+    def run(self, app):
+        """Background task: flush and read back in a fresh app context (and session), logging failures"""
+        try:
+            with app.app_context():
+                self.flush()
+        except Exception:
+            app.logger.exception('Trending skills flush failed; the counts are retried on the next flush')
+        finally:
+            self._running = False
+
+    def flush_at_exit(self, app):
+        """Write counts not flushed yet when the process exits"""
+        if not self._pending:
+            return
+        try:
+            with app.app_context():
+                self._write_pending()
+        except Exception:
+            app.logger.exception('Trending skills counts could not be written at exit')
+
+    def flush(self):
+        """Add pending counts to the stored buckets, then read back what every worker counted"""
+        self._write_pending()
+        self.refresh()
+
+    def _write_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._last_flush = time.monotonic()
+
+        try:
+            if pending:
+                SkillTrendBucket.add_counts(db.session.connection(), {
+                    (event_name, skill_name, self._bucket_start(bucket)): count
+                    for (event_name, skill_name, bucket), count in pending.items()
+                })
+            if time.monotonic() - self._last_prune >= self.prune_interval:
+                self._last_prune = time.monotonic()
+                oldest = self._bucket_start(self._bucket() - self._size)
+                SkillTrendBucket.query.filter(SkillTrendBucket.bucket_start < oldest)\
+                                      .delete(synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Put the counts back so they are retried on the next flush
+            with self._lock:
+                self._pending.update(pending)
+            raise
+
+    def refresh(self):
+        """Read back the rows any worker changed since the last read (the whole week at first)"""
+        started = datetime.utcnow()
+        now = self._bucket()
+        first = now - self._spans['week'] + 1
+        query = db.session.query(
+            SkillTrendBucket.event, SkillTrendBucket.skill_name,
+            SkillTrendBucket.bucket_start, SkillTrendBucket.count
+        ).filter(SkillTrendBucket.bucket_start >= self._bucket_start(first))
+        full = self._read_at is None
+        if not full:
+            # Overlap the last read so rows committed after it (or stamped by a skewed clock) are not missed
+            query = query.filter(SkillTrendBucket.updated_at >= self._read_at - timedelta(seconds=self.refresh_overlap))
+        rows = [(event_name, skill_name, calendar.timegm(bucket_start.timetuple()) // self.bucket_seconds, count)
+                for event_name, skill_name, bucket_start, count in query if event_name in EVENTS]
+        db.session.commit()
+
+        with self._lock:
+            self._slide(now)
+            if full:
+                buckets = {}
+                for event_name, skill_name, bucket, count in rows:
+                    buckets.setdefault(bucket, {name: Counter() for name in EVENTS})[event_name][skill_name] += count
+                for bucket in range(first, now + 1):
+                    self._replace(bucket, buckets.get(bucket))
+            else:
+                for event_name, skill_name, bucket, count in rows:
+                    if bucket >= first:
+                        self._set(bucket, event_name, skill_name, count)
+            self._read_at = started
+            self._rank()
+
+    def _in_window(self, bucket, window):
+        return self._head - self._spans[window] < bucket <= self._head
+
+    def _slot(self, bucket):
+        entry = self._ring[bucket % self._size]
+        return entry[1] if entry is not None and entry[0] == bucket else None
+
+    def _set(self, bucket, event_name, skill_name, count):
+        """Store one stored row's count (reading a row twice is harmless), moving the window totals by the difference"""
+        slot = self._slot(bucket)
+        if slot is None:
+            slot = {name: Counter() for name in EVENTS}
+            self._ring[bucket % self._size] = (bucket, slot)
+        change = count - slot[event_name][skill_name]
+        if not change:
+            return
+        slot[event_name][skill_name] = count
+        for window in WINDOWS:
+            if self._in_window(bucket, window):
+                self._totals[window][event_name][skill_name] += change
+
+    def _replace(self, bucket, counts):
+        """Store a bucket's counts, moving the window totals by the difference"""
+        old = self._slot(bucket)
+        for window in WINDOWS:
+            if not self._in_window(bucket, window):
+                continue
+            for name in EVENTS:
+                totals = self._totals[window][name]
+                if old:
+                    totals.subtract(old[name])
+                if counts:
+                    totals.update(counts[name])
+        self._ring[bucket % self._size] = (bucket, counts) if counts else None
+
+    def _slide(self, now):
+        """Move the windows forward to bucket `now`, dropping the buckets that fall out of each"""
+        if self._head is None:
+            self._head = now
+            return
+        if now <= self._head:
+            return
+        if now - self._head >= self._size:
+            # Idle for more than a week: nothing left in any window
+            self._ring = [None] * self._size
+            self._totals = {window: {name: Counter() for name in EVENTS} for window in WINDOWS}
+            self._head = now
+            return
+        for head in range(self._head + 1, now + 1):
+            for window, span in self._spans.items():
+                expired = self._slot(head - span)
+                if expired:
+                    for name in EVENTS:
+                        self._totals[window][name].subtract(expired[name])
+            self._head = head
+
+    def _rank(self):
+        for window in WINDOWS:
+            for name in EVENTS:
+                totals = self._totals[window][name]
+                # Drop skills whose count slid back to zero so the totals stay small
+                for skill_name in [skill_name for skill_name, count in totals.items() if count <= 0]:
+                    del totals[skill_name]
+                self._top[window][name] = heapq.nlargest(self.top_k, totals.items(), key=lambda item: (item[1], item[0]))
+
+    def top(self, event_name, window='day', k=10):
+        """Get the k skills with the most events in the window as (skill name, count) pairs"""
+        with self._lock:
+            now = self._bucket()
+            if self._head is not None and now > self._head:
+                self._slide(now)
+                self._rank()
+            return self._top[window][event_name][:k]
+
+    def stats(self):
+        """Get the recorder's configuration and memory footprint"""
+        with self._lock:
+            return {
+                'loaded': self.loaded,
+                'bucket_seconds': self.bucket_seconds,
+                'flush_interval': self.flush_interval,
+                'buckets_in_memory': sum(entry is not None for entry in self._ring),
+                'pending_counts': len(self._pending),
+                'tracked_skills': {window: {name: len(self._totals[window][name]) for name in EVENTS}
+                                   for window in WINDOWS}
+            }
+
+skill_trends = SkillTrendRecorder()
+
+@event.listens_for(Session, 'after_commit')
+def _record_committed_skill_events(session):
+    for event_name, skill_name in session.info.pop('skill_trends', ()):
+        skill_trends.record(event_name, skill_name)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back_skill_events(session):
+    session.info.pop('skill_trends', None)
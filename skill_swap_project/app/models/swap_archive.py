@@ -0,0 +1,162 @@
+import json
+import zlib
+from datetime import datetime
+from sqlalchemy.orm.attributes import set_committed_value
+from .. import db
+
+def _parse_datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+class SwapArchive(db.Model):
+    """SwapArchive model for a closed swap moved out of the hot tables, its chat and history compressed"""
+    __tablename__ = 'swap_archives'
+
+    # Same id as the archived SwapRequest, so feedback and links keep pointing at it
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    requester_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    receiver_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    requester_skill = db.Column(db.String(100), nullable=False)
+    receiver_skill = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(20), nullable=False, index=True)
+    message = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, index=True)
+    updated_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    message_count = db.Column(db.Integer, nullable=False, default=0)
+    # zlib-compressed JSON of the chat messages and transitions, only loaded when read
+    payload = db.deferred(db.Column(db.LargeBinary(16777215), nullable=False))
+
+    # Relationships
+    requester = db.relationship('User', foreign_keys=[requester_id])
+    receiver = db.relationship('User', foreign_keys=[receiver_id])
+
+    # Templates tell archived swaps from live ones with this
+    is_archived = True
+
+    @classmethod
+    def from_swap(cls, swap, messages, transitions):
+        """Build the archive row of a swap from its chat messages and status transitions"""
+        payload = {
+            'messages': [{
+                'id': message.id,
+                'sender_id': message.sender_id,
+                'message': message.message,
+                'message_type': message.message_type,
+                'created_at': message.created_at.isoformat() if message.created_at else None
+            } for message in messages],
+            'transitions': [transition.to_dict() for transition in transitions]
+        }
+        archive = cls(
+            id=swap.id,
+            requester_id=swap.requester_id,
+            receiver_id=swap.receiver_id,
+            requester_skill=swap.requester_skill,
+            receiver_skill=swap.receiver_skill,
+            status=swap.status,
+            message=swap.message,
+            created_at=swap.created_at,
+            updated_at=swap.updated_at,
+            completed_at=swap.completed_at,
+            message_count=len(messages)
+        )
+        archive.set_payload(payload)
+        return archive
+
+    def get_payload(self):
+        """Get the decompressed chat messages and transitions"""
+        return json.loads(zlib.decompress(self.payload))
+
+    def set_payload(self, payload):
+        """Compress and store chat messages and transitions"""
+        self.payload = zlib.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'), 6)
+        self.message_count = len(payload['messages'])
+
+    def get_messages(self, limit=None):
+        """Get the archived chat as detached ChatMessage objects (senders loaded in one query)"""
+        from .chat import ChatMessage
+        from .user import User
+
+        rows = self.get_payload()['messages'][:limit]
+        sender_ids = {row['sender_id'] for row in rows if row['sender_id']}
+        senders = {user.id: user for user in User.query.filter(User.id.in_(sender_ids))} if sender_ids else {}
+        messages = []
+        for row in rows:
+            message = ChatMessage(self.id, row['sender_id'], row['message'], row['message_type'])
+            message.id = row['id']
+            message.created_at = _parse_datetime(row['created_at'])
+            # Set without backref events so the message never joins a User's collection (and the session)
+            set_committed_value(message, 'sender', senders.get(row['sender_id']))
+            messages.append(message)
+        return messages
+
+    def get_transitions(self):
+        """Get the archived status transitions as dictionaries"""
+        return self.get_payload()['transitions']
+
+    def to_dict(self):
+        """Convert archived swap to dictionary (same keys as SwapRequest.to_dict)"""
+        return {
+            'id': self.id,
+            'requester_id': self.requester_id,
+            'receiver_id': self.receiver_id,
+            'requester_skill': self.requester_skill,
+            'receiver_skill': self.receiver_skill,
+            'status': self.status,
+            'message': self.message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+            'archived': True
+        }
+
+    def can_be_cancelled_by(self, user_id):
+        """Archived swaps are closed"""
+        return False
+
+    def can_be_responded_by(self, user_id):
+        """Archived swaps are closed"""
+        return False
+
+    @classmethod
+    def _involving(cls, user_id):
+        return (cls.requester_id == user_id) | (cls.receiver_id == user_id)
+
+    @classmethod
+    def get_user_swaps(cls, user_id, status=None):
+        """Get archived swaps of a user (sent and received), newest first"""
+        query = cls.query.filter(cls._involving(user_id))
+        if status:
+            query = query.filter(cls.status == status)
+        return query.order_by(cls.created_at.desc()).all()
+
+    @classmethod
+    def count_swaps(cls, user_id=None, status=None, created_since=None, completed_since=None):
+        """Count archived swaps, optionally of a user, a status or a period"""
+        query = cls.query
+        if user_id is not None:
+            query = query.filter(cls._involving(user_id))
+        if status:
+            query = query.filter(cls.status == status)
+        if created_since:
+            query = query.filter(cls.created_at >= created_since)
+        if completed_since:
+            query = query.filter(cls.completed_at >= completed_since)
+        return query.count()
+
+    @classmethod
+    def count_swaps_by_user(cls, status=None):
+        """Count archived swaps of every user at once ({user_id: count}, sent and received)"""
+        counts = {}
+        for column, condition in ((cls.requester_id, None), (cls.receiver_id, cls.receiver_id != cls.requester_id)):
+            query = db.session.query(column, db.func.count(cls.id))
+            if condition is not None:
+                query = query.filter(condition)
+            if status:
+                query = query.filter(cls.status == status)
+            for user_id, count in query.group_by(column):
+                counts[user_id] = counts.get(user_id, 0) + count
+        return counts
+
+    def __repr__(self):
+        return f'<SwapArchive {self.id} {self.status}>'
@@ -0,0 +1,181 @@
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .. import db
+from ..utils.sketches import QuantileSketch
+
+class SwapTransition(db.Model):
+    """SwapTransition model recording every SwapRequest status change"""
+    __tablename__ = 'swap_transitions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    swap_id = db.Column(db.Integer, db.ForeignKey('swap_requests.id'), nullable=False, index=True)
+    from_status = db.Column(db.String(20), nullable=False)
+    to_status = db.Column(db.String(20), nullable=False)
+    seconds_in_state = db.Column(db.Float)  # Time spent in from_status
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __init__(self, from_status, to_status, seconds_in_state=None, created_at=None):
+        self.from_status = from_status
+        self.to_status = to_status
+        self.seconds_in_state = seconds_in_state
+        self.created_at = created_at or datetime.utcnow()
+
+    def to_dict(self):
+        """Convert transition to dictionary"""
+        return {
+            'id': self.id,
+            'swap_id': self.swap_id,
+            'from_status': self.from_status,
+            'to_status': self.to_status,
+            'seconds_in_state': self.seconds_in_state,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+    def __repr__(self):
+        return f'<SwapTransition {self.swap_id}: {self.from_status}->{self.to_status}>'
+
+class SwapLatencySketch(db.Model):
+    """Persisted time-in-state quantile sketch per skill category and status"""
+    __tablename__ = 'swap_latency_sketches'
+
+    id = db.Column(db.Integer, primary_key=True)
+    category = db.Column(db.String(50), nullable=False)
+    stage = db.Column(db.String(20), nullable=False)  # Status the swap was sitting in
+    sketch = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('category', 'stage', name='unique_latency_sketch'),
+    )
+
+    def __init__(self, category, stage, sketch):
+        self.category = category
+        self.stage = stage
+        self.sketch = sketch
+
+    def get_sketch(self):
+        """Decode the stored sketch"""
+        return QuantileSketch.from_json(self.sketch)
+
+    def __repr__(self):
+        return f'<SwapLatencySketch {self.category}/{self.stage}>'
+
+class SwapFunnelRecorder:
+    """In-memory time-in-state sketches, periodically merged into the database
+
+    Each worker only keeps the delta observed since its last flush, so memory
+    stays at one bounded sketch per (category, stage) and concurrent workers
+    never overwrite each other's counts. Flushes run in a background task
+    with their own session (started after a request once
+    SWAP_FUNNEL_FLUSH_INTERVAL seconds have passed), so a slow or failing
+    flush never touches the request that triggered it.
+    """
+
+    def __init__(self, flush_interval=60):
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._running = False
+
+    def init_app(self, app):
+        self.flush_interval = app.config.get('SWAP_FUNNEL_FLUSH_INTERVAL', self.flush_interval)
+
+        @app.after_request
+        def flush_swap_funnel(response):
+            self.maybe_start(app)
+            return response
+
+    def observe(self, category, stage, seconds):
+        """Record time spent in a stage for a skill category"""
+        key = (category or 'general', stage)
+        with self._lock:
+            sketch = self._pending.get(key)
+            if sketch is None:
+                sketch = self._pending[key] = QuantileSketch()
+            sketch.add(seconds)
+
+    def maybe_start(self, app):
+        """Start a background flush if the flush interval has elapsed and one is due"""
+        if not self._pending or time.monotonic() - self._last_flush < self.flush_interval:
+            return
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._last_flush = time.monotonic()
+        from .. import socketio
+        socketio.start_background_task(self.run, app)
+
+    def run(self, app):
+        """Background task: flush in a fresh app context (and session), logging failures"""
+        try:
+            with app.app_context():
+                self.flush()
+        except Exception:
+            app.logger.exception('Swap funnel flush failed; the sketches are retried on the next flush')
+        finally:
+            self._running = False
+
+    def flush(self):
+        """Merge pending sketches into their persisted rows (they are put back if this fails)"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+
+        try:
+            for (category, stage), delta in pending.items():
+                self._merge_row(category, stage, delta)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Put the deltas back so they are retried on the next flush
+            with self._lock:
+                for key, delta in pending.items():
+                    current = self._pending.get(key)
+                    self._pending[key] = delta.merge(current) if current else delta
+            raise
+
+    def _merge_row(self, category, stage, delta):
+        row = SwapLatencySketch.query.filter_by(category=category, stage=stage)\
+                                     .with_for_update().first()
+        if row is None:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(SwapLatencySketch(category, stage, delta.to_json()))
+                return
+            except IntegrityError:
+                # Another worker created the row first
+                row = SwapLatencySketch.query.filter_by(category=category, stage=stage)\
+                                             .with_for_update().first()
+        row.sketch = row.get_sketch().merge(delta).to_json()
+
+    def get_sketches(self):
+        """Get merged (persisted + unflushed) sketches keyed by (category, stage)"""
+        sketches = {(row.category, row.stage): row.get_sketch() for row in SwapLatencySketch.query.all()}
+        with self._lock:
+            for key, delta in self._pending.items():
+                merged = QuantileSketch.from_dict(delta.to_dict())
+                if key in sketches:
+                    merged.merge(sketches[key])
+                sketches[key] = merged
+        return sketches
+
+    def queue(self, session, category, stage, seconds):
+        """Queue an observation to be recorded once the session commits"""
+        session.info.setdefault('swap_funnel', []).append((category, stage, seconds))
+
+swap_funnel = SwapFunnelRecorder()
+
+@event.listens_for(Session, 'after_commit')
+def _record_committed_transitions(session):
+    for observation in session.info.pop('swap_funnel', ()):
+        swap_funnel.observe(*observation)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back_transitions(session):
+    session.info.pop('swap_funnel', None)
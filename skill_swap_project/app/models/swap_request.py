@@ -17,6 +17,13 @@ class SwapRequest(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     completed_at = db.Column(db.DateTime)
     
+    # Relationships
+    transitions = db.relationship('SwapTransition', backref='swap', lazy='dynamic',
+                                  order_by='SwapTransition.created_at')
+    
+    # Closed swaps are moved to SwapArchive after a while (see utils/swap_archive.py)
+    is_archived = False
+    
     def __init__(self, requester_id, receiver_id, requester_skill, receiver_skill, message=None):
         self.requester_id = requester_id
         self.receiver_id = receiver_id
@@ -39,34 +46,109 @@ class SwapRequest(db.Model):
             'completed_at': self.completed_at.isoformat() if self.completed_at else None
         }
     
+    def _transition(self, new_status):
+        """Move to a new status, recording the transition and time spent in the old one"""
+        from .skill import Skill
+        from .swap_metrics import SwapTransition, swap_funnel
+        
+        now = datetime.utcnow()
+        old_status = self.status or 'pending'
+        entered_at = self.updated_at or self.created_at
+        seconds = (now - entered_at).total_seconds() if entered_at else None
+        
+        self.transitions.append(SwapTransition(old_status, new_status, seconds, created_at=now))
+        self.status = new_status
+        self.updated_at = now
+        
+        if seconds is not None:
+            category = Skill.query.with_entities(Skill.category)\
+                                  .filter_by(name=self.receiver_skill).scalar()
+            swap_funnel.queue(db.session, category, old_status, seconds)
+        return now
+    
     def accept(self):
         """Accept the swap request"""
-        self.status = 'accepted'
-        self.updated_at = datetime.utcnow()
+        self._transition('accepted')
     
     def reject(self):
         """Reject the swap request"""
-        self.status = 'rejected'
-        self.updated_at = datetime.utcnow()
+        self._transition('rejected')
     
     def complete(self):
         """Mark the swap as completed"""
-        self.status = 'completed'
-        self.completed_at = datetime.utcnow()
-        self.updated_at = datetime.utcnow()
+        self.completed_at = self._transition('completed')
     
     def cancel(self):
         """Cancel the swap request (only requester can do this)"""
         if self.status == 'pending':
-            self.status = 'cancelled'
-            self.updated_at = datetime.utcnow()
+            self._transition('cancelled')
+    
+    @classmethod
+    def cancel_pending_for_users(cls, user_ids):
+        """Cancel every pending swap sent or received by the given users in one batch"""
+        from .skill import Skill
+        from .swap_metrics import SwapTransition, swap_funnel
+        from .user_version import UserVersion
+        
+        user_ids = list(user_ids)
+        if not user_ids:
+            return 0
+        
+        pending = db.session.query(cls.id, cls.requester_id, cls.receiver_id, cls.receiver_skill,
+                                   cls.created_at, cls.updated_at).filter(
+            ((cls.requester_id.in_(user_ids)) | (cls.receiver_id.in_(user_ids))) &
+            (cls.status == 'pending')
+        ).all()
+        if not pending:
+            return 0
+        
+        now = datetime.utcnow()
+        swap_ids = [row.id for row in pending]
+        cls.query.filter(cls.id.in_(swap_ids), cls.status == 'pending')\
+                 .update({'status': 'cancelled', 'updated_at': now}, synchronize_session=False)
+        
+        transitions = []
+        for row in pending:
+            entered_at = row.updated_at or row.created_at
+            transitions.append({
+                'swap_id': row.id,
+                'from_status': 'pending',
+                'to_status': 'cancelled',
+                'seconds_in_state': (now - entered_at).total_seconds() if entered_at else None,
+                'created_at': now
+            })
+        db.session.execute(db.insert(SwapTransition), transitions)
+        
+        # The bulk UPDATE skips flush events, so bump both sides' swap stamps here
+        UserVersion.bump_in_session('swaps', [row.requester_id for row in pending] +
+                                    [row.receiver_id for row in pending])
+        
+        # Feed the funnel sketches, resolving categories with a single query
+        skill_names = {row.receiver_skill for row in pending}
+        categories = dict(db.session.query(Skill.name, Skill.category).filter(Skill.name.in_(skill_names)).all())
+        for row, transition in zip(pending, transitions):
+            if transition['seconds_in_state'] is not None:
+                swap_funnel.queue(db.session, categories.get(row.receiver_skill), 'pending',
+                                  transition['seconds_in_state'])
+        
+        return len(swap_ids)
+    
+    @classmethod
+    def get_or_archived(cls, swap_id):
+        """Get a swap from the hot table, or its SwapArchive once it has been archived"""
+        from .swap_archive import SwapArchive
+        return db.session.get(cls, swap_id) or db.session.get(SwapArchive, swap_id)
     
     @classmethod
     def get_user_requests(cls, user_id):
-        """Get all swap requests for a user (sent and received)"""
-        return cls.query.filter(
+        """Get all swap requests for a user (sent and received), archived ones included"""
+        from .swap_archive import SwapArchive
+        swaps = cls.query.filter(
             (cls.requester_id == user_id) | (cls.receiver_id == user_id)
         ).order_by(cls.created_at.desc()).all()
+        swaps.extend(SwapArchive.get_user_swaps(user_id))
+        swaps.sort(key=lambda swap: swap.created_at or datetime.min, reverse=True)
+        return swaps
     
     @classmethod
     def get_pending_requests(cls, user_id):
@@ -83,11 +165,12 @@ class SwapRequest(db.Model):
     
     @classmethod
     def get_completed_swaps(cls, user_id):
-        """Get completed swaps for a user"""
+        """Get completed swaps for a user, archived ones included"""
+        from .swap_archive import SwapArchive
         return cls.query.filter(
             ((cls.requester_id == user_id) | (cls.receiver_id == user_id)) &
             (cls.status == 'completed')
-        ).all()
+        ).all() + SwapArchive.get_user_swaps(user_id, status='completed')
     
     def can_be_cancelled_by(self, user_id):
         """Check if user can cancel this swap request"""
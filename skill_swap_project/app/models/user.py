@@ -1,7 +1,13 @@
-from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+import time
+from flask import session as flask_session
+from flask_login import UserMixin, user_logged_in
 from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
 from .. import db, login_manager
+from ..utils.identity_cache import identity_cache, detached_snapshot
+from ..utils.passwords import hash_password, verify_password, needs_rehash
+from ..utils.photos import variant_url
 
 class User(UserMixin, db.Model):
     """User model for authentication and profile management"""
@@ -16,6 +22,8 @@ class User(UserMixin, db.Model):
     availability = db.Column(db.String(50), default='weekends')
     is_public = db.Column(db.Boolean, default=True)
     is_banned = db.Column(db.Boolean, default=False)
+    deleted_at = db.Column(db.DateTime, index=True)  # Soft delete; personal data is purged in the background
+    sessions_revoked_at = db.Column(db.DateTime)  # Logins issued before this (sessions and remember cookies) are void
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -39,11 +47,19 @@ class User(UserMixin, db.Model):
     
     def set_password(self, password):
         """Hash and set password"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
         """Check if provided password matches hash"""
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        """Check if the stored hash uses outdated parameters"""
+        return needs_rehash(self.password_hash)
+    
+    def get_photo_url(self, variant='avatar'):
+        """Get the URL of a resized photo variant ('avatar' or 'thumb')"""
+        return variant_url(self.photo_url, variant)
     
     def to_dict(self):
         """Convert user to dictionary for API responses"""
@@ -53,12 +69,19 @@ class User(UserMixin, db.Model):
             'email': self.email,
             'location': self.location,
             'photo_url': self.photo_url,
+            'photo_thumb_url': self.get_photo_url('thumb'),
             'availability': self.availability,
             'is_public': self.is_public,
             'is_banned': self.is_banned,
+            'is_deleted': self.is_deleted,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
     
+    @property
+    def is_deleted(self):
+        """Check if the account was deleted (hidden everywhere, possibly not purged yet)"""
+        return self.deleted_at is not None
+    
     def get_skills_offered(self):
         """Get list of skills offered by user"""
         return [skill.skill_name for skill in self.skills_offered.filter_by(skill_type='offered').all()]
@@ -80,10 +103,78 @@ class User(UserMixin, db.Model):
 
 @login_manager.user_loader
 def load_user(user_id):
-    """Load user for Flask-Login (supports both User and Admin)"""
+    """Load user for Flask-Login (supports both User and Admin)
+
+    ``user_id`` is the principal id stamped with its login time in
+    milliseconds ('user-5@1700000000000', see _stamp_login), as kept in the
+    session and in the remember cookie.
+    """
     from .admin import Admin
-    if user_id.startswith("user-"):
-        return User.query.get(int(user_id.split("-")[1]))
-    elif user_id.startswith("admin-"):
-        return Admin.query.get(int(user_id.split("-")[1]))
-    return None 
\ No newline at end of file
+    principal_id, _, issued = user_id.partition('@')
+    if principal_id.startswith("user-"):
+        model = User
+    elif principal_id.startswith("admin-"):
+        model = Admin
+    else:
+        return None
+    
+    # Serve from the identity cache without touching the database
+    snapshot = identity_cache.get(principal_id)
+    if snapshot is not None:
+        return None if _issued_before_revocation(snapshot, issued) else db.session.merge(snapshot, load=False)
+    
+    # Taken before the read: a ban or deletion invalidated meanwhile keeps this snapshot out of the cache
+    generation = identity_cache.generation()
+    principal = db.session.get(model, int(principal_id.split("-")[1]))
+    if principal is None or getattr(principal, 'deleted_at', None) is not None:
+        # Deleted accounts are signed out of every session
+        return None
+    identity_cache.put(principal_id, detached_snapshot(principal), generation)
+    if _issued_before_revocation(principal, issued):
+        return None
+    return principal
+
+def _issued_before_revocation(principal, issued):
+    revoked_at = getattr(principal, 'sessions_revoked_at', None)
+    if revoked_at is None:
+        return False
+    # Logins without a stamp predate stamping, so any revocation voids them
+    return not issued.isdigit() or datetime.utcfromtimestamp(int(issued) / 1000) < revoked_at
+
+@user_logged_in.connect
+def _stamp_login(sender, user, **extra):
+    """Stamp the session's user id with the login time; Flask-Login copies it into the remember cookie"""
+    flask_session['_user_id'] = f'{user.get_id()}@{int(time.time() * 1000)}'
+
+def revoke_user_sessions(user_ids):
+    """Void every login of the given users issued until now, remember cookies included (the caller commits)"""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    User.query.filter(User.id.in_(user_ids)).update({'sessions_revoked_at': datetime.utcnow()},
+                                                    synchronize_session=False)
+    # Cached principals are dropped once the stamp is committed
+    db.session.info.setdefault('identity_invalidations', set()).update(f'user-{user_id}' for user_id in user_ids)
+
+def invalidate_principals(*principal_ids):
+    """Explicitly drop principals from the identity cache (for bulk UPDATEs that skip ORM events)"""
+    identity_cache.invalidate(*principal_ids)
+
+def queue_identity_invalidation(mapper, connection, target):
+    """Mapper event: drop the principal from the identity cache once the session commits"""
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('identity_invalidations', set()).add(target.get_id())
+
+event.listen(User, 'after_update', queue_identity_invalidation)
+event.listen(User, 'after_delete', queue_identity_invalidation)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_identities(session):
+    principal_ids = session.info.pop('identity_invalidations', None)
+    if principal_ids:
+        identity_cache.invalidate(*principal_ids)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_identity_invalidations(session):
+    session.info.pop('identity_invalidations', None)
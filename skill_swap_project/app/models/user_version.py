@@ -0,0 +1,110 @@
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .. import db
+
+VERSION_FIELDS = ('profile', 'skills', 'feedback', 'swaps')
+
+class UserVersion(db.Model):
+    """Per-user change stamps used to build ETags for profile pages and APIs"""
+    __tablename__ = 'user_versions'
+
+    # No foreign key: the row outlives a deleted user so old ETags never match again
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    profile = db.Column(db.Integer, nullable=False, default=0)
+    skills = db.Column(db.Integer, nullable=False, default=0)
+    feedback = db.Column(db.Integer, nullable=False, default=0)
+    swaps = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        """Convert versions to dictionary"""
+        return {
+            'user_id': self.user_id,
+            'profile': self.profile,
+            'skills': self.skills,
+            'feedback': self.feedback,
+            'swaps': self.swaps,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    @classmethod
+    def get_for_user(cls, user_id):
+        """Get the stamps of a user (all zero if nothing was recorded yet)"""
+        versions = db.session.get(cls, user_id)
+        if versions is None:
+            versions = cls(user_id=user_id, profile=0, skills=0, feedback=0, swaps=0)
+        return versions
+
+    @classmethod
+    def bump(cls, connection, field, user_ids):
+        """Increment one stamp for several users (upsert, inside the caller's transaction)"""
+        user_ids = sorted({user_id for user_id in user_ids if user_id is not None})
+        if not user_ids:
+            return
+        now = datetime.utcnow()
+        table = cls.__table__
+        column = table.c[field]
+        rows = [dict({name: 0 for name in VERSION_FIELDS}, user_id=user_id, updated_at=now) for user_id in user_ids]
+        for row in rows:
+            row[field] = 1
+
+        dialect = connection.dialect.name
+        if dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert
+            stmt = insert(table).values(rows)
+            stmt = stmt.on_duplicate_key_update({field: column + 1, 'updated_at': now})
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(table).values(rows)
+            stmt = stmt.on_conflict_do_update(index_elements=[table.c.user_id],
+                                              set_={field: column + 1, 'updated_at': now})
+        else:
+            existing = {user_id for (user_id,) in connection.execute(
+                db.select(table.c.user_id).where(table.c.user_id.in_(user_ids)))}
+            connection.execute(table.update().where(table.c.user_id.in_(existing))
+                               .values({field: column + 1, 'updated_at': now}))
+            rows = [row for row in rows if row['user_id'] not in existing]
+            if rows:
+                connection.execute(table.insert(), rows)
+            return
+        connection.execute(stmt)
+
+    @classmethod
+    def bump_in_session(cls, field, user_ids):
+        """Increment a stamp in the current session's transaction (for bulk UPDATEs that skip ORM events)"""
+        cls.bump(db.session.connection(), field, user_ids)
+
+def _affected_users(obj):
+    """Map a changed ORM object to (stamp, user ids) pairs"""
+    from .user import User
+    from .user_skill import UserSkill
+    from .availability import Availability
+    from .feedback import Feedback
+    from .swap_request import SwapRequest
+
+    if isinstance(obj, User):
+        return [('profile', (obj.id,))]
+    if isinstance(obj, UserSkill):
+        return [('skills', (obj.user_id,))]
+    if isinstance(obj, Availability):
+        return [('profile', (obj.user_id,))]
+    if isinstance(obj, Feedback):
+        return [('feedback', (obj.rated_user_id,))]
+    if isinstance(obj, SwapRequest):
+        return [('swaps', (obj.requester_id, obj.receiver_id))]
+    return []
+
+@event.listens_for(Session, 'after_flush')
+def _bump_user_versions(session, flush_context):
+    """Bump the stamps of every user touched by the flush, in the same transaction"""
+    bumps = {}
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+            continue
+        for field, user_ids in _affected_users(obj):
+            bumps.setdefault(field, set()).update(user_ids)
+    if bumps:
+        connection = session.connection()
+        for field, user_ids in bumps.items():
+            UserVersion.bump(connection, field, user_ids)
@@ -1,22 +1,25 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file, current_app
 from flask_login import login_required, current_user
 from functools import wraps
-from ..models import User, Admin, Skill, UserSkill, SwapRequest, Feedback
-from .. import db
+from ..models import User, Admin, Skill, UserSkill, SwapRequest, Feedback, PlatformMessage, UserVersion, ProfileJob, AccountPurge, SwapArchive, SkillCategory
+from ..models.user import invalidate_principals
+from .. import db, limiter
+from ..utils.validators import format_duration
+from ..utils.socket_registry import disconnect_principals, paced_broadcast
+from ..utils.server_session import revoke_sessions
 import csv
 import io
 from datetime import datetime, timedelta
 
 admin_bp = Blueprint('admin', __name__)
 
+BULK_MODERATION_LIMIT = 1000
+REPORT_BATCH_SIZE = 1000  # Swaps loaded per query by the swaps report
+
 def admin_required(f):
     """Decorator to require admin access"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        print(f"Admin required check - Current user: {current_user}")
-        print(f"Current user authenticated: {current_user.is_authenticated}")
-        print(f"Current user has role: {hasattr(current_user, 'role') if current_user.is_authenticated else 'N/A'}")
-        
         if not current_user.is_authenticated or not hasattr(current_user, 'role'):
             flash('Admin access required', 'error')
             return redirect(url_for('auth.admin_login'))
@@ -27,17 +30,14 @@ def admin_required(f):
 @admin_required
 def dashboard():
     """Admin dashboard"""
-    print("Admin dashboard accessed successfully!")
-    print(f"Current user: {current_user}")
-    print(f"User role: {current_user.role if hasattr(current_user, 'role') else 'None'}")
     # Get statistics
     total_users = User.query.count()
     active_users = User.query.filter_by(is_banned=False).count()
     banned_users = User.query.filter_by(is_banned=True).count()
     
-    total_swaps = SwapRequest.query.count()
+    total_swaps = SwapRequest.query.count() + SwapArchive.count_swaps()
     pending_swaps = SwapRequest.query.filter_by(status='pending').count()
-    completed_swaps = SwapRequest.query.filter_by(status='completed').count()
+    completed_swaps = SwapRequest.query.filter_by(status='completed').count() + SwapArchive.count_swaps(status='completed')
     
     total_skills = Skill.query.count()
     approved_skills = Skill.query.filter_by(is_approved=True).count()
@@ -68,7 +68,7 @@ def manage_users():
     search = request.args.get('search', '').strip()
     status = request.args.get('status', 'all')
     
-    query = User.query
+    query = User.query.filter(User.deleted_at.is_(None))
     
     if search:
         query = query.filter(User.name.ilike(f'%{search}%') | User.email.ilike(f'%{search}%'))
@@ -97,7 +97,12 @@ def ban_user(user_id):
         flash('User is already banned', 'info')
     else:
         user.is_banned = True
+        SwapRequest.cancel_pending_for_users([user.id])
         db.session.commit()
+        
+        revoke_sessions(current_app, [user.get_id()])
+        from .. import socketio
+        disconnect_principals(socketio, [user.get_id()], rooms=[f'user_{user.id}'])
         flash(f'User {user.name} has been banned', 'success')
     
     return redirect(url_for('admin.manage_users'))
@@ -117,6 +122,63 @@ def unban_user(user_id):
     
     return redirect(url_for('admin.manage_users'))
 
+@admin_bp.route('/admin/users/bulk', methods=['POST'])
+@admin_required
+def bulk_moderate_users():
+    """Ban, unban or sign out a set of users at once"""
+    action = request.form.get('action')
+    user_ids = sorted(set(request.form.getlist('user_ids', type=int)))
+    
+    if action not in ('ban', 'unban', 'revoke'):
+        flash('Invalid bulk action', 'error')
+        return redirect(url_for('admin.manage_users'))
+    
+    if not user_ids:
+        flash('No users selected', 'info')
+        return redirect(url_for('admin.manage_users'))
+    
+    if len(user_ids) > BULK_MODERATION_LIMIT:
+        flash(f'You can moderate at most {BULK_MODERATION_LIMIT} users at once', 'error')
+        return redirect(url_for('admin.manage_users'))
+    
+    principal_ids = [f'user-{user_id}' for user_id in user_ids]
+    
+    if action == 'revoke':
+        # Sign the users out everywhere without changing their status
+        revoked = revoke_sessions(current_app, principal_ids)
+        from .. import socketio
+        disconnect_principals(socketio, principal_ids, rooms=[f'user_{user_id}' for user_id in user_ids])
+        flash(f'{revoked} sessions revoked', 'success')
+        return redirect(url_for('admin.manage_users'))
+    
+    banned = action == 'ban'
+    
+    # Single UPDATE for every affected user
+    updated = User.query.filter(User.id.in_(user_ids), User.is_banned != banned)\
+                        .update({'is_banned': banned, 'updated_at': datetime.utcnow()},
+                                synchronize_session=False)
+    UserVersion.bump_in_session('profile', user_ids)
+    
+    cancelled = 0
+    if banned:
+        cancelled = SwapRequest.cancel_pending_for_users(user_ids)
+    
+    db.session.commit()
+    
+    # The bulk UPDATE bypasses ORM events, so drop cached principals explicitly
+    invalidate_principals(*principal_ids)
+    
+    if banned:
+        # Kick banned users off their sessions and live sockets right away
+        revoke_sessions(current_app, principal_ids)
+        from .. import socketio
+        disconnect_principals(socketio, principal_ids, rooms=[f'user_{user_id}' for user_id in user_ids])
+        flash(f'{updated} users banned, {cancelled} pending swaps cancelled', 'success')
+    else:
+        flash(f'{updated} users unbanned', 'success')
+    
+    return redirect(url_for('admin.manage_users'))
+
 @admin_bp.route('/admin/skills')
 @admin_required
 def manage_skills():
@@ -142,7 +204,48 @@ def manage_skills():
     return render_template('admin/manage_skills.html',
                          skills=skills,
                          search=search,
-                         status=status)
+                         status=status,
+                         categories=SkillCategory.get_tree())
+
+@admin_bp.route('/admin/categories', methods=['POST'])
+@admin_required
+def create_category():
+    """Add a node to the skill taxonomy"""
+    name = request.form.get('name', '').strip()
+    parent_id = request.form.get('parent_id', type=int)
+    parent = db.session.get(SkillCategory, parent_id) if parent_id else None
+    
+    if not name or '>' in name:
+        flash('Category name is required and cannot contain ">"', 'error')
+    elif parent_id and parent is None:
+        flash('Parent category not found', 'error')
+    elif SkillCategory.query.filter_by(parent_id=parent_id if parent else None, name=name).first():
+        flash(f'Category {name} already exists there', 'info')
+    else:
+        node = SkillCategory.create(name, parent)
+        db.session.commit()
+        flash(f'Category {" > ".join(n.name for n in node.get_breadcrumb())} has been created', 'success')
+    
+    return redirect(url_for('admin.manage_skills'))
+
+@admin_bp.route('/admin/skill/<int:skill_id>/category', methods=['POST'])
+@admin_required
+def set_skill_category(skill_id):
+    """File a skill under a taxonomy node (its user skills' counts move along on commit)"""
+    skill = Skill.query.get_or_404(skill_id)
+    category_id = request.form.get('category_id', type=int)
+    category = db.session.get(SkillCategory, category_id) if category_id else None
+    
+    if category_id and category is None:
+        flash('Category not found', 'error')
+    else:
+        skill.category_id = category.id if category else None
+        if category:
+            skill.category = category.get_breadcrumb()[0].name[:50]
+        db.session.commit()
+        flash(f'Skill {skill.name} filed under {category.name if category else "no category"}', 'success')
+    
+    return redirect(url_for('admin.manage_skills', page=request.form.get('page', 1, type=int)))
 
 @admin_bp.route('/admin/skill/<int:skill_id>/approve', methods=['POST'])
 @admin_required
@@ -200,7 +303,8 @@ def manage_swaps():
 @admin_required
 def manage_messages():
     """Manage platform-wide messages"""
-    return render_template('admin/manage_messages.html')
+    recent_messages = PlatformMessage.get_recent()
+    return render_template('admin/manage_messages.html', recent_messages=recent_messages)
 
 @admin_bp.route('/admin/messages/send', methods=['POST'])
 @admin_required
@@ -214,18 +318,23 @@ def send_platform_message():
         flash('Title and message are required', 'error')
         return redirect(url_for('admin.manage_messages'))
     
-    # Store the message in database (you can create a PlatformMessage model)
-    # For now, we'll emit it via Socket.IO to all connected users
+    # Store the message so offline users receive it on their next connect
+    platform_message = PlatformMessage(
+        title=title,
+        message=message,
+        message_type=message_type,
+        admin_id=current_user.id
+    )
+    db.session.add(platform_message)
+    db.session.commit()
     
-    # Emit to all connected users
+    # Fan out to connected users in paced batches of shard rooms
     from .. import socketio
-    print("Emitting platform_message to all users")
-    socketio.emit('platform_message', {
-        'title': title,
-        'message': message,
-        'type': message_type,
-        'timestamp': datetime.utcnow().isoformat()
-    })
+    config = current_app.config
+    socketio.start_background_task(paced_broadcast, socketio, 'platform_message', platform_message.to_dict(),
+                                   config['PLATFORM_BROADCAST_SHARDS'],
+                                   config['PLATFORM_BROADCAST_BATCH'],
+                                   config['PLATFORM_BROADCAST_PAUSE'])
     
     flash(f'Platform message "{title}" sent successfully', 'success')
     return redirect(url_for('admin.manage_messages'))
@@ -276,29 +385,55 @@ def analytics():
     # Swap activity trends
     new_swaps = SwapRequest.query.filter(
         SwapRequest.created_at >= start_date
-    ).count()
+    ).count() + SwapArchive.count_swaps(created_since=start_date)
     
     completed_swaps = SwapRequest.query.filter(
         SwapRequest.completed_at >= start_date
-    ).count()
+    ).count() + SwapArchive.count_swaps(completed_since=start_date)
     
-    # Top skills
+    # Top skills (the trending counters cover the last week; longer periods are counted from user_skills)
     from sqlalchemy import func
-    top_skills = db.session.query(
-        UserSkill.skill_name,
-        func.count(UserSkill.id).label('count')
-    ).filter(
-        UserSkill.created_at >= start_date
-    ).group_by(UserSkill.skill_name).order_by(
-        func.count(UserSkill.id).desc()
-    ).limit(10).all()
+    from ..models.skill_trend import skill_trends, EVENTS as TREND_EVENTS
+    if days == 7 and skill_trends.loaded:
+        top_skills = skill_trends.top('added', 'week', 10)
+    else:
+        top_skills = db.session.query(
+            UserSkill.skill_name,
+            func.count(UserSkill.id).label('count')
+        ).filter(
+            UserSkill.created_at >= start_date
+        ).group_by(UserSkill.skill_name).order_by(
+            func.count(UserSkill.id).desc()
+        ).limit(10).all()
+    
+    # Trending skills per event over the selected window
+    trend_window = request.args.get('trend', 'day')
+    if trend_window not in ('hour', 'day', 'week'):
+        trend_window = 'day'
+    trending = {name: skill_trends.top(name, trend_window, 10) for name in TREND_EVENTS}
+    
+    # Time-in-state percentiles per skill category (from streaming sketches)
+    from ..models.swap_metrics import swap_funnel
+    swap_latency = []
+    for (category, stage), sketch in sorted(swap_funnel.get_sketches().items()):
+        swap_latency.append({
+            'category': category,
+            'stage': stage,
+            'count': sketch.count,
+            'p50': format_duration(sketch.quantile(0.5)),
+            'p90': format_duration(sketch.quantile(0.9)),
+            'p99': format_duration(sketch.quantile(0.99))
+        })
     
     return render_template('admin/analytics.html',
                          days=days,
                          new_users=new_users,
                          new_swaps=new_swaps,
                          completed_swaps=completed_swaps,
-                         top_skills=top_skills)
+                         top_skills=top_skills,
+                         trend_window=trend_window,
+                         trending=trending,
+                         swap_latency=swap_latency)
 
 @admin_bp.route('/admin/profile')
 @admin_required
@@ -314,12 +449,13 @@ def generate_users_report():
     # Write header
     writer.writerow(['ID', 'Name', 'Email', 'Location', 'Status', 'Created At', 'Total Swaps', 'Avg Rating'])
     
-    # Get all users with their stats
+    # Get all users with their stats (archived swaps counted once for everyone)
     users = User.query.all()
+    archived_swaps = SwapArchive.count_swaps_by_user()
     for user in users:
         total_swaps = SwapRequest.query.filter(
             (SwapRequest.requester_id == user.id) | (SwapRequest.receiver_id == user.id)
-        ).count()
+        ).count() + archived_swaps.get(user.id, 0)
         
         avg_rating = Feedback.get_user_average_rating(user.id)
         
@@ -346,22 +482,28 @@ def generate_swaps_report():
     # Write header
     writer.writerow(['ID', 'Requester', 'Receiver', 'Requester Skill', 'Receiver Skill', 'Status', 'Created At', 'Completed At'])
     
-    # Get all swaps
-    swaps = SwapRequest.query.all()
-    for swap in swaps:
-        requester = User.query.get(swap.requester_id)
-        receiver = User.query.get(swap.receiver_id)
-        
-        writer.writerow([
-            swap.id,
-            requester.name if requester else 'Unknown',
-            receiver.name if receiver else 'Unknown',
-            swap.requester_skill,
-            swap.receiver_skill,
-            swap.status,
-            swap.created_at.strftime('%Y-%m-%d %H:%M:%S') if swap.created_at else '',
-            swap.completed_at.strftime('%Y-%m-%d %H:%M:%S') if swap.completed_at else ''
-        ])
+    # Walk all swaps, archived ones included, in id batches with the batch's user names in one query
+    for model in (SwapRequest, SwapArchive):
+        last_id = 0
+        while True:
+            swaps = model.query.filter(model.id > last_id).order_by(model.id).limit(REPORT_BATCH_SIZE).all()
+            if not swaps:
+                break
+            last_id = swaps[-1].id
+            user_ids = {swap.requester_id for swap in swaps} | {swap.receiver_id for swap in swaps}
+            names = dict(db.session.query(User.id, User.name).filter(User.id.in_(user_ids)))
+            
+            for swap in swaps:
+                writer.writerow([
+                    swap.id,
+                    names.get(swap.requester_id, 'Unknown'),
+                    names.get(swap.receiver_id, 'Unknown'),
+                    swap.requester_skill,
+                    swap.receiver_skill,
+                    swap.status,
+                    swap.created_at.strftime('%Y-%m-%d %H:%M:%S') if swap.created_at else '',
+                    swap.completed_at.strftime('%Y-%m-%d %H:%M:%S') if swap.completed_at else ''
+                ])
     
     return output.getvalue()
 
@@ -399,8 +541,10 @@ def generate_activity_report():
     # Write header
     writer.writerow(['User ID', 'User Name', 'Email', 'Registration Date', 'Last Login', 'Total Skills', 'Total Swaps', 'Completed Swaps', 'Avg Rating', 'Status'])
     
-    # Get all users with their activity stats
+    # Get all users with their activity stats (archived swaps counted once for everyone)
     users = User.query.all()
+    archived_swaps = SwapArchive.count_swaps_by_user()
+    archived_completed = SwapArchive.count_swaps_by_user(status='completed')
     for user in users:
         # Count user's skills
         total_skills = UserSkill.query.filter_by(user_id=user.id).count()
@@ -408,13 +552,13 @@ def generate_activity_report():
         # Count user's swaps
         total_swaps = SwapRequest.query.filter(
             (SwapRequest.requester_id == user.id) | (SwapRequest.receiver_id == user.id)
-        ).count()
+        ).count() + archived_swaps.get(user.id, 0)
         
         # Count completed swaps
         completed_swaps = SwapRequest.query.filter(
             ((SwapRequest.requester_id == user.id) | (SwapRequest.receiver_id == user.id)) &
             (SwapRequest.status == 'completed')
-        ).count()
+        ).count() + archived_completed.get(user.id, 0)
         
         # Get average rating
         avg_rating = Feedback.get_user_average_rating(user.id)
@@ -444,9 +588,9 @@ def get_admin_stats():
     """Get admin dashboard statistics"""
     total_users = User.query.count()
     active_users = User.query.filter_by(is_banned=False).count()
-    total_swaps = SwapRequest.query.count()
+    total_swaps = SwapRequest.query.count() + SwapArchive.count_swaps()
     pending_swaps = SwapRequest.query.filter_by(status='pending').count()
-    completed_swaps = SwapRequest.query.filter_by(status='completed').count()
+    completed_swaps = SwapRequest.query.filter_by(status='completed').count() + SwapArchive.count_swaps(status='completed')
     
     # Get recent activity (last 7 days)
     week_ago = datetime.utcnow() - timedelta(days=7)
@@ -461,4 +605,124 @@ def get_admin_stats():
         'completed_swaps': completed_swaps,
         'new_users_week': new_users_week,
         'new_swaps_week': new_swaps_week
-    }) 
\ No newline at end of file
+    }) 
+
+@admin_bp.route('/api/admin/email-index')
+@admin_required
+def get_email_index_stats():
+    """Get memory and false positive metrics of the email Bloom filter"""
+    from ..utils.email_index import email_index
+    return jsonify(email_index.stats())
+
+@admin_bp.route('/api/admin/profiler/jobs', methods=['POST'])
+@admin_required
+@limiter.limit('profiler')
+def start_profile_job():
+    """Start a CPU or memory profile on every live worker"""
+    from ..utils.profiler import profiler
+    data = request.get_json(silent=True) or {}
+    kind = data.get('kind', 'cpu')
+    if kind not in ('cpu', 'memory'):
+        return jsonify({'error': 'kind must be cpu or memory'}), 400
+    try:
+        seconds = float(data.get('seconds', 10))
+        interval = float(data.get('interval', 0.01))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'seconds and interval must be numbers'}), 400
+    if not 0 < seconds <= profiler.max_seconds:
+        return jsonify({'error': f'seconds must be between 0 and {profiler.max_seconds}'}), 400
+    if not 0.001 <= interval <= 1:
+        return jsonify({'error': 'interval must be between 0.001 and 1'}), 400
+    
+    job = ProfileJob(kind, seconds, interval if kind == 'cpu' else None, requested_by=current_user.id)
+    db.session.add(job)
+    db.session.commit()
+    # This worker starts right away; the others join on their next poll
+    profiler.maybe_poll(current_app._get_current_object(), force=True)
+    return jsonify(job.to_dict()), 201
+
+@admin_bp.route('/api/admin/profiler/jobs')
+@admin_required
+def get_profile_jobs():
+    """Get the most recent profile jobs"""
+    return jsonify({'jobs': [job.to_dict() for job in ProfileJob.get_recent()]})
+
+@admin_bp.route('/api/admin/profiler/jobs/<int:job_id>')
+@admin_required
+def get_profile_job(job_id):
+    """Get a profile job with each worker's output (?format=collapsed merges cpu stacks for flamegraphs)"""
+    job = ProfileJob.query.get_or_404(job_id)
+    if request.args.get('format') == 'collapsed':
+        if job.kind != 'cpu':
+            return jsonify({'error': 'Only cpu jobs have collapsed stacks'}), 400
+        return current_app.response_class(job.collapsed_stacks(), mimetype='text/plain')
+    return jsonify(job.to_dict(include_results=True))
+
+@admin_bp.route('/api/admin/account-purges')
+@admin_required
+def get_account_purges():
+    """Get the progress of recent account purges"""
+    return jsonify({'purges': [purge.to_dict() for purge in AccountPurge.get_recent()]})
+
+@admin_bp.route('/api/admin/skill-categories')
+@admin_required
+def get_skill_categories():
+    """Get the whole skill taxonomy in depth-first order with the skills filed at each node"""
+    filed = {}
+    for category_id, name in db.session.query(Skill.category_id, Skill.name).filter(Skill.category_id.isnot(None)):
+        filed.setdefault(category_id, []).append(name)
+    return jsonify({
+        'categories': [dict(node.to_dict(), skills=sorted(filed.get(node.id, []))) for node in SkillCategory.get_tree()],
+        'uncategorized_skills': Skill.query.filter(Skill.category_id.is_(None)).count()
+    })
+
+@admin_bp.route('/api/admin/trending-skills')
+@admin_required
+def get_trending_skill_stats():
+    """Get top skills per event and window with the trending counters' memory use (unapproved skills included)"""
+    from ..models.skill_trend import skill_trends, EVENTS, WINDOWS
+    limit = min(request.args.get('limit', 10, type=int), skill_trends.top_k)
+    return jsonify({
+        'top': {window: {name: skill_trends.top(name, window, limit) for name in EVENTS} for window in WINDOWS},
+        'stats': skill_trends.stats()
+    })
+
+@admin_bp.route('/api/admin/recommendations')
+@admin_required
+def get_recommendation_stats():
+    """Get stored recommendation lists, users due for a refresh and the last refresh run"""
+    from ..utils.recommendations import recommender
+    return jsonify(recommender.stats())
+
+@admin_bp.route('/api/admin/swap-archive')
+@admin_required
+def get_swap_archive_stats():
+    """Get hot and archived swap counts and the last archive run"""
+    from ..utils.swap_archive import swap_archiver
+    return jsonify(swap_archiver.stats())
+
+@admin_bp.route('/api/admin/fragment-cache')
+@admin_required
+def get_fragment_cache_stats():
+    """Get hit rate and memory use of the rendered fragment cache"""
+    from ..utils.fragment_cache import fragment_cache
+    return jsonify(fragment_cache.stats())
+
+@admin_bp.route('/api/admin/replicas')
+@admin_required
+def get_replica_stats():
+    """Get lag, health and routed reads of the read replicas"""
+    from ..utils.replicas import replicas
+    return jsonify(replicas.stats())
+
+@admin_bp.route('/api/admin/rate-limits')
+@admin_required
+def get_rate_limit_stats():
+    """Get allowed/rejected request counters per rate-limit policy"""
+    from .. import limiter
+    return jsonify({
+        'backend': type(limiter.backend).__name__,
+        'policies': {name: {'limit': limit, 'period': period, 'key': key_type}
+                     for name, (limit, period, key_type) in limiter.policies.items()},
+        'stats': limiter.stats()
+    })
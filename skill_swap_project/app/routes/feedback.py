@@ -1,7 +1,8 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort
 from flask_login import login_required, current_user
 from ..models import Feedback, SwapRequest, User
 from .. import db
+from ..utils.conditional import conditional_get, user_validator
 
 feedback_bp = Blueprint('feedback', __name__)
 
@@ -9,7 +10,9 @@ feedback_bp = Blueprint('feedback', __name__)
 @login_required
 def add_feedback(swap_id):
     """Add feedback for a completed swap"""
-    swap_request = SwapRequest.query.get_or_404(swap_id)
+    swap_request = SwapRequest.get_or_archived(swap_id)
+    if swap_request is None:
+        abort(404)
     
     # Check if current user participated in this swap
     if swap_request.requester_id != current_user.id and swap_request.receiver_id != current_user.id:
@@ -107,6 +110,8 @@ def delete_feedback(feedback_id):
     return redirect(url_for('swaps.view_swap', swap_id=swap_id))
 
 @feedback_bp.route('/user/<int:user_id>/reviews')
+@conditional_get(lambda user_id: user_validator('user_reviews', user_id, ('profile', 'feedback'),
+                                                viewer_fields=('profile',)))
 def user_reviews(user_id):
     """View all reviews for a user"""
     user = User.query.get_or_404(user_id)
@@ -115,7 +120,7 @@ def user_reviews(user_id):
         flash('This profile is private', 'error')
         return redirect(url_for('users.search_users'))
     
-    if user.is_banned:
+    if user.is_banned or user.is_deleted:
         flash('This user has been banned', 'error')
         return redirect(url_for('users.search_users'))
     
@@ -141,6 +146,7 @@ def user_reviews(user_id):
 
 # API endpoints
 @feedback_bp.route('/api/user/<int:user_id>/rating')
+@conditional_get(lambda user_id: user_validator('rating', user_id, ('feedback',)))
 def get_user_rating(user_id):
     """Get user's average rating via API"""
     avg_rating = Feedback.get_user_average_rating(user_id)
@@ -158,7 +164,15 @@ def can_rate_swap(swap_id):
     can_rate = Feedback.can_user_rate_swap(current_user.id, swap_id)
     return jsonify({'can_rate': can_rate})
 
+def _feedback_validator(feedback_id):
+    """Any edit of a feedback bumps the feedback stamp of the rated user"""
+    feedback = db.session.get(Feedback, feedback_id)
+    if feedback is None:
+        return None
+    return user_validator(f'feedback_{feedback_id}', feedback.rated_user_id, ('feedback',))
+
 @feedback_bp.route('/api/feedback/<int:feedback_id>')
+@conditional_get(_feedback_validator)
 def get_feedback(feedback_id):
     """Get specific feedback via API"""
     feedback = Feedback.query.get_or_404(feedback_id)
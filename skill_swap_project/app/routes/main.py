@@ -1,10 +1,14 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import current_user, logout_user
+from ..models import User, Recommendation
 
 main_bp = Blueprint('main', __name__)
 
 @main_bp.before_app_request
 def block_banned_users():
+    if current_user.is_authenticated and getattr(current_user, 'is_deleted', False):
+        logout_user()
+        return redirect(url_for('auth.login'))
     if current_user.is_authenticated and hasattr(current_user, 'is_banned') and current_user.is_banned:
         logout_user()
         if request.endpoint != 'auth.login':
@@ -14,7 +18,10 @@ def block_banned_users():
 @main_bp.route('/')
 def index():
     """Homepage"""
-    return render_template('index.html')
+    recommendations = []
+    if current_user.is_authenticated and isinstance(current_user, User):
+        recommendations = Recommendation.get_for_user(current_user.id, limit=6)
+    return render_template('index.html', recommendations=recommendations)
 
 @main_bp.route('/about')
 def about():
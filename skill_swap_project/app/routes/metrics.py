@@ -0,0 +1,34 @@
+import hmac
+from flask import Blueprint, Response, jsonify, request, current_app, abort
+from flask_login import current_user
+from functools import wraps
+from ..models import Admin
+
+metrics_bp = Blueprint('metrics', __name__)
+
+def metrics_access_required(f):
+    """Decorator allowing signed-in admins or scrapers sending `Authorization: Bearer <METRICS_TOKEN>`"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = current_app.config.get('METRICS_TOKEN')
+        header = request.headers.get('Authorization', '')
+        if token and header.startswith('Bearer ') and hmac.compare_digest(header[7:].encode(), token.encode()):
+            return f(*args, **kwargs)
+        if current_user.is_authenticated and isinstance(current_user._get_current_object(), Admin):
+            return f(*args, **kwargs)
+        abort(403)
+    return decorated_function
+
+@metrics_bp.route('/metrics')
+@metrics_access_required
+def prometheus():
+    """Export this worker's metrics in the Prometheus text format"""
+    from ..utils.metrics import metrics
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@metrics_bp.route('/metrics/db-pool')
+@metrics_access_required
+def db_pool():
+    """Get connection pool sizes, checkout waits and connection lifetimes per bind"""
+    from ..utils.pool_metrics import pool_metrics
+    return jsonify(pool_metrics.stats())
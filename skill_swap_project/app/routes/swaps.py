@@ -1,9 +1,11 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, abort
 from flask_login import login_required, current_user
-from ..models import SwapRequest, User, UserSkill, Feedback
-from .. import db, socketio
+from ..models import SwapRequest, User, UserSkill, Feedback, PlatformMessage, PlatformMessageCursor
+from .. import db, socketio, limiter
+from ..utils.socket_registry import socket_registry, broadcast_room
+from ..models.skill_trend import skill_trends
 from datetime import datetime
-from flask_socketio import join_room, leave_room
+from flask_socketio import join_room, leave_room, emit
 
 swaps_bp = Blueprint('swaps', __name__)
 
@@ -25,16 +27,29 @@ def my_swaps():
         status='pending'
     ).all()
     
+    # Load every partner at once, so swap.requester/receiver come from the identity map
+    # (which only holds weak references: keep the list alive while rendering)
+    swaps = pending_received + pending_sent + active_swaps + completed_swaps
+    user_ids = {swap.requester_id for swap in swaps} | {swap.receiver_id for swap in swaps}
+    partners = User.query.filter(User.id.in_(user_ids)).all() if user_ids else []
+    
+    # Completed swaps the user has not rated yet (one query instead of one per swap)
+    completed_ids = [swap.id for swap in completed_swaps]
+    rated_ids = {swap_id for (swap_id,) in db.session.query(Feedback.swap_id).filter(
+        Feedback.rater_id == current_user.id, Feedback.swap_id.in_(completed_ids)
+    )} if completed_ids else set()
+    
     return render_template('swaps/my_swaps.html',
                          pending_received=pending_received,
                          pending_sent=pending_sent,
                          active_swaps=active_swaps,
                          completed_swaps=completed_swaps,
                          all_swaps=all_swaps,
-                         Feedback=Feedback)
+                         rateable_swap_ids=set(completed_ids) - rated_ids)
 
 @swaps_bp.route('/swap/request', methods=['POST'])
 @login_required
+@limiter.limit('swap_request')
 def send_swap_request():
     """Send a swap request to another user"""
     receiver_id = request.form.get('receiver_id', type=int)
@@ -49,7 +64,7 @@ def send_swap_request():
     
     # Check if receiver exists and is not banned
     receiver = User.query.get(receiver_id)
-    if not receiver or receiver.is_banned:
+    if not receiver or receiver.is_banned or receiver.is_deleted:
         flash('Invalid user', 'error')
         return redirect(url_for('users.search_users'))
     
@@ -106,6 +121,7 @@ def send_swap_request():
     )
     
     db.session.add(swap_request)
+    skill_trends.queue(db.session, 'requested', receiver_skill)
     db.session.commit()
     
     # Emit real-time notification
@@ -233,8 +249,10 @@ def complete_swap(swap_id):
 @swaps_bp.route('/swap/<int:swap_id>')
 @login_required
 def view_swap(swap_id):
-    """View details of a specific swap"""
-    swap_request = SwapRequest.query.get_or_404(swap_id)
+    """View details of a specific swap (archived swaps included)"""
+    swap_request = SwapRequest.get_or_archived(swap_id)
+    if swap_request is None:
+        abort(404)
     
     # Check if current user participated in this swap
     if swap_request.requester_id != current_user.id and swap_request.receiver_id != current_user.id:
@@ -276,12 +294,25 @@ def get_active_count():
 @socketio.on('connect')
 def handle_connect(auth):
     """Handle WebSocket connection"""
+    shards = current_app.config['PLATFORM_BROADCAST_SHARDS']
     if current_user.is_authenticated:
         join_room(f'user_{current_user.id}')
+        socket_registry.register(current_user.get_id(), request.sid)
+        
+        if isinstance(current_user, User):
+            join_room(broadcast_room(shards, user_id=current_user.id))
+            # Deliver broadcasts sent while the user was offline
+            for platform_message in PlatformMessage.get_unseen(current_user.id):
+                emit('platform_message', platform_message.to_dict())
+        else:
+            join_room(broadcast_room(shards, sid=request.sid))
+    else:
+        join_room(broadcast_room(shards, sid=request.sid))
 
 @socketio.on('disconnect')
-def handle_disconnect(auth):
+def handle_disconnect(reason=None):
     """Handle WebSocket disconnection"""
+    socket_registry.unregister(request.sid)
     if current_user.is_authenticated:
         leave_room(f'user_{current_user.id}')
 
@@ -338,6 +369,7 @@ def get_messages(swap_id):
 
 @swaps_bp.route('/api/swap/<int:swap_id>/messages', methods=['POST'])
 @login_required
+@limiter.limit('chat_message')
 def send_message(swap_id):
     """Send a message in a swap chat"""
     swap_request = SwapRequest.query.get_or_404(swap_id)
@@ -371,6 +403,13 @@ def send_message(swap_id):
     
     return jsonify(message_data)
 
+@socketio.on('platform_message_seen')
+def handle_platform_message_seen(data):
+    """Advance the user's platform message delivery cursor"""
+    message_id = data.get('id') if isinstance(data, dict) else None
+    if isinstance(message_id, int) and current_user.is_authenticated and isinstance(current_user, User):
+        PlatformMessageCursor.mark_seen(current_user.id, message_id)
+
 @socketio.on('join_swap_chat')
 def handle_join_swap_chat(data):
     """Join a swap chat room"""
@@ -379,7 +418,7 @@ def handle_join_swap_chat(data):
         swap_request = SwapRequest.query.get(swap_id)
         if swap_request and (swap_request.requester_id == current_user.id or swap_request.receiver_id == current_user.id):
             room_name = f'swap_{swap_id}'
-            socketio.join_room(room_name)
+            join_room(room_name)
 
 @socketio.on('leave_swap_chat')
 def handle_leave_swap_chat(data):
@@ -387,6 +426,6 @@ def handle_leave_swap_chat(data):
     swap_id = data.get('swap_id')
     if swap_id and current_user.is_authenticated:
         room_name = f'swap_{swap_id}'
-        socketio.leave_room(room_name)
+        leave_room(room_name)
 
  
\ No newline at end of file
@@ -1,10 +1,15 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
-from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
-import os
-from ..models import User, UserSkill, Skill, Availability, Feedback
-from .. import db
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, abort
+from flask_login import login_required, current_user, logout_user
+from datetime import datetime
+from ..models import User, UserSkill, Skill, Availability, Feedback, UserVersion, SwapRequest, AccountPurge, Recommendation, SkillCategory
+from .. import db, socketio
 from ..utils.validators import validate_skill_name
+from ..utils.photos import store_photo, schedule_variants, PhotoError
+from ..utils.conditional import conditional_get, user_validator
+from ..utils.fragment_cache import fragment_cache, render_user_cards
+from ..utils.account_purge import schedule_purge
+from ..utils.socket_registry import disconnect_principals
+from ..models.skill_trend import skill_trends, EVENTS as TREND_EVENTS, WINDOWS as TREND_WINDOWS
 
 users_bp = Blueprint('users', __name__)
 
@@ -33,13 +38,17 @@ def profile():
     from ..models import SwapRequest
     recent_swaps = SwapRequest.get_user_requests(current_user.id)[:5]
     
+    # Precomputed partner suggestions
+    recommendations = Recommendation.get_for_user(current_user.id, limit=5)
+    
     return render_template('users/profile.html',
                          offered_skills=offered_skills,
                          wanted_skills=wanted_skills,
                          availability=availability,
                          avg_rating=avg_rating,
                          rating_count=rating_count,
-                         recent_swaps=recent_swaps)
+                         recent_swaps=recent_swaps,
+                         recommendations=recommendations)
 
 @users_bp.route('/profile/edit', methods=['GET', 'POST'])
 @login_required
@@ -51,16 +60,17 @@ def edit_profile():
         availability = request.form.get('availability', 'weekends')
         is_public = request.form.get('is_public') == 'on'
         
-        # Handle photo upload
+        # Handle photo upload (streamed to disk, resized variants built in the background)
         photo_url = current_user.photo_url
+        pending_photo = None
         if 'photo' in request.files:
             file = request.files['photo']
             if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(f"user_{current_user.id}_{file.filename}")
-                filepath = os.path.join('static', 'uploads', filename)
-                full_path = os.path.join(current_app.root_path, filepath)
-                file.save(full_path)
-                photo_url = f"/static/uploads/{filename}"
+                try:
+                    photo_url, pending_photo = store_photo(current_app._get_current_object(), file)
+                except PhotoError as e:
+                    flash(str(e), 'error')
+                    return render_template('users/edit_profile.html')
         
         # Validation
         if not name:
@@ -79,6 +89,8 @@ def edit_profile():
         current_user.photo_url = photo_url
         
         db.session.commit()
+        if pending_photo:
+            schedule_variants(current_app._get_current_object(), socketio, current_user.id, pending_photo)
         flash('Profile updated successfully!', 'success')
         return redirect(url_for('users.profile'))
     
@@ -132,6 +144,7 @@ def add_skill():
     )
     
     db.session.add(user_skill)
+    skill_trends.queue(db.session, 'added', skill.name)
     db.session.commit()
     
     flash(f'{skill_name} added to your {skill_type} skills!', 'success')
@@ -185,13 +198,17 @@ def search_users():
     skill_type = request.args.get('type', 'offered')
     user_name = request.args.get('name', '').strip()
     location = request.args.get('location', '').strip()
+    category_id = request.args.get('category', type=int)
     page = request.args.get('page', 1, type=int)
     per_page = 12
     
+    category = db.session.get(SkillCategory, category_id) if category_id else None
+    
     # Start with all public, non-banned users
     query = User.query.filter(
         User.is_public == True,
-        User.is_banned == False
+        User.is_banned == False,
+        User.deleted_at.is_(None)
     )
     
     # Filter by user name (partial match)
@@ -202,16 +219,25 @@ def search_users():
     if location:
         query = query.filter(User.location.ilike(f'%{location}%'))
     
-    # Filter by skill (partial match)
-    if skill_name:
+    # Filter by skill (partial match) and/or taxonomy subtree
+    if skill_name or category:
+        if skill_name and page == 1:
+            # Searches only count towards trending when they name a known skill
+            searched = Skill.query.with_entities(Skill.name).filter(
+                db.func.lower(Skill.name) == skill_name.lower(), Skill.is_approved == True
+            ).scalar()
+            skill_trends.record('searched', searched)
         # Use subquery to find users with matching skills
         from sqlalchemy import and_
-        user_skills_subquery = UserSkill.query.filter(
-            and_(
-                UserSkill.skill_name.ilike(f'%{skill_name}%'),
-                UserSkill.skill_type == skill_type
-            )
-        ).with_entities(UserSkill.user_id).distinct()
+        user_skills_subquery = UserSkill.query.filter(UserSkill.skill_type == skill_type)
+        if skill_name:
+            user_skills_subquery = user_skills_subquery.filter(UserSkill.skill_name.ilike(f'%{skill_name}%'))
+        if category:
+            # Skills filed under the category or any of its descendants (a prefix range on the path index)
+            user_skills_subquery = user_skills_subquery.filter(UserSkill.skill_id.in_(
+                db.session.query(Skill.id).join(Skill.category_node).filter(category.subtree_condition())
+            ))
+        user_skills_subquery = user_skills_subquery.with_entities(UserSkill.user_id).distinct()
         
         user_ids = [us.user_id for us in user_skills_subquery.all()]
         if user_ids:
@@ -223,18 +249,59 @@ def search_users():
     # Apply pagination
     users = query.paginate(page=page, per_page=per_page, error_out=False)
     
+    # Cards are assembled from cached fragments (keyed on each user's change stamps)
+    cards = render_user_cards(users.items)
+    
+    # Category facets: the selected node's children (or the roots) with their materialized counts
+    facets = SkillCategory.get_children(category.id if category else None)
+    
     return render_template('users/search.html', 
                          users=users, 
+                         cards=cards, 
                          skill_name=skill_name, 
                          skill_type=skill_type,
                          user_name=user_name,
-                         location=location)
+                         location=location,
+                         category=category,
+                         breadcrumb=category.get_breadcrumb() if category else [],
+                         facets=facets)
+
+@users_bp.route('/skills/browse')
+@users_bp.route('/skills/browse/<int:category_id>')
+def browse_skills(category_id=None):
+    """Browse the skill taxonomy with how many people offer and want each category and skill"""
+    category = db.session.get(SkillCategory, category_id) if category_id else None
+    if category_id and category is None:
+        abort(404)
+    
+    children = SkillCategory.get_children(category_id)
+    skills = Skill.get_in_category(category) if category else []
+    # Per-skill counts of the skills filed directly here, in one grouped query on user_skills.skill_id
+    skill_counts = {}
+    if skills:
+        for skill_id, skill_type, count in db.session.query(
+                UserSkill.skill_id, UserSkill.skill_type, db.func.count(UserSkill.id)
+        ).filter(UserSkill.skill_id.in_([skill.id for skill in skills])).group_by(UserSkill.skill_id, UserSkill.skill_type):
+            skill_counts.setdefault(skill_id, {})[skill_type] = count
+    
+    return render_template('users/browse.html',
+                         category=category,
+                         breadcrumb=category.get_breadcrumb() if category else [],
+                         children=children,
+                         skills=skills,
+                         skill_counts=skill_counts)
 
 @users_bp.route('/user/<int:user_id>')
+@conditional_get(lambda user_id: user_validator('view_user', user_id, ('profile', 'skills', 'feedback', 'swaps'),
+                                                viewer_fields=('profile', 'skills', 'swaps')))
 def view_user(user_id):
     """View another user's profile"""
     user = User.query.get_or_404(user_id)
     
+    if user.is_deleted:
+        flash('This account has been deleted', 'info')
+        return redirect(url_for('users.search_users'))
+    
     if not user.is_public:
         flash('This profile is private', 'error')
         return redirect(url_for('users.search_users'))
@@ -251,8 +318,12 @@ def view_user(user_id):
     avg_rating = Feedback.get_user_average_rating(user.id)
     rating_count = Feedback.get_user_rating_count(user.id)
     
-    # Get all feedback for this user
-    feedback_list = Feedback.get_user_feedback(user.id)
+    # Feedback section, only queried and rendered when its feedback stamp changed
+    versions = UserVersion.get_for_user(user.id)
+    feedback_section = fragment_cache.get_or_render(
+        ('feedback_section', user.id, versions.feedback),
+        lambda: render_template('partials/feedback_section.html',
+                                feedback_list=Feedback.get_user_feedback(user.id)))
     
     # Check if current user can send swap request
     can_send_request = False
@@ -283,7 +354,7 @@ def view_user(user_id):
                          rating_count=rating_count,
                          can_send_request=can_send_request,
                          current_user_offered_skills=current_user_offered_skills,
-                         feedback_list=feedback_list)
+                         feedback_section=feedback_section)
 
 # API endpoints
 @users_bp.route('/api/skills/search', methods=['POST'])
@@ -303,7 +374,45 @@ def search_skills():
     
     return jsonify({'skills': [skill.name for skill in skills]})
 
+@users_bp.route('/api/skills/trending')
+def trending_skills():
+    """Get the skills most added, searched or requested in the last hour, day or week"""
+    window = request.args.get('window', 'day')
+    if window not in TREND_WINDOWS:
+        return jsonify({'error': f"window must be one of {', '.join(TREND_WINDOWS)}"}), 400
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    events = request.args.getlist('event') or list(TREND_EVENTS)
+    if any(name not in TREND_EVENTS for name in events):
+        return jsonify({'error': f"event must be one of {', '.join(TREND_EVENTS)}"}), 400
+    
+    top = {name: skill_trends.top(name, window, limit) for name in events}
+    # Skills an admin unapproved are left out of the public list
+    names = {skill for pairs in top.values() for skill, _ in pairs}
+    approved = {name for (name,) in Skill.query.with_entities(Skill.name)
+                                                .filter(Skill.name.in_(names), Skill.is_approved == True)} if names else set()
+    return jsonify({
+        'window': window,
+        'trending': {name: [{'skill': skill, 'count': count} for skill, count in pairs if skill in approved]
+                     for name, pairs in top.items()}
+    })
+
+@users_bp.route('/api/skills/categories')
+@users_bp.route('/api/skills/categories/<int:category_id>')
+def skill_categories(category_id=None):
+    """Get a taxonomy node with its breadcrumb and its children's offered/wanted counts (the roots without an id)"""
+    category = db.session.get(SkillCategory, category_id) if category_id else None
+    if category_id and category is None:
+        return jsonify({'error': 'Category not found'}), 404
+    
+    return jsonify({
+        'category': category.to_dict() if category else None,
+        'breadcrumb': [node.to_dict() for node in category.get_breadcrumb()] if category else [],
+        'children': [node.to_dict() for node in SkillCategory.get_children(category_id)],
+        'skills': [skill.name for skill in Skill.get_in_category(category)] if category else []
+    })
+
 @users_bp.route('/api/users/<int:user_id>/skills')
+@conditional_get(lambda user_id: user_validator('skills', user_id, ('profile', 'skills')))
 def get_user_skills(user_id):
     """Get user skills via API"""
     user = User.query.get_or_404(user_id)
@@ -316,27 +425,37 @@ def get_user_skills(user_id):
         'wanted': [skill.skill_name for skill in wanted_skills]
     })
 
+@users_bp.route('/api/recommendations')
+@login_required
+def get_recommendations():
+    """Get the current user's recommended swap partners"""
+    if not isinstance(current_user, User):
+        return jsonify({'recommendations': []})
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    return jsonify({'recommendations': [rec.to_dict() for rec in Recommendation.get_for_user(current_user.id, limit)]})
+
 @users_bp.route('/delete-account', methods=['POST'])
 @login_required
 def delete_account():
-    """Delete user account"""
-    # Get all related data to delete
-    from ..models import SwapRequest, Feedback, UserSkill
-    
-    # Delete swap requests
-    SwapRequest.query.filter_by(requester_id=current_user.id).delete()
-    SwapRequest.query.filter_by(receiver_id=current_user.id).delete()
-    
-    # Delete feedback
-    Feedback.query.filter_by(reviewer_id=current_user.id).delete()
-    Feedback.query.filter_by(reviewed_user_id=current_user.id).delete()
-    
-    # Delete user skills
-    UserSkill.query.filter_by(user_id=current_user.id).delete()
-    
-    # Delete the user
-    db.session.delete(current_user)
+    """Delete user account (hidden right away, related data purged in the background)"""
+    # Admins share the numeric id space with users, so their id would name someone else's account
+    if not isinstance(current_user._get_current_object(), User):
+        abort(403)
+    user = db.session.get(User, current_user.id)
+    principal_id = user.get_id()
+    
+    # Soft delete: a few rows whatever the account's size; the purge job does the rest in batches
+    user.deleted_at = datetime.utcnow()
+    SwapRequest.cancel_pending_for_users([user.id])
+    purge = AccountPurge.query.filter_by(user_id=user.id).first()
+    if purge is None:
+        purge = AccountPurge(user.id)
+        db.session.add(purge)
     db.session.commit()
     
+    logout_user()
+    disconnect_principals(socketio, [principal_id], rooms=[f'user_{user.id}'])
+    schedule_purge(current_app._get_current_object(), socketio, purge.id)
+    
     flash('Your account has been deleted successfully.', 'success')
     return redirect(url_for('auth.login')) 
\ No newline at end of file
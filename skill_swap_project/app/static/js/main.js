@@ -53,6 +53,12 @@ function setupSocketIO() {
         showNotification('Swap marked as completed!', 'success');
     });
 
+    // Handle forced logout (e.g. account banned by an admin)
+    socket.on('force_logout', function() {
+        socket.disconnect();
+        window.location.reload();
+    });
+
     // Handle disconnect
     socket.on('disconnect', function() {
         console.log('Disconnected from server');
@@ -538,6 +544,10 @@ window.SkillSwapApp = {
 socket.on('platform_message', function(data) {
     console.log('Received platform_message:', data);
     showPlatformMessage(data);
+    // Advance the delivery cursor so the message is not shown again
+    if (data.id) {
+        socket.emit('platform_message_seen', { id: data.id });
+    }
 });
 
 // Show platform message
@@ -0,0 +1,202 @@
+from datetime import datetime, timedelta
+
+DELETED_NAME = 'Deleted user'
+
+def _delete_batch(model, condition, batch_size):
+    """Delete up to batch_size rows matching condition (by primary key, so every database can limit it)"""
+    from .. import db
+    ids = [row_id for (row_id,) in db.session.query(model.id).filter(condition)
+                                             .order_by(model.id).limit(batch_size)]
+    if ids:
+        model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+    return len(ids)
+
+def _delete_skills(user_id, batch_size, cursor):
+    from collections import Counter
+    from .. import db
+    from ..models import UserSkill, SkillCategory
+    skills = db.session.query(UserSkill.id, UserSkill.skill_id, UserSkill.skill_type)\
+                       .filter(UserSkill.user_id == user_id).order_by(UserSkill.id).limit(batch_size).all()
+    if skills:
+        UserSkill.query.filter(UserSkill.id.in_([row.id for row in skills])).delete(synchronize_session=False)
+        # The bulk delete skips the flush hook that keeps the taxonomy counts
+        removed = Counter((row.skill_id, row.skill_type) for row in skills)
+        SkillCategory.apply_deltas(db.session.connection(), {key: -count for key, count in removed.items()})
+    return len(skills), None, len(skills) < batch_size
+
+def _delete_availability(user_id, batch_size, cursor):
+    from ..models import Availability
+    rows = _delete_batch(Availability, Availability.user_id == user_id, batch_size)
+    return rows, None, rows < batch_size
+
+def _delete_message_cursor(user_id, batch_size, cursor):
+    from ..models import PlatformMessageCursor
+    rows = PlatformMessageCursor.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    return rows, None, True
+
+def _delete_chat_messages(user_id, batch_size, cursor):
+    from ..models import ChatMessage
+    rows = _delete_batch(ChatMessage, ChatMessage.sender_id == user_id, batch_size)
+    return rows, None, rows < batch_size
+
+def _delete_feedback_received(user_id, batch_size, cursor):
+    from ..models import Feedback
+    rows = _delete_batch(Feedback, Feedback.rated_user_id == user_id, batch_size)
+    return rows, None, rows < batch_size
+
+def _anonymize_feedback_given(user_id, batch_size, cursor):
+    """Keep ratings given to others (their averages stay right) but drop the comments"""
+    from .. import db
+    from ..models import Feedback, UserVersion
+    rows = db.session.query(Feedback.id, Feedback.rated_user_id)\
+                     .filter(Feedback.rater_id == user_id, Feedback.id > (cursor or 0))\
+                     .order_by(Feedback.id).limit(batch_size).all()
+    if rows:
+        Feedback.query.filter(Feedback.id.in_([row.id for row in rows]))\
+                      .update({'comment': None}, synchronize_session=False)
+        # The reviewer's name changes on those users' feedback pages too
+        UserVersion.bump_in_session('feedback', [row.rated_user_id for row in rows])
+    return len(rows), rows[-1].id if rows else cursor, len(rows) < batch_size
+
+def _anonymize_swaps(user_id, batch_size, cursor):
+    """Keep swaps for the other participant's history, without the deleted user's message"""
+    from .. import db
+    from ..models import SwapRequest, UserVersion
+    rows = db.session.query(SwapRequest.id, SwapRequest.requester_id, SwapRequest.receiver_id)\
+                     .filter((SwapRequest.requester_id == user_id) | (SwapRequest.receiver_id == user_id),
+                             SwapRequest.id > (cursor or 0))\
+                     .order_by(SwapRequest.id).limit(batch_size).all()
+    if rows:
+        sent = [row.id for row in rows if row.requester_id == user_id]
+        if sent:
+            SwapRequest.query.filter(SwapRequest.id.in_(sent))\
+                             .update({'message': None}, synchronize_session=False)
+        UserVersion.bump_in_session('swaps', [row.receiver_id if row.requester_id == user_id else row.requester_id
+                                              for row in rows])
+    return len(rows), rows[-1].id if rows else cursor, len(rows) < batch_size
+
+def _anonymize_archived_swaps(user_id, batch_size, cursor):
+    """Same as the swaps step for archived swaps, also dropping the user's messages from the compressed chat"""
+    from .. import db
+    from ..models import SwapArchive, UserVersion
+    archives = SwapArchive.query.filter((SwapArchive.requester_id == user_id) | (SwapArchive.receiver_id == user_id),
+                                        SwapArchive.id > (cursor or 0))\
+                                .options(db.undefer(SwapArchive.payload))\
+                                .order_by(SwapArchive.id).limit(batch_size).all()
+    for archive in archives:
+        if archive.requester_id == user_id:
+            archive.message = None
+        payload = archive.get_payload()
+        payload['messages'] = [message for message in payload['messages'] if message['sender_id'] != user_id]
+        archive.set_payload(payload)
+    if archives:
+        UserVersion.bump_in_session('swaps', [archive.receiver_id if archive.requester_id == user_id
+                                              else archive.requester_id for archive in archives])
+    return len(archives), archives[-1].id if archives else cursor, len(archives) < batch_size
+
+def _delete_recommendations(user_id, batch_size, cursor):
+    """Drop the user's own list (lists recommending them skip deleted users and are refreshed)"""
+    from ..models import Recommendation, RecommendationState
+    rows = Recommendation.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    RecommendationState.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    return rows, None, True
+
+def _anonymize_profile(user_id, batch_size, cursor):
+    """Replace the personal data of the user row, which stays as a tombstone for swaps and ratings"""
+    from .. import db
+    from ..models import User
+    from .email_index import email_index
+    user = db.session.get(User, user_id)
+    if user is None:
+        return 0, None, True
+    email_index.discard(user.email)
+    user.name = DELETED_NAME
+    user.email = f'deleted-{user.id}@deleted.invalid'
+    user.password_hash = '!'  # Matches no password
+    user.location = None
+    user.photo_url = None
+    user.is_public = False
+    return 1, None, True
+
+# Ordered steps: name -> function(user_id, batch_size, cursor) returning (rows, cursor, finished)
+STEPS = [
+    ('user_skills', _delete_skills),
+    ('availability', _delete_availability),
+    ('platform_message_cursor', _delete_message_cursor),
+    ('chat_messages', _delete_chat_messages),
+    ('feedback_received', _delete_feedback_received),
+    ('feedback_given', _anonymize_feedback_given),
+    ('swaps', _anonymize_swaps),
+    ('archived_swaps', _anonymize_archived_swaps),
+    ('recommendations', _delete_recommendations),
+    ('profile', _anonymize_profile),
+]
+
+def claim_purge(purge_id, stale_after):
+    """Mark a purge as running unless another worker holds it (atomic UPDATE, returns True when claimed)"""
+    from .. import db
+    from ..models import AccountPurge
+    stale = datetime.utcnow() - timedelta(seconds=stale_after)
+    claimed = AccountPurge.query.filter(
+        AccountPurge.id == purge_id,
+        (AccountPurge.status == 'pending') |
+        ((AccountPurge.status == 'running') & (AccountPurge.updated_at < stale))
+    ).update({'status': 'running', 'updated_at': datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
+def purge_account(purge_id, batch_size=500, pause=0.05, stale_after=300, sleep=None):
+    """Run (or resume) a purge, one committed batch at a time
+
+    Each batch and its progress are committed together, and every step only
+    touches rows it has not handled yet, so a purge interrupted by a crash
+    resumes where it stopped. ``sleep`` (socketio.sleep in workers) runs
+    between batches so the purge yields to live traffic.
+    """
+    from .. import db
+    from ..models import AccountPurge
+
+    if not claim_purge(purge_id, stale_after):
+        return None
+    purge = db.session.get(AccountPurge, purge_id)
+    names = [name for name, _ in STEPS]
+    start = names.index(purge.step) if purge.step in names else 0
+    try:
+        for name, step in STEPS[start:]:
+            if purge.step != name:
+                purge.step, purge.cursor = name, None
+            while True:
+                rows, purge.cursor, finished = step(purge.user_id, batch_size, purge.cursor)
+                purge.add_progress(name, rows)
+                purge.updated_at = datetime.utcnow()
+                db.session.commit()
+                if finished:
+                    break
+                if sleep:
+                    sleep(pause)
+        purge.status = 'done'
+        purge.cursor = None
+        purge.finished_at = datetime.utcnow()
+        db.session.commit()
+    except Exception as exc:
+        db.session.rollback()
+        purge = db.session.get(AccountPurge, purge_id)
+        purge.status = 'failed'
+        purge.error = f'{type(exc).__name__}: {exc}'
+        db.session.commit()
+        raise
+    return purge
+
+def run_purge(app, purge_id):
+    """Background task: purge a soft-deleted account"""
+    from .. import socketio
+    with app.app_context():
+        try:
+            purge_account(purge_id, app.config['ACCOUNT_PURGE_BATCH_SIZE'], app.config['ACCOUNT_PURGE_PAUSE'],
+                          sleep=socketio.sleep)
+        except Exception:
+            app.logger.exception('Account purge %s failed', purge_id)
+
+def schedule_purge(app, socketio, purge_id):
+    """Purge an account in the background once its soft delete has been committed"""
+    socketio.start_background_task(run_purge, app, purge_id)
@@ -0,0 +1,130 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from flask import abort, request, url_for, Response
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Only text formats benefit from precompression
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+class Asset:
+    """A fingerprinted static file with its precompressed encodings"""
+
+    def __init__(self, filename, data):
+        self.filename = filename
+        self.digest = hashlib.sha256(data).hexdigest()[:12]
+        root, ext = os.path.splitext(filename)
+        self.hashed_name = f'{root}.{self.digest}{ext}'
+        self.mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        self.encodings = {'identity': data}
+        if self.mimetype.startswith(COMPRESSIBLE_TYPES):
+            compressed = gzip.compress(data, 9, mtime=0)
+            if len(compressed) < len(data):
+                self.encodings['gzip'] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(data, quality=11)
+                if len(compressed) < len(data):
+                    self.encodings['br'] = compressed
+
+    def negotiate(self, accept_encodings):
+        """Pick the smallest encoding the client accepts"""
+        for encoding in ('br', 'gzip'):
+            if encoding in self.encodings and accept_encodings[encoding] > 0:
+                return encoding
+        return 'identity'
+
+class AssetPipeline:
+    """Build-free asset pipeline: fingerprint and precompress static files at startup
+
+    Every file under the static folder (except user uploads) is read once,
+    named after its content hash and compressed with gzip (and brotli when
+    installed). Templates link to ``asset_url('css/style.css')``, which points
+    at ``/assets/css/style.<hash>.css``; since the name changes whenever the
+    content does, responses can be cached forever by browsers and proxies.
+    ``version`` hashes the whole manifest, for caches of pages that link to
+    the assets (conditional GET ETags).
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.exclude = ('uploads',)
+        self.manifest = {}
+        self.version = ''
+        self._by_hashed_name = {}
+
+    def init_app(self, app):
+        self.enabled = app.config.get('ASSET_FINGERPRINTING', True)
+        if self.enabled:
+            self.build(app.static_folder)
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.serve)
+        app.jinja_env.globals['asset_url'] = self.url
+        app.after_request(self._cache_uploads)
+        app.extensions['assets'] = self
+
+    def build(self, static_folder):
+        """Fingerprint and compress every static file"""
+        manifest = {}
+        for directory, subdirs, files in os.walk(static_folder):
+            relative_dir = os.path.relpath(directory, static_folder)
+            if relative_dir.split(os.sep)[0] in self.exclude:
+                subdirs[:] = []
+                continue
+            for name in files:
+                path = os.path.join(directory, name)
+                filename = os.path.normpath(os.path.join(relative_dir, name)).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    manifest[filename] = Asset(filename, f.read())
+        self.manifest = manifest
+        self.version = hashlib.sha256(''.join(f'{filename}:{asset.digest};' for filename, asset
+                                              in sorted(manifest.items())).encode('utf-8')).hexdigest()[:12]
+        self._by_hashed_name = {asset.hashed_name: asset for asset in manifest.values()}
+
+    def url(self, filename, **values):
+        """Get the URL of a static file (``url_for('static', ...)`` compatible)"""
+        asset = self.manifest.get(filename) if self.enabled else None
+        if asset is None:
+            return url_for('static', filename=filename, **values)
+        return url_for('assets', filename=asset.hashed_name, **values)
+
+    def serve(self, filename):
+        """Serve a fingerprinted asset in the best encoding the client accepts"""
+        asset = self._by_hashed_name.get(filename)
+        if asset is None:
+            abort(404)
+
+        etag = f'"{asset.digest}"'
+        headers = {
+            'Cache-Control': IMMUTABLE_CACHE_CONTROL,
+            'ETag': etag,
+            'Vary': 'Accept-Encoding'
+        }
+        if etag in request.headers.get('If-None-Match', ''):
+            return Response(status=304, headers=headers)
+
+        encoding = asset.negotiate(request.accept_encodings)
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return Response(asset.encodings[encoding], mimetype=asset.mimetype, headers=headers)
+
+    def _cache_uploads(self, response):
+        """Content-addressed photos never change, so they get the same far-future headers"""
+        if request.path.startswith('/static/uploads/photos/') and response.status_code in (200, 304):
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+    def stats(self):
+        """Get the size of each asset per encoding"""
+        return {
+            filename: {encoding: len(data) for encoding, data in asset.encodings.items()}
+            for filename, asset in sorted(self.manifest.items())
+        }
+
+
+assets = AssetPipeline()
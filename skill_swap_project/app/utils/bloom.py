@@ -0,0 +1,52 @@
+import hashlib
+import math
+
+
+def optimal_parameters(capacity, error_rate):
+    """Get the bit count and hash count for a Bloom filter of a given capacity and error rate"""
+    bits = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+    hashes = max(1, int(round(bits / capacity * math.log(2))))
+    return bits, hashes
+
+
+class BloomFilter:
+    """Compact probabilistic set: no false negatives, tunable false positive rate
+
+    Bits live in a single bytearray (about 1.2 MB per million members at 1%).
+    The k bit positions are derived from one blake2b digest with double
+    hashing, so each lookup costs a single hash computation.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits, self.num_hashes = optimal_parameters(capacity, error_rate)
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item):
+        """Add an item to the filter"""
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    @property
+    def memory_bytes(self):
+        return len(self.bits)
+
+    def expected_error_rate(self):
+        """Theoretical false positive rate at the current fill level"""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def __repr__(self):
+        return f'<BloomFilter n={self.count} bits={self.num_bits} k={self.num_hashes}>'
@@ -0,0 +1,86 @@
+import hashlib
+from functools import wraps
+from flask import current_app, request, make_response, session
+from flask_login import current_user
+from werkzeug.http import is_resource_modified
+
+class Validator:
+    """What a conditional view's response depends on
+
+    Besides the data stamps, the ETag covers the release (APP_VERSION and the
+    asset manifest hash), so a deploy that changes templates or assets never
+    answers 304 with a page built by the previous one.
+    """
+
+    def __init__(self, parts, last_modified=None, private=False):
+        assets = current_app.extensions.get('assets')
+        release = [current_app.config.get('APP_VERSION', ''), assets.version if assets else '']
+        self.etag = hashlib.sha1(':'.join(str(part) for part in release + list(parts)).encode('utf-8')).hexdigest()[:20]
+        self.last_modified = last_modified
+        self.private = private
+
+def conditional_get(validator_func):
+    """Decorator answering conditional GETs with 304 before the view runs
+
+    ``validator_func`` receives the view arguments and returns a Validator
+    built from cheap change stamps, or None to skip conditional handling for
+    this request. When the client's If-None-Match / If-Modified-Since still
+    match, the view (and its queries and template rendering) is skipped;
+    otherwise the response is sent with ETag and Last-Modified and marked as
+    needing revalidation.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            validator = validator_func(**kwargs)
+            if validator is None:
+                return f(*args, **kwargs)
+
+            if not is_resource_modified(request.environ, etag=validator.etag,
+                                        last_modified=validator.last_modified):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(validator.etag, weak=True)
+            if validator.last_modified:
+                response.last_modified = validator.last_modified
+            response.cache_control.no_cache = True
+            if validator.private:
+                response.cache_control.private = True
+                response.vary.add('Cookie')
+            else:
+                response.cache_control.public = True
+            return response
+        return decorated_function
+    return decorator
+
+def user_validator(kind, user_id, fields, viewer_fields=None):
+    """Build a Validator from a user's change stamps
+
+    Pages rendered per viewer pass ``viewer_fields``: the signed-in user's own
+    stamps are mixed in (navbar, swap request form) and the response is kept
+    private. Such pages skip conditional handling while flash messages are
+    pending or for admins. Names of other users shown on the page (e.g.
+    reviewers) are not part of the stamps.
+    """
+    from ..models import User
+    from ..models.user_version import UserVersion
+
+    versions = UserVersion.get_for_user(user_id)
+    parts = [kind, user_id] + [getattr(versions, field) for field in fields]
+    if viewer_fields is None:
+        return Validator(parts, versions.updated_at)
+
+    if session.get('_flashes'):
+        return None
+    last_modified = versions.updated_at
+    if current_user.is_authenticated:
+        if not isinstance(current_user._get_current_object(), User):
+            return None
+        viewer = UserVersion.get_for_user(current_user.id)
+        parts += [current_user.get_id()] + [getattr(viewer, field) for field in viewer_fields]
+        last_modified = max(filter(None, (last_modified, viewer.updated_at)), default=None)
+    return Validator(parts, last_modified, private=True)
@@ -0,0 +1,187 @@
+import threading
+import time
+from .bloom import BloomFilter
+
+
+class EmailIndex:
+    """Bloom filter over every registered user and admin email
+
+    A miss means the email is definitely not registered, so availability
+    checks can answer without the database; only probable hits fall through
+    to an exact query. The filter is built and refreshed in a background
+    task, never inside a user's request, and only one build or refresh runs
+    at a time; until the first build finished every check falls through to
+    the exact query.
+
+    Accounts registered by other workers are picked up every
+    EMAIL_BLOOM_REFRESH_INTERVAL seconds by re-reading the newest primary
+    keys, starting EMAIL_BLOOM_REFRESH_OVERLAP ids below the highest one
+    seen, so rows that commit out of id order are not missed; a full
+    rebuild every EMAIL_BLOOM_REBUILD_INTERVAL seconds is the backstop.
+    Deleted emails cannot be removed from a Bloom filter, so they are
+    counted and the filter is rebuilt once they make up too large a share.
+    """
+
+    def __init__(self, capacity=1000000, error_rate=0.01, refresh_interval=5, refresh_overlap=1000,
+                 rebuild_interval=3600):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.refresh_overlap = refresh_overlap
+        self.rebuild_interval = rebuild_interval
+        self.rebuild_ratio = 0.1
+        self._bloom = None
+        self._watermarks = {}
+        self._stale = 0
+        self._last_refresh = 0
+        self._last_rebuild = 0
+        self._running = False
+        self._added_during_build = None
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.definite_misses = 0
+        self.false_positives = 0
+
+    def init_app(self, app):
+        self.capacity = app.config.get('EMAIL_BLOOM_CAPACITY', self.capacity)
+        self.error_rate = app.config.get('EMAIL_BLOOM_ERROR_RATE', self.error_rate)
+        self.refresh_interval = app.config.get('EMAIL_BLOOM_REFRESH_INTERVAL', self.refresh_interval)
+        self.refresh_overlap = app.config.get('EMAIL_BLOOM_REFRESH_OVERLAP', self.refresh_overlap)
+        self.rebuild_interval = app.config.get('EMAIL_BLOOM_REBUILD_INTERVAL', self.rebuild_interval)
+        self._bloom = None
+
+        @app.after_request
+        def refresh_email_index(response):
+            self.maybe_start(app)
+            return response
+
+    def _models(self):
+        from ..models import User, Admin
+        return {'users': User, 'admins': Admin}
+
+    def _load(self, add, watermarks, overlap=0):
+        """Pass emails with primary keys above the watermarks (less the overlap) to add(), in streamed batches"""
+        from .. import db
+        for name, model in self._models().items():
+            rows = db.session.query(model.id, model.email)\
+                             .filter(model.id > watermarks.get(name, 0) - overlap)\
+                             .order_by(model.id)\
+                             .yield_per(10000)
+            for row_id, email in rows:
+                add(email.lower())
+                watermarks[name] = max(watermarks.get(name, 0), row_id)
+        db.session.commit()
+
+    def _rebuild_due(self):
+        return self._bloom is None or self._stale > self._bloom.count * self.rebuild_ratio or \
+            time.monotonic() - self._last_rebuild >= self.rebuild_interval
+
+    def maybe_start(self, app):
+        """Start a background build or refresh when one is due and none is running"""
+        if not self._rebuild_due() and time.monotonic() - self._last_refresh < self.refresh_interval:
+            return
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._last_refresh = time.monotonic()
+        from .. import socketio
+        socketio.start_background_task(self.run, app)
+
+    def run(self, app):
+        """Background task: rebuild the filter if due, otherwise pick up new accounts"""
+        try:
+            with app.app_context():
+                if self._rebuild_due():
+                    self.rebuild()
+                else:
+                    self.refresh()
+        except Exception:
+            app.logger.exception('Email index refresh failed')
+        finally:
+            self._running = False
+
+    def refresh(self):
+        """Add accounts created since the last refresh (with the id overlap) to the current filter"""
+        bloom, watermarks, emails = self._bloom, dict(self._watermarks), []
+        self._load(emails.append, watermarks, self.refresh_overlap)
+        with self._lock:
+            # Added under the lock (requests add to the same filter); re-read emails are skipped so the count stays right
+            for email in emails:
+                if email not in bloom:
+                    bloom.add(email)
+            if self._bloom is bloom:
+                self._watermarks = watermarks
+
+    def rebuild(self):
+        """Build a fresh filter from the database and swap it in"""
+        with self._lock:
+            self._added_during_build = []
+        try:
+            watermarks = {}
+            bloom = BloomFilter(self.capacity, self.error_rate)
+            self._load(bloom.add, watermarks)
+            # Leave headroom so the filter does not saturate as accounts grow
+            while bloom.count > self.capacity * 0.9:
+                self.capacity *= 2
+                watermarks = {}
+                bloom = BloomFilter(self.capacity, self.error_rate)
+                self._load(bloom.add, watermarks)
+            with self._lock:
+                # Registrations this worker saw while the scan ran may have committed after it read
+                for email in self._added_during_build:
+                    bloom.add(email)
+                self._bloom, self._watermarks, self._stale = bloom, watermarks, 0
+                self._last_rebuild = self._last_refresh = time.monotonic()
+        finally:
+            with self._lock:
+                self._added_during_build = None
+
+    def might_exist(self, email):
+        """Check if an email may be registered (False means definitely not; True until the filter is built)"""
+        bloom = self._bloom
+        if bloom is None:
+            return True
+        self.checks += 1
+        if email.lower() in bloom:
+            return True
+        self.definite_misses += 1
+        return False
+
+    def record_false_positive(self):
+        """Note that a probable hit turned out not to exist"""
+        if self._bloom is not None:
+            self.false_positives += 1
+
+    def add(self, email):
+        """Add a newly registered email"""
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(email.lower())
+            if self._added_during_build is not None:
+                self._added_during_build.append(email.lower())
+
+    def discard(self, email):
+        """Note a deleted email (it stays in the filter until the next rebuild)"""
+        self._stale += 1
+
+    def stats(self):
+        """Get memory and false positive metrics"""
+        bloom = self._bloom
+        negatives = self.definite_misses + self.false_positives
+        return {
+            'built': bloom is not None,
+            'members': bloom.count if bloom else 0,
+            'capacity': self.capacity,
+            'memory_bytes': bloom.memory_bytes if bloom else 0,
+            'hash_functions': bloom.num_hashes if bloom else 0,
+            'expected_false_positive_rate': bloom.expected_error_rate() if bloom else 0,
+            'observed_false_positive_rate': self.false_positives / negatives if negatives else 0,
+            'checks': self.checks,
+            'definite_misses': self.definite_misses,
+            'false_positives': self.false_positives,
+            'stale_members': self._stale
+        }
+
+
+email_index = EmailIndex()
@@ -0,0 +1,138 @@
+import sys
+import threading
+from collections import OrderedDict
+from flask import render_template
+from markupsafe import Markup
+
+class FragmentCache:
+    """LRU cache of rendered template fragments, bounded by memory
+
+    Keys embed the change stamps the fragment was rendered from (see
+    UserVersion), so entries never need invalidating: a change produces a new
+    key and the stale entry simply ages out. Each entry is charged the size
+    of its key and HTML string, and the least recently used entries are
+    evicted once the total exceeds ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app):
+        self.enabled = app.config.get('FRAGMENT_CACHE_ENABLED', True)
+        self.max_bytes = app.config.get('FRAGMENT_CACHE_MAX_BYTES', self.max_bytes)
+        self.clear()
+
+    @staticmethod
+    def _cost(key, html):
+        return sys.getsizeof(key) + sys.getsizeof(html)
+
+    def get(self, key):
+        """Get a cached fragment, or None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, html):
+        """Cache a rendered fragment"""
+        if not self.enabled:
+            return
+        html = Markup(html)
+        cost = self._cost(key, html)
+        if cost > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (html, cost)
+            self._bytes += cost
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_cost) = self._entries.popitem(last=False)
+                self._bytes -= evicted_cost
+                self.evictions += 1
+
+    def get_or_render(self, key, render):
+        """Get a fragment, rendering and caching it with ``render()`` on a miss"""
+        html = self.get(key)
+        if html is None:
+            html = Markup(render())
+            self.put(key, html)
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Get hit/miss counters and memory use"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0
+        }
+
+
+fragment_cache = FragmentCache()
+
+def render_user_cards(users):
+    """Render the card of each user, reusing cached fragments
+
+    Change stamps for the whole page come from one query, and the skills of
+    the users whose card is not cached from one more, instead of two skill
+    queries and a render per card. Returns a dict of user id -> Markup.
+    """
+    from .. import db
+    from ..models import UserSkill, UserVersion
+
+    users = list(users)
+    if not users:
+        return {}
+    ids = [user.id for user in users]
+    # Read in the request's transaction, so stamps match the user rows already loaded
+    stamps = {row.user_id: (row.profile, row.skills) for row in
+              db.session.query(UserVersion.user_id, UserVersion.profile, UserVersion.skills)
+                        .filter(UserVersion.user_id.in_(ids))}
+
+    cards, missing = {}, []
+    for user in users:
+        key = ('user_card', user.id) + stamps.get(user.id, (0, 0))
+        html = fragment_cache.get(key)
+        if html is None:
+            missing.append((user, key))
+        else:
+            cards[user.id] = html
+
+    if missing:
+        skills = {user.id: {'offered': [], 'wanted': []} for user, _ in missing}
+        rows = db.session.query(UserSkill.user_id, UserSkill.skill_name, UserSkill.skill_type)\
+                         .filter(UserSkill.user_id.in_(list(skills)))\
+                         .order_by(UserSkill.id)
+        for user_id, skill_name, skill_type in rows:
+            skills[user_id][skill_type].append(skill_name)
+        for user, key in missing:
+            html = Markup(render_template('partials/user_card.html', user=user,
+                                          offered_skills=skills[user.id]['offered'],
+                                          wanted_skills=skills[user.id]['wanted']))
+            fragment_cache.put(key, html)
+            cards[user.id] = html
+    return cards
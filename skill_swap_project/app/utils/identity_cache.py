@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+
+class IdentityCache:
+    """Bounded, TTL'd cache of loaded principals (users and admins) for Flask-Login
+
+    Entries are detached snapshots keyed by ``get_id()`` (e.g. 'user-5').
+    Invalidation is local and immediate, and is propagated to other worker
+    processes through a version stamp file: every invalidation touches the file
+    and every lookup compares its mtime with the last one seen (a single
+    ``stat`` call), clearing the whole cache when another worker changed it.
+
+    Every invalidation also bumps a local generation. Loaders take it before
+    reading the database and hand it to ``put``, which drops the snapshot if
+    an invalidation ran in between (it may predate the change).
+    """
+
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stamp_path = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.max_size = app.config.get('IDENTITY_CACHE_SIZE', self.max_size)
+        self.ttl = app.config.get('IDENTITY_CACHE_TTL', self.ttl)
+        self.stamp_path = app.config.get('IDENTITY_CACHE_STAMP') or \
+            os.path.join(app.instance_path, 'identity_cache.stamp')
+        os.makedirs(os.path.dirname(self.stamp_path), exist_ok=True)
+        self._stamp = self._read_stamp()
+
+    def _read_stamp(self):
+        if not self.stamp_path:
+            return None
+        try:
+            return os.stat(self.stamp_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _bump_stamp(self):
+        if not self.stamp_path:
+            return
+        before = self._read_stamp()
+        now = time.time_ns()
+        try:
+            os.utime(self.stamp_path, ns=(now, now))
+        except FileNotFoundError:
+            with open(self.stamp_path, 'a'):
+                pass
+        after = self._read_stamp()
+        with self._lock:
+            # Another worker bumped since our last look (or right after us): its invalidation applies here too
+            if before != self._stamp or after != now:
+                self._entries.clear()
+                self._generation += 1
+            self._stamp = after
+
+    def _sync_stamp(self, stamp):
+        """Drop everything when another worker invalidated something (call with the lock held)"""
+        if stamp != self._stamp:
+            self._entries.clear()
+            self._generation += 1
+            self._stamp = stamp
+
+    def generation(self):
+        """Get the invalidation generation to pass to ``put`` (take it before reading the database)"""
+        stamp = self._read_stamp()
+        with self._lock:
+            self._sync_stamp(stamp)
+            return self._generation
+
+    def get(self, key):
+        """Get a cached principal snapshot, or None"""
+        stamp = self._read_stamp()
+        with self._lock:
+            self._sync_stamp(stamp)
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, generation=None):
+        """Cache a principal snapshot, unless an invalidation ran since ``generation`` was taken"""
+        stamp = self._read_stamp()
+        with self._lock:
+            self._sync_stamp(stamp)
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *keys):
+        """Drop principals from this process and signal other workers"""
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+            self._generation += 1
+        self._bump_stamp()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def detached_snapshot(instance):
+    """Copy the column state of a loaded model into a new detached instance"""
+    mapper = inspect(instance).mapper
+    snapshot = mapper.class_manager.new_instance()
+    for attr in mapper.column_attrs:
+        set_committed_value(snapshot, attr.key, getattr(instance, attr.key))
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+
+identity_cache = IdentityCache()
@@ -0,0 +1,271 @@
+import threading
+import time
+from bisect import bisect_left
+from flask import g, request
+from flask_socketio import SocketIO
+from .tracing import tracer
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+QUERY_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """A metric family with one child per combination of label values
+
+    Children are created once under the family lock; updates only take the
+    child's own (uncontended) lock, so recording costs about a microsecond.
+    `child_factory` builds the child for a new combination of label values.
+    """
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), child_factory=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._child_factory = child_factory
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._child_factory()
+        return child
+
+    def collect(self):
+        """Get the exposition lines of this family"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.lines(self.name, _format_labels(self.labelnames, values),
+                                     self.labelnames, values))
+        return lines
+
+class _Value:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+    def lines(self, name, labels, labelnames, values):
+        return [f'{name}{labels} {_format_value(self.value)}']
+
+class Counter(Metric):
+    """Monotonic count (requests, emits)"""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames, _Value)
+
+    def inc(self, *values, amount=1):
+        self.labels(*values).inc(amount)
+
+class Gauge(Metric):
+    """Value that goes up and down (connected sockets, pool sizes)"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames, _Value)
+
+    def set(self, *values, value):
+        self.labels(*values).set(value)
+
+class _Buckets:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def lines(self, name, labels, labelnames, values):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        lines, cumulative = [], 0
+        for bound, count in zip(self.bounds + (float('inf'),), counts):
+            cumulative += count
+            bucket_labels = _format_labels(labelnames, values, [('le', _format_value(bound))])
+            lines.append(f'{name}_bucket{bucket_labels} {cumulative}')
+        lines.append(f'{name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{name}_count{labels} {cumulative}')
+        return lines
+
+class Histogram(Metric):
+    """Distribution of observations over fixed buckets"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(float(bound) for bound in buckets)
+        super().__init__(name, documentation, labelnames, lambda: _Buckets(self.buckets))
+
+    def observe(self, *values, value):
+        self.labels(*values).observe(value)
+
+class MetricsRegistry:
+    """In-process metrics exported in the Prometheus text format
+
+    Requests are timed from before_request to after_request (or teardown, for
+    unhandled errors) and labelled by endpoint, so unknown URLs collapse into
+    one series. Query counts and DB time come from the request's QueryLog.
+    Socket.IO gauges, pool and replica numbers are read when scraped. Each
+    worker process keeps its own numbers; scrape every worker (or sum them).
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.families = []
+        self._collectors = []
+        self.requests = self.counter('http_requests_total', 'HTTP requests by endpoint, method and status',
+                                     ('endpoint', 'method', 'status'))
+        self.latency = self.histogram('http_request_duration_seconds', 'HTTP request latency',
+                                      ('endpoint', 'method'))
+        self.query_count = self.histogram('http_request_db_queries', 'Database queries per request',
+                                          ('endpoint',), QUERY_COUNT_BUCKETS)
+        self.query_time = self.histogram('http_request_db_seconds', 'Database time per request',
+                                         ('endpoint',), QUERY_TIME_BUCKETS)
+        self.socket_emits = self.counter('socketio_emits_total', 'Socket.IO events emitted by the server',
+                                         ('event',))
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, family):
+        self.families.append(family)
+        return family
+
+    def collector(self, func):
+        """Register a function returning exposition lines computed at scrape time"""
+        self._collectors.append(func)
+        return func
+
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        if not self.enabled:
+            return
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+        app.extensions['metrics'] = self
+
+    def _start(self):
+        g.metrics_started = time.perf_counter()
+
+    def _observe(self, status):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        endpoint = request.endpoint or 'unmatched'
+        self.latency.observe(endpoint, request.method, value=time.perf_counter() - started)
+        self.requests.inc(endpoint, request.method, str(status))
+        log = g.get('query_log')
+        if log is not None:
+            self.query_count.observe(endpoint, value=log.count)
+            self.query_time.observe(endpoint, value=log.total_time)
+
+    def _finish(self, response):
+        self._observe(response.status_code)
+        return response
+
+    def _teardown(self, exc):
+        # Only reached with a pending start when the view raised
+        if exc is not None:
+            self._observe(500)
+
+    def render(self):
+        """Render every family and collector in the Prometheus text format"""
+        lines = []
+        for family in self.families:
+            lines.extend(family.collect())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+class InstrumentedSocketIO(SocketIO):
+    """SocketIO counting and tracing emitted events (including flask_socketio.emit() in handlers)"""
+
+    def emit(self, event, *args, **kwargs):
+        metrics.socket_emits.inc(event)
+        with tracer.span('socketio.emit', event=event, room=kwargs.get('room', kwargs.get('to'))):
+            return super().emit(event, *args, **kwargs)
+
+def _gauge_lines(name, documentation, samples, labelname=None):
+    lines = [f'# HELP {name} {documentation}', f'# TYPE {name} gauge']
+    for label, value in samples:
+        labels = _format_labels((labelname,), (label,)) if labelname else ''
+        lines.append(f'{name}{labels} {_format_value(value)}')
+    return lines
+
+@metrics.collector
+def _socketio_lines():
+    """Connected clients and joined rooms of this worker's Socket.IO server"""
+    from .. import socketio
+    server = getattr(socketio, 'server', None)
+    rooms = server.manager.rooms.get('/', {}) if server else {}
+    clients = rooms.get(None, {})
+    # Every client also sits in a room named after its sid
+    named = sum(1 for room in rooms if room is not None and room not in clients)
+    return (_gauge_lines('socketio_connected_clients', 'Connected Socket.IO clients', [(None, len(clients))]) +
+            _gauge_lines('socketio_rooms', 'Socket.IO rooms with at least one member', [(None, named)]))
+
+@metrics.collector
+def _pool_lines():
+    """Connection pool gauges and checkout waits per bind"""
+    from .pool_metrics import pool_metrics
+    pools = pool_metrics.stats()
+    lines = []
+    for key, documentation in (('checked_out', 'Connections in use'), ('overflow', 'Connections above pool_size'),
+                               ('size', 'Configured pool_size'), ('timeouts', 'Checkouts that timed out')):
+        lines += _gauge_lines(f'db_pool_{key}', documentation,
+                              [(bind, stats[key]) for bind, stats in pools.items() if stats.get(key) is not None],
+                              'bind')
+    lines += ['# HELP db_pool_checkout_wait_seconds Time spent waiting for a pooled connection',
+              '# TYPE db_pool_checkout_wait_seconds summary']
+    for bind, stats in pools.items():
+        wait = stats.get('checkout_wait')
+        if wait:
+            labels = _format_labels(('bind',), (bind,))
+            lines.append(f'db_pool_checkout_wait_seconds_sum{labels} {wait["total_ms"] / 1000}')
+            lines.append(f'db_pool_checkout_wait_seconds_count{labels} {wait["count"]}')
+    return lines
+
+@metrics.collector
+def _replica_lines():
+    """Lag of each read replica"""
+    from .replicas import replicas
+    return _gauge_lines('db_replica_lag_seconds', 'Seconds behind the primary at the last check (-1 if unreachable)',
+                        [(key, replicas.lag.get(key) if replicas.lag.get(key) is not None else -1)
+                         for key in replicas.keys], 'bind')
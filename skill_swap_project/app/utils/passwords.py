@@ -0,0 +1,63 @@
+from flask import current_app, has_app_context
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+
+try:
+    import greenlet
+    from eventlet import tpool
+except ImportError:  # Running without eventlet (e.g. the threading dev server)
+    greenlet = tpool = None
+
+DEFAULT_HASH_METHOD = 'pbkdf2:sha256:600000'
+
+def in_green_thread():
+    """Check if we are running inside an eventlet green thread (not the main greenlet)"""
+    return greenlet is not None and greenlet.getcurrent().parent is not None
+
+def run_blocking(func, *args, **kwargs):
+    """Run CPU-bound work without stalling the eventlet hub
+
+    Inside a green thread the call is handed to eventlet's pool of real OS
+    threads, so other green threads (chat, notifications) keep running while
+    it computes. Everywhere else it simply runs inline.
+    """
+    if in_green_thread():
+        return tpool.execute(func, *args, **kwargs)
+    return func(*args, **kwargs)
+
+def get_hash_method():
+    """Get the configured password hash method"""
+    if has_app_context():
+        return current_app.config.get('PASSWORD_HASH_METHOD', DEFAULT_HASH_METHOD)
+    return DEFAULT_HASH_METHOD
+
+def hash_password(password, method=None):
+    """Hash a password off the event loop"""
+    return run_blocking(generate_password_hash, password, method=method or get_hash_method())
+
+def verify_password(password_hash, password):
+    """Check a password against its hash off the event loop"""
+    return run_blocking(check_password_hash, password_hash, password)
+
+def _parse_hash_method(method):
+    """Split a hash method ('pbkdf2', 'pbkdf2:sha256:600000', 'scrypt:32768:8:1') into (name, parameters)
+
+    Parameters left out are filled with werkzeug's defaults, so a short
+    configured method compares equal to the full prefix werkzeug stores.
+    """
+    name, *params = method.split(':')
+    if name == 'pbkdf2':
+        hash_name = params[0] if params else 'sha256'
+        iterations = int(params[1]) if len(params) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return name, (hash_name, iterations)
+    if name == 'scrypt':
+        defaults = (2 ** 15, 8, 1)
+        return name, tuple(int(params[i]) if i < len(params) else default for i, default in enumerate(defaults))
+    return name, tuple(params)
+
+def needs_rehash(password_hash, method=None):
+    """Check if a hash was made with a method or parameters other than the configured ones"""
+    try:
+        stored = _parse_hash_method(password_hash.split('$', 1)[0])
+    except ValueError:
+        return True  # Not a hash werkzeug could have made with known parameters
+    return stored != _parse_hash_method(method or get_hash_method())
@@ -0,0 +1,163 @@
+import hashlib
+import os
+import tempfile
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow not installed: originals are kept, no resized variants
+    Image = ImageOps = None
+
+from .passwords import run_blocking
+
+CHUNK_SIZE = 64 * 1024
+PHOTO_DIR = 'photos'
+
+# Variant name -> square edge in pixels
+VARIANTS = {
+    'avatar': 256,
+    'thumb': 64,
+}
+
+# Leading bytes of the image formats we accept, mapped to the stored extension
+SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+class PhotoError(ValueError):
+    """Raised when an uploaded photo is rejected"""
+
+def sniff_extension(head):
+    """Get the extension for an image from its first bytes, or None if unsupported"""
+    for signature, extension in SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    return None
+
+def photo_dir(upload_folder):
+    """Get (and create) the directory holding content-addressed photos"""
+    path = os.path.join(upload_folder, PHOTO_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def photo_url(digest, extension, variant=None):
+    """Get the public URL of an original photo or one of its variants"""
+    if variant:
+        return f'/static/uploads/{PHOTO_DIR}/{digest}_{variant}.jpg'
+    return f'/static/uploads/{PHOTO_DIR}/{digest}.{extension}'
+
+def variant_url(url, variant):
+    """Get the URL of another variant given a variant URL (other URLs are returned as is)"""
+    for name in VARIANTS:
+        suffix = f'_{name}.jpg'
+        if url and url.endswith(suffix):
+            return url[:-len(suffix)] + f'_{variant}.jpg'
+    return url
+
+def save_upload(stream, upload_folder, max_bytes):
+    """Stream an upload to disk, stored under its sha256 content hash
+
+    The stream is copied in fixed-size chunks while hashing, and rejected as
+    soon as it exceeds ``max_bytes``, so memory use does not grow with the
+    upload. Identical content is only stored once. Returns ``(digest, extension)``.
+    """
+    directory = photo_dir(upload_folder)
+    sha256 = hashlib.sha256()
+    size = 0
+    extension = None
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if extension is None:
+                    extension = sniff_extension(chunk)
+                    if extension is None:
+                        raise PhotoError('Photo must be a PNG, JPEG or GIF image')
+                size += len(chunk)
+                if size > max_bytes:
+                    raise PhotoError(f'Photo must be smaller than {max_bytes // (1024 * 1024)} MB')
+                sha256.update(chunk)
+                out.write(chunk)
+        if extension is None:
+            raise PhotoError('Uploaded photo is empty')
+
+        digest = sha256.hexdigest()
+        final_path = os.path.join(directory, f'{digest}.{extension}')
+        if os.path.exists(final_path):
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, final_path)
+        return digest, extension
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def variants_exist(upload_folder, digest):
+    """Check if every variant of a photo has already been generated"""
+    directory = os.path.join(upload_folder, PHOTO_DIR)
+    return all(os.path.exists(os.path.join(directory, f'{digest}_{name}.jpg')) for name in VARIANTS)
+
+def generate_variants(upload_folder, digest, extension):
+    """Write square JPEG variants of an original photo (CPU-bound, blocking)"""
+    directory = os.path.join(upload_folder, PHOTO_DIR)
+    with Image.open(os.path.join(directory, f'{digest}.{extension}')) as original:
+        original.seek(0)
+        image = ImageOps.exif_transpose(original).convert('RGB')
+    for name, edge in VARIANTS.items():
+        target = os.path.join(directory, f'{digest}_{name}.jpg')
+        if os.path.exists(target):
+            continue
+        variant = ImageOps.fit(image, (edge, edge), Image.LANCZOS)
+        temp_path = f'{target}.part'
+        variant.save(temp_path, 'JPEG', quality=85, optimize=True, progressive=True)
+        os.replace(temp_path, target)
+
+def process_photo(app, user_id, digest, extension):
+    """Background task: build the variants and point the user at them
+
+    The user is only updated if they still show this upload, so a newer photo
+    uploaded while this one was processing is never overwritten.
+    """
+    from .. import db
+    from ..models import User
+
+    upload_folder = app.config['UPLOAD_FOLDER']
+    try:
+        if not variants_exist(upload_folder, digest):
+            run_blocking(generate_variants, upload_folder, digest, extension)
+    except Exception:
+        app.logger.exception('Failed to generate variants for photo %s', digest)
+        return
+
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        if user and user.photo_url == photo_url(digest, extension):
+            user.photo_url = photo_url(digest, extension, 'avatar')
+            db.session.commit()
+
+def store_photo(app, file):
+    """Save an uploaded photo
+
+    Returns ``(url, pending)``: the URL to store on the user right away and,
+    when the variants still have to be built, the ``(digest, extension)`` to
+    hand to ``schedule_variants`` once the user has been committed. Content
+    processed before goes straight to its avatar variant.
+    """
+    upload_folder = app.config['UPLOAD_FOLDER']
+    digest, extension = save_upload(file.stream, upload_folder, app.config['MAX_PHOTO_BYTES'])
+    if Image is None:
+        return photo_url(digest, extension), None
+    if variants_exist(upload_folder, digest):
+        return photo_url(digest, extension, 'avatar'), None
+    return photo_url(digest, extension), (digest, extension)
+
+def schedule_variants(app, socketio, user_id, pending):
+    """Build a photo's variants in the background"""
+    digest, extension = pending
+    socketio.start_background_task(process_photo, app, user_id, digest, extension)
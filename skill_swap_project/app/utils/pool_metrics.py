@@ -0,0 +1,149 @@
+import logging
+import time
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times how long each checkout waited for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timeouts = 0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        record.info['checkout_wait'] = time.perf_counter() - started
+        return record
+
+# SQLAlchemy names a pool's logger after its class, which puts this one under
+# Flask's 'app' logger (DEBUG when debugging) and would log every checkout and
+# checkin; echo_pool and the 'sqlalchemy.pool' loggers stay the way to see them
+logging.getLogger(f'{__name__}.{InstrumentedQueuePool.__name__}').setLevel(logging.WARNING)
+
+class Timing:
+    """Count, sum and max of a duration"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': round(self.total * 1000, 3),
+            'avg_ms': round(self.total / self.count * 1000, 3) if self.count else 0,
+            'max_ms': round(self.max * 1000, 3)
+        }
+
+class PoolStats:
+    """Event counters of one engine's pool"""
+
+    def __init__(self):
+        self.checkout_wait = Timing()
+        self.hold_time = Timing()
+        self.lifetime = Timing()
+        self.connects = 0
+        self.closes = 0
+        self.invalidations = 0
+
+class PoolMetrics:
+    """Checkout waits, in-use and overflow counts and connection lifetimes per engine
+
+    Pool events on every bound engine (primary and replicas) feed the
+    counters; live sizes are read from the pools themselves when stats are
+    requested. Waits are only measured for pools created from
+    InstrumentedQueuePool (the ``poolclass`` set in SQLALCHEMY_ENGINE_OPTIONS).
+    """
+
+    def __init__(self):
+        self.pools = {}
+
+    def init_app(self, app):
+        from .. import db
+        with app.app_context():
+            for key, engine in db.engines.items():
+                self.instrument(key or 'primary', engine)
+        app.extensions['pool_metrics'] = self
+
+    def instrument(self, name, engine):
+        """Listen to the pool events of an engine (they survive engine.dispose())"""
+        if name in self.pools and self.pools[name][0] is engine:
+            return
+        stats = PoolStats()
+        self.pools[name] = (engine, stats)
+
+        @event.listens_for(engine, 'connect')
+        def on_connect(dbapi_connection, record):
+            record.info['connected_at'] = time.monotonic()
+            stats.connects += 1
+
+        @event.listens_for(engine, 'checkout')
+        def on_checkout(dbapi_connection, record, proxy):
+            record.info['checked_out_at'] = time.monotonic()
+            wait = record.info.pop('checkout_wait', None)
+            if wait is not None:
+                stats.checkout_wait.observe(wait)
+
+        @event.listens_for(engine, 'checkin')
+        def on_checkin(dbapi_connection, record):
+            checked_out_at = record.info.pop('checked_out_at', None)
+            if checked_out_at is not None:
+                stats.hold_time.observe(time.monotonic() - checked_out_at)
+
+        @event.listens_for(engine, 'invalidate')
+        def on_invalidate(dbapi_connection, record, exception):
+            stats.invalidations += 1
+
+        @event.listens_for(engine, 'close')
+        def on_close(dbapi_connection, record):
+            stats.closes += 1
+            connected_at = record.info.pop('connected_at', None)
+            if connected_at is not None:
+                stats.lifetime.observe(time.monotonic() - connected_at)
+
+    def stats(self):
+        """Get live pool sizes and event counters per bind"""
+        from .. import db
+
+        result = {}
+        for key, engine in db.engines.items():
+            name = key or 'primary'
+            pool = engine.pool
+            stats = self.pools[name][1] if self.pools.get(name, (None,))[0] is engine else None
+            entry = {'pool': type(pool).__name__}
+            if isinstance(pool, QueuePool):
+                entry.update({
+                    'size': pool.size(),
+                    'checked_out': pool.checkedout(),
+                    'checked_in': pool.checkedin(),
+                    'overflow': max(pool.overflow(), 0),
+                    'max_overflow': pool._max_overflow,
+                    'timeout': pool.timeout(),
+                    'timeouts': getattr(pool, 'timeouts', None)
+                })
+            if stats is not None:
+                entry.update({
+                    'connects': stats.connects,
+                    'closes': stats.closes,
+                    'invalidations': stats.invalidations,
+                    'checkout_wait': stats.checkout_wait.to_dict(),
+                    'hold_time': stats.hold_time.to_dict(),
+                    'connection_lifetime': stats.lifetime.to_dict()
+                })
+            result[name] = entry
+        return result
+
+
+pool_metrics = PoolMetrics()
@@ -0,0 +1,218 @@
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+
+try:
+    from eventlet import patcher
+    # Samplers need real OS threads and sleeps, even when eventlet has patched the modules
+    _threading = patcher.original('threading')
+    _time = patcher.original('time')
+except ImportError:  # Running without eventlet (e.g. the threading dev server)
+    _threading = threading
+    _time = time
+
+MAX_STACKS = 5000
+TRACEMALLOC_FRAMES = 25
+THREAD_PREFIX = 'profile-job-'
+
+def _frame_name(frame):
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+def sample_stacks(seconds, interval):
+    """Sample the stack of every thread but the profiler's for `seconds`, counting identical stacks
+
+    Returns collapsed stacks (root first, frames joined by ';') with their
+    sample counts, the input format of flamegraph.pl and speedscope. Under
+    eventlet the main thread's stack is whichever green thread was running
+    when the sample was taken (the hub when idle).
+    """
+    counts = Counter()
+    deadline = _time.monotonic() + seconds
+    while _time.monotonic() < deadline:
+        # Leave out this and other profile runs
+        skip = {thread.ident for thread in _threading.enumerate() if thread.name.startswith(THREAD_PREFIX)}
+        for ident, frame in sys._current_frames().items():
+            if ident in skip:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            counts[';'.join(reversed(stack))] += 1
+        _time.sleep(interval)
+    return counts
+
+def _allocation_stats(statistics, limit):
+    return [{
+        'where': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+        'size_kb': round(stat.size / 1024, 1),
+        'count': stat.count
+    } for stat in statistics[:limit]]
+
+def _allocation_diff(statistics, limit):
+    return [{
+        'where': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+        'size_diff_kb': round(stat.size_diff / 1024, 1),
+        'count_diff': stat.count_diff,
+        'size_kb': round(stat.size / 1024, 1)
+    } for stat in statistics[:limit]]
+
+class Profiler:
+    """Run admin-requested CPU and memory profiles on every live worker
+
+    A job is a ProfileJob row. Each worker looks for new jobs at most every
+    PROFILER_POLL_INTERVAL seconds, in a background task started after a
+    request (so polling never touches the request's session), and claims its share by
+    inserting a ProfileResult row, so the profile covers all processes
+    sharing the database. The profile itself runs in a real OS thread:
+
+    - cpu: samples every thread's stack each ``interval`` seconds and stores
+      collapsed stacks (ProfileJob.collapsed_stacks() merges the workers);
+    - memory: traces allocations with tracemalloc for the job's duration and
+      stores the top allocators, the growth during the window and the growth
+      since this worker's previous memory job.
+
+    Results are saved by the worker's next poll once the run finishes.
+    tracemalloc is stopped again after the run unless it was already on.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.poll_interval = 2.0
+        self.max_seconds = 60
+        self.top_allocators = 25
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+        self._runs = {}
+        self._previous_snapshot = None
+        self._last_poll = 0
+        self._polling = False
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('PROFILER_ENABLED', True)
+        self.poll_interval = app.config.get('PROFILER_POLL_INTERVAL', self.poll_interval)
+        self.max_seconds = app.config.get('PROFILER_MAX_SECONDS', self.max_seconds)
+        if not self.enabled:
+            return
+
+        @app.after_request
+        def poll_profile_jobs(response):
+            self.maybe_poll(app)
+            return response
+
+    def maybe_poll(self, app, force=False):
+        """Start a background poll when the interval has elapsed (or right away with `force`) and none is running"""
+        if not force and time.monotonic() - self._last_poll < self.poll_interval:
+            return
+        with self._lock:
+            if self._polling:
+                return
+            self._polling = True
+            self._last_poll = time.monotonic()
+        from .. import socketio
+        socketio.start_background_task(self._poll_task, app)
+
+    def _poll_task(self, app):
+        """Background task: poll in a fresh app context (and session), logging failures"""
+        try:
+            with app.app_context():
+                self.poll()
+        except Exception:
+            app.logger.exception('Profile job poll failed')
+        finally:
+            self._polling = False
+
+    def poll(self):
+        """Save finished runs and start the jobs this worker has not joined yet"""
+        from .. import db
+        from ..models.profile_job import ProfileJob, ProfileResult
+
+        self._save_finished()
+        # Workers that were idle while a job was requested join late, for what is left of it
+        for job in ProfileJob.get_open_jobs(self.max_seconds):
+            if job.id in self._runs or any(result.worker == self.worker for result in job.results):
+                continue
+            remaining = job.seconds - (datetime.utcnow() - job.created_at).total_seconds()
+            if remaining <= 0:
+                continue
+            try:
+                with db.session.begin_nested():
+                    db.session.add(ProfileResult(job.id, self.worker))
+            except IntegrityError:
+                continue
+            db.session.commit()
+            self._start(job.id, job.kind, remaining, job.interval)
+
+    def _start(self, job_id, kind, seconds, interval):
+        run = self._runs[job_id] = {'done': False, 'status': None, 'output': None}
+        target = self._cpu if kind == 'cpu' else self._memory
+        thread = _threading.Thread(target=self._run, args=(run, target, seconds, interval),
+                                   name=f'{THREAD_PREFIX}{job_id}', daemon=True)
+        thread.start()
+
+    def _run(self, run, target, seconds, interval):
+        try:
+            run['output'] = target(seconds, interval)
+            run['status'] = 'done'
+        except Exception as exc:
+            run['output'] = f'{type(exc).__name__}: {exc}'
+            run['status'] = 'failed'
+        run['done'] = True
+
+    def _cpu(self, seconds, interval):
+        counts = sample_stacks(seconds, interval or 0.01)
+        return '\n'.join(f'{stack} {count}' for stack, count in counts.most_common(MAX_STACKS))
+
+    def _memory(self, seconds, interval):
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        try:
+            before = tracemalloc.take_snapshot()
+            _time.sleep(seconds)
+            after = tracemalloc.take_snapshot()
+            traced, peak = tracemalloc.get_traced_memory()
+        finally:
+            if started:
+                tracemalloc.stop()
+        # Leave out the profiler's own allocations
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        after = after.filter_traces(ignore)
+        report = {
+            'tracing_was_on': not started,
+            'traced_kb': round(traced / 1024, 1),
+            'peak_kb': round(peak / 1024, 1),
+            'top': _allocation_stats(after.statistics('lineno'), self.top_allocators),
+            'growth': _allocation_diff(after.compare_to(before.filter_traces(ignore), 'lineno'),
+                                       self.top_allocators)
+        }
+        if self._previous_snapshot is not None:
+            report['growth_since_previous_job'] = _allocation_diff(
+                after.compare_to(self._previous_snapshot, 'lineno'), self.top_allocators)
+        self._previous_snapshot = after
+        return json.dumps(report)
+
+    def _save_finished(self):
+        from .. import db
+        from ..models.profile_job import ProfileResult
+
+        finished = [job_id for job_id, run in self._runs.items() if run['done']]
+        for job_id in finished:
+            run = self._runs.pop(job_id)
+            ProfileResult.query.filter_by(job_id=job_id, worker=self.worker).update({
+                'status': run['status'],
+                'output': run['output'],
+                'finished_at': datetime.utcnow()
+            }, synchronize_session=False)
+        if finished:
+            db.session.commit()
+
+
+profiler = Profiler()
@@ -0,0 +1,133 @@
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Recorders opened by record_queries (they span several requests in tests and benchmarks)
+_recorders = ContextVar('query_recorders', default=())
+
+class QueryLog:
+    """Queries executed during one request (or one assert_max_queries block)"""
+
+    def __init__(self):
+        self.statements = []
+        self.parameter_sets = {}
+        self.total_time = 0.0
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def record(self, statement, duration, parameters=None):
+        self.statements.append(statement)
+        # Hashes of the distinct parameter sets each statement ran with
+        self.parameter_sets.setdefault(statement, set()).add(hash(repr(parameters)))
+        self.total_time += duration
+
+    def repeated(self, threshold):
+        """Get (statement, runs, parameter sets) of statements run with at least ``threshold`` different parameters
+
+        Re-running a statement with the same parameters (e.g. the same row
+        loaded twice) is wasteful but not an N+1; a loop over rows is.
+        """
+        return [(statement, count, len(self.parameter_sets[statement]))
+                for statement, count in Counter(self.statements).most_common()
+                if len(self.parameter_sets[statement]) >= threshold]
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's own execution context: a statement that raises never reaches
+    # after_cursor_execute, and must not leave anything behind on the pooled connection
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_start', None)
+    if started is None:
+        return
+    duration = time.perf_counter() - started
+    # Statements are parameterized, so an N+1 loop repeats the same string with different parameters
+    if has_app_context():
+        log = g.get('query_log')
+        if log is not None:
+            log.record(statement, duration, parameters)
+    for recorder in _recorders.get():
+        recorder.record(statement, duration, parameters)
+
+class QueryStats:
+    """Count queries and DB time per request and flag N+1 patterns
+
+    Engine events feed a per-request QueryLog. After each request the totals
+    go into a ``Server-Timing`` header (visible in the browser dev tools), and
+    any statement run with at least QUERY_N_PLUS_ONE_THRESHOLD different
+    parameter sets is logged as a probable N+1 together with the endpoint
+    that issued it.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.threshold = 5
+        self._listening = False
+
+    def init_app(self, app):
+        self.enabled = app.config.get('QUERY_STATS_ENABLED', True)
+        self.threshold = app.config.get('QUERY_N_PLUS_ONE_THRESHOLD', self.threshold)
+        if not self._listening:
+            # Listen on the Engine class so every engine (and every app) is covered
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            self._listening = True
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.extensions['query_stats'] = self
+
+    def _start(self):
+        if self.enabled:
+            g.query_log = QueryLog()
+            g.request_started = time.perf_counter()
+
+    def _finish(self, response):
+        log = g.get('query_log')
+        if log is None:
+            return response
+
+        elapsed = time.perf_counter() - g.request_started
+        response.headers.add('Server-Timing', f'db;dur={log.total_time * 1000:.1f};desc="{log.count} queries"')
+        response.headers.add('Server-Timing', f'app;dur={elapsed * 1000:.1f}')
+
+        for statement, count, distinct in log.repeated(self.threshold):
+            current_app.logger.warning('Possible N+1 on %s %s (%s): statement ran %d times with %d different parameters: %s',
+                                       request.method, request.path, request.endpoint, count, distinct,
+                                       ' '.join(statement.split())[:300])
+        return response
+
+@contextmanager
+def record_queries():
+    """Collect every query run inside the block (across requests) into a QueryLog"""
+    log = QueryLog()
+    token = _recorders.set(_recorders.get() + (log,))
+    try:
+        yield log
+    finally:
+        _recorders.reset(token)
+
+@contextmanager
+def assert_max_queries(limit):
+    """Fail if the block runs more than ``limit`` queries
+
+    Usable around test client calls to pin the query count of a view::
+
+        with assert_max_queries(5):
+            client.get('/search')
+    """
+    with record_queries() as log:
+        yield log
+    if log.count > limit:
+        repeated = ''.join(f'\n  {count}x ({distinct} parameter sets) {" ".join(statement.split())[:200]}'
+                           for statement, count, distinct in log.repeated(2))
+        raise AssertionError(f'Expected at most {limit} queries, got {log.count}{repeated}')
+
+
+query_stats = QueryStats()
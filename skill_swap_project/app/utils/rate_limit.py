@@ -0,0 +1,191 @@
+import math
+import os
+import threading
+import time
+from functools import wraps
+from flask import request, jsonify, make_response
+from flask_login import current_user
+from .sqlite_store import SQLiteStore
+
+# Default policies: name -> (max requests, window in seconds, key type)
+DEFAULT_POLICIES = {
+    'login': (10, 60, 'ip'),
+    'admin_login': (5, 60, 'ip'),
+    'check_email': (30, 60, 'ip'),
+    'swap_request': (20, 3600, 'user'),
+    'chat_message': (60, 60, 'user'),
+    'profiler': (5, 600, 'user'),
+}
+
+def slide(state, limit, period, now):
+    """Apply one hit to a sliding-window counter
+
+    ``state`` is ``(window, previous_count, current_count)`` where ``window`` is
+    the index of the current fixed window. The request rate is estimated as the
+    current count plus the previous window's count weighted by how much of it
+    still overlaps the sliding window. Returns ``(new_state, allowed, retry_after)``.
+    """
+    window = int(now // period)
+    if state is None:
+        state = (window, 0, 0)
+    last_window, previous, current = state
+    if window == last_window + 1:
+        previous, current = current, 0
+    elif window != last_window:
+        previous, current = 0, 0
+
+    elapsed = (now - window * period) / period
+    estimate = previous * (1 - elapsed) + current
+    if estimate + 1 > limit:
+        retry_after = max(1, math.ceil((1 - elapsed) * period))
+        return (window, previous, current), False, retry_after
+    return (window, previous, current + 1), True, 0
+
+def expires_at(state, period):
+    """When a counter stops affecting any decision (both of its windows are over)"""
+    return (state[0] + 2) * period
+
+class MemoryBackend:
+    """Per-process counters: a (window, previous, current) tuple and its expiry per key
+
+    Each key carries the expiry of its own policy's window, so pruning only
+    ever drops counters that can no longer limit anyone. Live counters are
+    never evicted (that would reset their limits); when more than
+    ``max_keys`` are live the threshold for the next prune doubles instead.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._prune_at = max_keys
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, period, now):
+        with self._lock:
+            entry = self._counters.get(key)
+            state, allowed, retry_after = slide(entry[0] if entry else None, limit, period, now)
+            self._counters[key] = (state, expires_at(state, period))
+            if len(self._counters) > self._prune_at:
+                self._prune(now)
+        return allowed, retry_after
+
+    def _prune(self, now):
+        """Drop expired counters"""
+        stale = [key for key, (_, expiry) in self._counters.items() if expiry <= now]
+        for key in stale:
+            del self._counters[key]
+        # Prune again only once the live keys doubled, so a full table is not rescanned on every hit
+        self._prune_at = max(self.max_keys, 2 * len(self._counters))
+
+class SQLiteBackend:
+    """Counters shared by every worker on a host, in an embedded SQLite file (WAL mode)
+
+    Expired counters are deleted in bounded batches at most once per sweep
+    interval, by whichever worker gets there first.
+    """
+
+    def __init__(self, path, sweep_interval=300, sweep_batch_size=1000):
+        self.store = SQLiteStore(path, schema=[
+            'CREATE TABLE IF NOT EXISTS rate_limits '
+            '(key TEXT PRIMARY KEY, window INTEGER, previous INTEGER, current INTEGER, expires_at REAL)',
+        ])
+        conn = self.store.connection()
+        if 'expires_at' not in [row[1] for row in conn.execute('PRAGMA table_info(rate_limits)')]:
+            # Files created before counters expired
+            conn.execute('ALTER TABLE rate_limits ADD COLUMN expires_at REAL')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_rate_limits_expires_at ON rate_limits (expires_at)')
+        self.sweep_interval = sweep_interval
+        self.sweep_batch_size = sweep_batch_size
+        self._last_sweep = 0
+        self._sweep_lock = threading.Lock()
+
+    def hit(self, key, limit, period, now):
+        with self.store.transaction() as conn:
+            row = conn.execute('SELECT window, previous, current FROM rate_limits WHERE key = ?', (key,)).fetchone()
+            state, allowed, retry_after = slide(row, limit, period, now)
+            conn.execute('INSERT OR REPLACE INTO rate_limits (key, window, previous, current, expires_at) '
+                         'VALUES (?, ?, ?, ?, ?)', (key,) + state + (expires_at(state, period),))
+        self._maybe_sweep(now)
+        return allowed, retry_after
+
+    def _maybe_sweep(self, now):
+        if now - self._last_sweep < self.sweep_interval or not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_sweep = now
+            self.sweep(now, self.sweep_batch_size)
+        finally:
+            self._sweep_lock.release()
+
+    def sweep(self, now, batch_size):
+        """Delete up to batch_size expired counters (rows from before expiry tracking count as expired)"""
+        with self.store.transaction() as conn:
+            return conn.execute('DELETE FROM rate_limits WHERE rowid IN '
+                                '(SELECT rowid FROM rate_limits WHERE expires_at IS NULL OR expires_at <= ? LIMIT ?)',
+                                (now, batch_size)).rowcount
+
+class RateLimiter:
+    """Flask extension applying per-route rate-limit policies"""
+
+    def __init__(self):
+        self.backend = None
+        self.enabled = True
+        self.policies = dict(DEFAULT_POLICIES)
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RATE_LIMIT_ENABLED', True)
+        self.policies.update(app.config.get('RATE_LIMITS', {}))
+        if app.config.get('RATE_LIMIT_BACKEND', 'memory') == 'sqlite':
+            path = app.config.get('RATE_LIMIT_SQLITE_PATH') or \
+                os.path.join(app.instance_path, 'rate_limits.sqlite')
+            self.backend = SQLiteBackend(path)
+        else:
+            self.backend = MemoryBackend()
+        app.extensions['rate_limiter'] = self
+
+    def _identity(self, key_type):
+        if key_type == 'user' and current_user.is_authenticated:
+            return current_user.get_id()
+        return request.remote_addr or 'unknown'
+
+    def _count(self, policy, allowed):
+        with self._stats_lock:
+            stats = self._stats.setdefault(policy, {'allowed': 0, 'rejected': 0})
+            stats['allowed' if allowed else 'rejected'] += 1
+
+    def check(self, policy):
+        """Record a hit for a policy, returning (allowed, retry_after)"""
+        limit, period, key_type = self.policies[policy]
+        key = f'{policy}:{self._identity(key_type)}'
+        allowed, retry_after = self.backend.hit(key, limit, period, time.time())
+        self._count(policy, allowed)
+        return allowed, retry_after
+
+    def limit(self, policy, methods=None):
+        """Decorator rejecting requests over a policy's limit with a 429"""
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                if self.enabled and (methods is None or request.method in methods):
+                    allowed, retry_after = self.check(policy)
+                    if not allowed:
+                        return self._too_many_requests(retry_after)
+                return f(*args, **kwargs)
+            return decorated_function
+        return decorator
+
+    def _too_many_requests(self, retry_after):
+        if request.is_json or request.path.startswith('/api/'):
+            response = make_response(jsonify({'error': 'Too many requests'}), 429)
+        else:
+            response = make_response('Too many requests. Please slow down and try again shortly.', 429)
+            response.mimetype = 'text/plain'
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+
+    def stats(self):
+        """Get allowed/rejected counters per policy"""
+        with self._stats_lock:
+            return {policy: dict(counts) for policy, counts in self._stats.items()}
@@ -0,0 +1,315 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+
+# Share of each signal in a candidate's score (each signal is scaled to 0..1)
+WEIGHTS = {
+    'reciprocity': 0.5,
+    'rating': 0.2,
+    'availability': 0.15,
+    'activity': 0.15
+}
+MATCHES_COUNTED = 3  # Skills matched beyond this many in one direction add nothing
+RATING_PRIOR = 3.5  # Unrated users count as this many stars...
+RATING_PRIOR_WEIGHT = 3  # ...weighted as this many ratings
+ACTIVITY_HALF_LIFE_DAYS = 14
+UNKNOWN_AVAILABILITY = 0.5  # Signal used when either side has no time slots
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+def _weekly_slots(rows):
+    """Group (user_id, day, start, end) rows into {user_id: {day: [(start, end) minutes]}}"""
+    slots = defaultdict(lambda: defaultdict(list))
+    for user_id, day, start, end in rows:
+        slots[user_id][day].append((_minutes(start), _minutes(end)))
+    return slots
+
+def _overlap_minutes(mine, theirs):
+    total = 0
+    for day, ranges in mine.items():
+        for start, end in ranges:
+            for other_start, other_end in theirs.get(day, ()):
+                total += max(0, min(end, other_end) - max(start, other_start))
+    return total
+
+def _total_minutes(slots):
+    return sum(end - start for ranges in slots.values() for start, end in ranges)
+
+def score_candidates(user_id, candidate_limit=500):
+    """Score the swap partners of a user, best first, as (candidate id, score, signals) tuples
+
+    Candidates are users offering a skill the user wants or wanting one they
+    offer (the `candidate_limit` with the most matches), leaving out hidden,
+    banned, deleted and unavailable users and anyone already in a pending or
+    accepted swap with them. Each candidate gets a weighted sum of:
+
+    - reciprocity: skills matched in each direction, with a bonus when both
+      sides have something the other wants;
+    - rating: average rating shrunk towards RATING_PRIOR for few ratings;
+    - availability: share of the user's weekly time slots the candidate
+      shares;
+    - activity: decays with the time since the candidate's last change.
+    """
+    from .. import db
+    from ..models import User, UserSkill, Feedback, Availability, SwapRequest, UserVersion
+
+    own = db.session.query(UserSkill.skill_id, UserSkill.skill_type).filter(UserSkill.user_id == user_id).all()
+    offered = [skill_id for skill_id, skill_type in own if skill_type == 'offered']
+    wanted = [skill_id for skill_id, skill_type in own if skill_type == 'wanted']
+    if not offered and not wanted:
+        return []
+
+    gives = db.func.sum(db.case(((UserSkill.skill_type == 'offered') & UserSkill.skill_id.in_(wanted), 1), else_=0))
+    takes = db.func.sum(db.case(((UserSkill.skill_type == 'wanted') & UserSkill.skill_id.in_(offered), 1), else_=0))
+    rows = db.session.query(UserSkill.user_id, gives.label('gives'), takes.label('takes'))\
+                     .join(User, User.id == UserSkill.user_id)\
+                     .filter(((UserSkill.skill_type == 'offered') & UserSkill.skill_id.in_(wanted)) |
+                             ((UserSkill.skill_type == 'wanted') & UserSkill.skill_id.in_(offered)),
+                             UserSkill.user_id != user_id,
+                             User.is_public == True,
+                             User.is_banned == False,
+                             User.deleted_at.is_(None),
+                             User.availability != 'unavailable')\
+                     .group_by(UserSkill.user_id)\
+                     .order_by((gives + takes).desc(), UserSkill.user_id)\
+                     .limit(candidate_limit).all()
+
+    busy = db.session.query(SwapRequest.requester_id, SwapRequest.receiver_id).filter(
+        (SwapRequest.requester_id == user_id) | (SwapRequest.receiver_id == user_id),
+        SwapRequest.status.in_(('pending', 'accepted'))
+    ).all()
+    busy = {user for pair in busy for user in pair}
+    rows = [row for row in rows if row.user_id not in busy]
+    if not rows:
+        return []
+    ids = [row.user_id for row in rows]
+
+    ratings = {rated: (avg, count) for rated, avg, count in db.session.query(
+        Feedback.rated_user_id, db.func.avg(Feedback.rating), db.func.count(Feedback.id)
+    ).filter(Feedback.rated_user_id.in_(ids)).group_by(Feedback.rated_user_id)}
+    slots = _weekly_slots(db.session.query(
+        Availability.user_id, Availability.day_of_week, Availability.start_time, Availability.end_time
+    ).filter(Availability.user_id.in_(ids + [user_id]), Availability.is_available == True))
+    own_minutes = _total_minutes(slots.get(user_id, {}))
+    changed = dict(db.session.query(UserVersion.user_id, UserVersion.updated_at).filter(UserVersion.user_id.in_(ids)))
+    created = dict(db.session.query(User.id, User.created_at).filter(User.id.in_(ids)))
+
+    now = datetime.utcnow()
+    scored = []
+    for row in rows:
+        gives, takes = int(row.gives or 0), int(row.takes or 0)
+        mutual = gives > 0 and takes > 0
+        reciprocity = 0.6 * mutual + 0.4 * (min(gives, MATCHES_COUNTED) + min(takes, MATCHES_COUNTED)) / (2 * MATCHES_COUNTED)
+
+        avg, count = ratings.get(row.user_id, (0, 0))
+        rating = (float(avg or 0) * count + RATING_PRIOR * RATING_PRIOR_WEIGHT) / (count + RATING_PRIOR_WEIGHT) / 5
+
+        theirs = slots.get(row.user_id)
+        overlap = _overlap_minutes(slots[user_id], theirs) if own_minutes and theirs else None
+        availability = overlap / min(own_minutes, _total_minutes(theirs)) if overlap is not None else UNKNOWN_AVAILABILITY
+
+        last_change = changed.get(row.user_id) or created.get(row.user_id) or now
+        activity = 0.5 ** (max((now - last_change).total_seconds(), 0) / 86400 / ACTIVITY_HALF_LIFE_DAYS)
+
+        score = (WEIGHTS['reciprocity'] * reciprocity + WEIGHTS['rating'] * rating +
+                 WEIGHTS['availability'] * min(availability, 1) + WEIGHTS['activity'] * activity)
+        scored.append((row.user_id, round(score, 4), {
+            'mutual': mutual,
+            'rating': round(float(avg), 1) if count else None,
+            'overlap_hours': round(overlap / 60, 1) if overlap is not None else None
+        }))
+    scored.sort(key=lambda item: (-item[1], item[0]))
+    return scored
+
+def refresh_user(user_id, per_user=10, candidate_limit=500, propagate=False):
+    """Recompute the top `per_user` recommendations of a user in one transaction
+
+    With `propagate` (the user's own profile, skills, ratings or swaps
+    changed), every candidate and every user whose list currently holds
+    this user is marked stale, since their lists may now rank them
+    differently.
+    """
+    from .. import db
+    from ..models import UserSkill, Recommendation, RecommendationState
+
+    started = datetime.utcnow()
+    scored = score_candidates(user_id, candidate_limit)
+    top = scored[:per_user]
+
+    names = defaultdict(lambda: {'offers': [], 'wants': []})
+    if top:
+        own = db.session.query(UserSkill.skill_id, UserSkill.skill_type).filter(UserSkill.user_id == user_id).all()
+        wanted = {skill_id for skill_id, skill_type in own if skill_type == 'wanted'}
+        offered = {skill_id for skill_id, skill_type in own if skill_type == 'offered'}
+        for candidate_id, skill_id, skill_name, skill_type in db.session.query(
+                UserSkill.user_id, UserSkill.skill_id, UserSkill.skill_name, UserSkill.skill_type
+        ).filter(UserSkill.user_id.in_([candidate_id for candidate_id, _, _ in top])):
+            if skill_type == 'offered' and skill_id in wanted:
+                names[candidate_id]['offers'].append(skill_name)
+            elif skill_type == 'wanted' and skill_id in offered:
+                names[candidate_id]['wants'].append(skill_name)
+
+    if propagate:
+        listing = [listed_by for (listed_by,) in db.session.query(Recommendation.user_id)
+                                                          .filter(Recommendation.candidate_id == user_id)]
+        RecommendationState.mark_stale({candidate_id for candidate_id, _, _ in scored} | set(listing))
+
+    Recommendation.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    if top:
+        db.session.execute(db.insert(Recommendation), [{
+            'user_id': user_id,
+            'rank': rank,
+            'candidate_id': candidate_id,
+            'score': score,
+            'reasons': json.dumps(dict(signals, **names[candidate_id]), separators=(',', ':')),
+            'computed_at': started
+        } for rank, (candidate_id, score, signals) in enumerate(top, 1)])
+
+    state = db.session.get(RecommendationState, user_id)
+    if state is None:
+        state = RecommendationState(user_id=user_id)
+        db.session.add(state)
+    # Changes committed while scoring are newer than this, so they are picked up next time
+    state.refreshed_at = started
+    state.stale = False
+    db.session.commit()
+    return len(top)
+
+def _due_query(max_age):
+    from .. import db
+    from ..models import User, UserVersion, RecommendationState
+
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+    return db.session.query(User.id, UserVersion.updated_at, RecommendationState.refreshed_at)\
+                     .outerjoin(UserVersion, UserVersion.user_id == User.id)\
+                     .outerjoin(RecommendationState, RecommendationState.user_id == User.id)\
+                     .filter(User.deleted_at.is_(None), User.is_banned == False,
+                             RecommendationState.user_id.is_(None) |
+                             (RecommendationState.stale == True) |
+                             (UserVersion.updated_at > RecommendationState.refreshed_at) |
+                             (RecommendationState.refreshed_at < cutoff))
+
+def due_users(limit, max_age):
+    """Get (user id, inputs changed) for users whose recommendations need recomputing, longest waiting first
+
+    A user is due when they never had recommendations, when their change
+    stamps moved since the last refresh (inputs changed), when a partner's
+    change marked them stale, or after `max_age` seconds so activity decay
+    and new users show up.
+    """
+    from ..models import User, RecommendationState
+    rows = _due_query(max_age).order_by(RecommendationState.refreshed_at, User.id).limit(limit).all()
+    return [(user_id, refreshed_at is None or (changed_at is not None and changed_at > refreshed_at))
+            for user_id, changed_at, refreshed_at in rows]
+
+class Recommender:
+    """Keep each user's "recommended for you" list precomputed
+
+    Scoring a user's partners takes several aggregate queries, so it never
+    runs in a request: pages read the stored top N with a single query
+    (Recommendation.get_for_user). A worker refreshes the lists that are due
+    (see due_users) in the background, in batches, after a request once
+    RECOMMENDATION_REFRESH_INTERVAL seconds have passed since its last run.
+    The UserVersion stamps bumped by every profile, skill, feedback and swap
+    write tell which users changed; ``flask refresh-recommendations`` runs a
+    refresh by hand.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.per_user = 10
+        self.candidate_limit = 500
+        self.batch_size = 100
+        self.max_age = 86400
+        self.pause = 0.05
+        self.interval = 60
+        self._last_run = time.monotonic()
+        self._running = False
+        self._lock = threading.Lock()
+        self._last_result = None
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RECOMMENDATIONS_ENABLED', True)
+        self.per_user = app.config.get('RECOMMENDATIONS_PER_USER', self.per_user)
+        self.candidate_limit = app.config.get('RECOMMENDATION_CANDIDATE_LIMIT', self.candidate_limit)
+        self.batch_size = app.config.get('RECOMMENDATION_BATCH_SIZE', self.batch_size)
+        self.max_age = app.config.get('RECOMMENDATION_MAX_AGE', self.max_age)
+        self.pause = app.config.get('RECOMMENDATION_PAUSE', self.pause)
+        self.interval = app.config.get('RECOMMENDATION_REFRESH_INTERVAL', self.interval)
+        if not self.enabled:
+            return
+
+        @app.after_request
+        def schedule_recommendations(response):
+            self.maybe_start(app)
+            return response
+
+    def maybe_start(self, app):
+        """Start a background refresh when the interval has elapsed and none is running"""
+        if time.monotonic() - self._last_run < self.interval:
+            return
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._last_run = time.monotonic()
+        from .. import socketio
+        socketio.start_background_task(self.run, app)
+
+    def refresh_due(self, max_users=None, sleep=None):
+        """Refresh due users batch by batch until none is left (or `max_users` were done), returning how many"""
+        from .. import db
+        done = 0
+        while max_users is None or done < max_users:
+            batch = due_users(self.batch_size if max_users is None else min(self.batch_size, max_users - done),
+                              self.max_age)
+            for user_id, changed in batch:
+                try:
+                    refresh_user(user_id, self.per_user, self.candidate_limit, propagate=changed)
+                except IntegrityError:
+                    # Another worker refreshed the same user at the same time
+                    db.session.rollback()
+                done += 1
+            if len(batch) < self.batch_size:
+                break
+            if sleep:
+                sleep(self.pause)
+        return done
+
+    def run(self, app):
+        """Background task: refresh every due user"""
+        from .. import socketio
+        started = datetime.utcnow()
+        try:
+            with app.app_context():
+                refreshed = self.refresh_due(sleep=socketio.sleep)
+            self._last_result = {'started_at': started.isoformat(), 'refreshed': refreshed, 'error': None}
+        except Exception as exc:
+            app.logger.exception('Recommendation refresh failed')
+            self._last_result = {'started_at': started.isoformat(), 'refreshed': None,
+                                 'error': f'{type(exc).__name__}: {exc}'}
+        finally:
+            self._running = False
+
+    def stats(self):
+        """Get stored list counts, how many users are due and this worker's last run"""
+        from .. import db
+        from ..models import Recommendation, RecommendationState
+
+        return {
+            'enabled': self.enabled,
+            'per_user': self.per_user,
+            'users_with_recommendations': db.session.query(db.func.count(db.distinct(Recommendation.user_id))).scalar(),
+            'rows': Recommendation.query.count(),
+            'stale': RecommendationState.query.filter_by(stale=True).count(),
+            'due': _due_query(self.max_age).count(),
+            'running': self._running,
+            'last_run': self._last_result
+        }
+
+
+recommender = Recommender()
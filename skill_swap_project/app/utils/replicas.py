@@ -0,0 +1,197 @@
+import random
+import sqlite3
+import threading
+import time
+from flask import after_this_request, current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+class RoutingSession(Session):
+    """Session sending plain SELECTs of read-only requests to the request's replica
+
+    Everything else goes to the primary: flushes, INSERT/UPDATE/DELETE, text
+    statements, SELECT ... FOR UPDATE, models with their own bind key, code
+    running outside a request, and every read issued after this session wrote.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or engine is not self._db.engines.get(None):
+            return engine
+
+        if self._flushing or not getattr(clause, 'is_select', False):
+            # A write (or an unknown statement): later reads must see it too
+            self.info['db_wrote'] = True
+            return engine
+        if self.info.get('db_wrote') or getattr(clause, '_for_update_arg', None) is not None:
+            return engine
+
+        key = g.get('db_replica') if has_request_context() else None
+        if key is None:
+            replicas.primary_reads += 1
+            return engine
+        replicas.replica_reads[key] = replicas.replica_reads.get(key, 0) + 1
+        return self._db.engines[key]
+
+class ReplicaRouter:
+    """Route read-only requests to read replicas that have caught up
+
+    Replicas are the SQLALCHEMY_BINDS listed in REPLICA_BINDS. Every
+    REPLICA_CHECK_INTERVAL seconds a background task per worker (started by
+    a request, which goes on with the last result) writes a heartbeat to the
+    primary and reads it back from each replica: a replica whose last
+    applied heartbeat is older than REPLICA_MAX_LAG seconds (or that cannot
+    be reached) gets no reads until it recovers.
+
+    GET/HEAD requests are pinned to one healthy replica. Requests whose view
+    writes record the commit time in the user's session (checked right after
+    the view, before any after_request hook), and that user's reads stay
+    on the primary until a replica has applied a heartbeat written after it
+    (read-your-writes). Heartbeat times come from the workers' clocks, which
+    are assumed to be in sync.
+
+    With REPLICA_SQLITE_SYNC_INTERVAL set and SQLite binds, the check also
+    copies the primary file into the replica files every that many seconds,
+    a local stand-in for asynchronous replication.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.max_lag = 5.0
+        self.check_interval = 1.0
+        self.sqlite_sync_interval = 0
+        self.applied = {}
+        self.lag = {}
+        self.errors = {}
+        self.primary_reads = 0
+        self.replica_reads = {}
+        self._last_check = 0
+        self._last_sync = 0
+        self._checking = False
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.keys = list(app.config.get('REPLICA_BINDS', []))
+        self.max_lag = app.config.get('REPLICA_MAX_LAG', self.max_lag)
+        self.check_interval = app.config.get('REPLICA_CHECK_INTERVAL', self.check_interval)
+        self.sqlite_sync_interval = app.config.get('REPLICA_SQLITE_SYNC_INTERVAL', self.sqlite_sync_interval)
+        self.applied, self.lag, self.errors = {}, {}, {}
+        self._last_check = self._last_sync = 0
+        app.before_request(self._choose_replica)
+        app.extensions['replicas'] = self
+
+    def is_healthy(self, key):
+        lag = self.lag.get(key)
+        return lag is not None and lag <= self.max_lag
+
+    def _choose_replica(self):
+        g.db_replica = None
+        if not self.keys:
+            return
+        # Per-request hooks run before the app's after_request ones, so only the view's writes count
+        after_this_request(self._remember_write)
+        if request.method not in READ_METHODS:
+            return
+        self.maybe_check(current_app._get_current_object())
+        wrote_at = session.get('db_wrote_at')
+        candidates = [key for key in self.keys if self.is_healthy(key)
+                      and (wrote_at is None or self.applied[key] >= wrote_at)]
+        if candidates:
+            g.db_replica = random.choice(candidates)
+
+    def _remember_write(self, response):
+        from .. import db
+        if db.session.info.pop('db_wrote', False):
+            session['db_wrote_at'] = int(time.time() * 1000)
+        return response
+
+    def maybe_check(self, app):
+        """Start a background check when the interval has elapsed and none is running"""
+        if time.monotonic() - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            if self._checking:
+                return
+            self._checking = True
+            self._last_check = time.monotonic()
+        from .. import socketio
+        socketio.start_background_task(self._check_task, app)
+
+    def _check_task(self, app):
+        """Background task: check the replicas in a fresh app context, logging failures"""
+        try:
+            with app.app_context():
+                self.check()
+        except Exception:
+            app.logger.exception('Replica check failed')
+        finally:
+            self._checking = False
+
+    def check(self):
+        """Write a heartbeat to the primary and measure how far behind each replica is"""
+        from .. import db
+        from ..models.replica_heartbeat import ReplicaHeartbeat
+
+        engines = db.engines
+        try:
+            with engines[None].begin() as connection:
+                ReplicaHeartbeat.beat(connection)
+        except Exception:
+            # Another worker created the row first, or the primary is down (then so are the writes)
+            pass
+        if self.sqlite_sync_interval and time.monotonic() - self._last_sync >= self.sqlite_sync_interval:
+            self.sync_sqlite()
+
+        now_ms = int(time.time() * 1000)
+        for key in self.keys:
+            try:
+                with engines[key].connect() as connection:
+                    applied = ReplicaHeartbeat.read(connection)
+            except Exception as exc:
+                applied = None
+                self.errors[key] = str(exc)
+            self.applied[key] = applied or 0
+            self.lag[key] = (now_ms - applied) / 1000 if applied else None
+
+    def sync_sqlite(self):
+        """Copy the primary SQLite file into each SQLite replica file"""
+        from .. import db
+
+        self._last_sync = time.monotonic()
+        engines = db.engines
+        if engines[None].dialect.name != 'sqlite':
+            return
+        source = sqlite3.connect(engines[None].url.database, timeout=5)
+        try:
+            for key in self.keys:
+                if engines[key].dialect.name != 'sqlite':
+                    continue
+                target = sqlite3.connect(engines[key].url.database, timeout=5)
+                try:
+                    source.backup(target)
+                except sqlite3.OperationalError as exc:
+                    # A reader holds the replica; the next sync catches up
+                    self.errors[key] = str(exc)
+                finally:
+                    target.close()
+        finally:
+            source.close()
+
+    def stats(self):
+        """Get lag, health and routed read counts per replica"""
+        return {
+            'max_lag': self.max_lag,
+            'check_interval': self.check_interval,
+            'primary_reads': self.primary_reads,
+            'replicas': {key: {
+                'healthy': self.is_healthy(key),
+                'lag': self.lag.get(key),
+                'applied_ms': self.applied.get(key),
+                'reads': self.replica_reads.get(key, 0),
+                'last_error': self.errors.get(key)
+            } for key in self.keys}
+        }
+
+
+replicas = ReplicaRouter()
@@ -0,0 +1,261 @@
+import os
+import secrets
+import threading
+import time
+import zlib
+from flask import session
+from flask.json.tag import TaggedJSONSerializer
+from flask_login import user_logged_in
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from .sqlite_store import SQLiteStore
+
+_serializer = TaggedJSONSerializer()
+
+def encode_session(data):
+    """Serialize session data to compact bytes (tagged JSON, zlib-compressed when it pays off)"""
+    raw = _serializer.dumps(data).encode('utf-8')
+    if len(raw) > 128:
+        return b'z' + zlib.compress(raw, 6)
+    return b'j' + raw
+
+def decode_session(blob):
+    """Deserialize bytes produced by encode_session"""
+    blob = bytes(blob)
+    raw = zlib.decompress(blob[1:]) if blob[:1] == b'z' else blob[1:]
+    return _serializer.loads(raw.decode('utf-8'))
+
+class ServerSideSession(SessionMixin):
+    """Session whose data is only fetched from the store when first touched"""
+
+    def __init__(self, sid=None, loader=None):
+        self.sid = sid
+        self.new = sid is None
+        self.modified = False
+        self.accessed = False
+        self.expires_at = None
+        self.replaced_sid = None
+        self._loader = loader
+        self._data = None
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    def _load(self):
+        self.accessed = True
+        if self._data is None:
+            record = self._loader(self.sid) if self.sid and self._loader else None
+            if record is None:
+                self._data = {}
+            else:
+                self._data, self.expires_at = record
+        return self._data
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __setitem__(self, key, value):
+        self._load()[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self._load()[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def clear(self):
+        self._load().clear()
+        self.modified = True
+
+    def regenerate(self):
+        """Issue a new session id for the same data (e.g. on login, against fixation)"""
+        self._load()
+        if self.sid:
+            self.replaced_sid = self.sid
+        self.sid = None
+        self.modified = True
+
+class SQLiteSessionBackend:
+    """Session records in an embedded SQLite file (WAL mode) shared by all workers on a host"""
+
+    def __init__(self, path):
+        self.store = SQLiteStore(path, schema=[
+            'CREATE TABLE IF NOT EXISTS sessions '
+            '(sid TEXT PRIMARY KEY, data BLOB NOT NULL, expires_at REAL NOT NULL, principal TEXT)',
+            'CREATE INDEX IF NOT EXISTS ix_sessions_expires_at ON sessions (expires_at)',
+            'CREATE INDEX IF NOT EXISTS ix_sessions_principal ON sessions (principal)',
+        ])
+
+    def load(self, sid, now):
+        row = self.store.connection().execute(
+            'SELECT data, expires_at FROM sessions WHERE sid = ? AND expires_at > ?', (sid, now)).fetchone()
+        return (decode_session(row[0]), row[1]) if row else None
+
+    def save(self, sid, blob, expires_at, principal):
+        with self.store.transaction() as conn:
+            conn.execute('INSERT OR REPLACE INTO sessions (sid, data, expires_at, principal) VALUES (?, ?, ?, ?)',
+                         (sid, blob, expires_at, principal))
+
+    def touch(self, sid, expires_at):
+        with self.store.transaction() as conn:
+            conn.execute('UPDATE sessions SET expires_at = ? WHERE sid = ?', (expires_at, sid))
+
+    def delete(self, sid):
+        with self.store.transaction() as conn:
+            conn.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+    def delete_for_principals(self, principals):
+        principals = list(principals)
+        deleted = 0
+        for start in range(0, len(principals), 500):
+            chunk = principals[start:start + 500]
+            with self.store.transaction() as conn:
+                placeholders = ','.join('?' * len(chunk))
+                deleted += conn.execute(f'DELETE FROM sessions WHERE principal IN ({placeholders})',
+                                        chunk).rowcount
+        return deleted
+
+    def sweep(self, now, batch_size):
+        with self.store.transaction() as conn:
+            return conn.execute('DELETE FROM sessions WHERE rowid IN '
+                                '(SELECT rowid FROM sessions WHERE expires_at <= ? LIMIT ?)',
+                                (now, batch_size)).rowcount
+
+class ServerSideSessionInterface(SessionInterface):
+    """Keep session data server-side; the cookie only carries a signed session id
+
+    Sessions are loaded lazily, so requests that never touch the session (static
+    files, most anonymous pages) cost no store access. Expired records are
+    removed in bounded batches at most once per sweep interval, and all
+    sessions of a principal (``_user_id`` such as 'user-5') can be revoked at once.
+    """
+
+    salt = 'server-session'
+
+    def __init__(self, backend, sweep_interval=300, sweep_batch_size=1000):
+        self.backend = backend
+        self.sweep_interval = sweep_interval
+        self.sweep_batch_size = sweep_batch_size
+        self._last_sweep = 0
+        self._sweep_lock = threading.Lock()
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt=self.salt, key_derivation='hmac')
+
+    def open_session(self, app, request):
+        if not app.secret_key:
+            return None
+        sid = None
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode('ascii')
+            except BadSignature:
+                sid = None
+        return ServerSideSession(sid, loader=lambda sid: self.backend.load(sid, time.time()))
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        self._maybe_sweep()
+
+        # Untouched sessions need neither a store write nor a cookie
+        if not session.loaded:
+            return
+
+        response.vary.add('Cookie')
+        now = time.time()
+        lifetime = app.permanent_session_lifetime.total_seconds()
+
+        if session.replaced_sid:
+            self.backend.delete(session.replaced_sid)
+
+        if not session:
+            if session.sid:
+                self.backend.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       samesite=samesite, httponly=httponly)
+            return
+
+        if session.modified or session.sid is None:
+            if session.sid is None:
+                session.sid = secrets.token_urlsafe(24)
+            # Principal without the login stamp ('user-5@...' -> 'user-5'), so revocation finds every session
+            principal = (session.get('_user_id') or '').partition('@')[0] or None
+            self.backend.save(session.sid, encode_session(dict(session)), now + lifetime, principal)
+        elif session.expires_at and session.expires_at - now < lifetime / 2:
+            # Slide the expiry, but only write once half of the lifetime is used up
+            self.backend.touch(session.sid, now + lifetime)
+        elif not session.new and not (session.permanent and app.config['SESSION_REFRESH_EACH_REQUEST']):
+            return
+
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.sid).decode('ascii'),
+            expires=self.get_expiration_time(app, session),
+            httponly=httponly,
+            domain=domain,
+            path=path,
+            secure=secure,
+            samesite=samesite
+        )
+
+    def _maybe_sweep(self):
+        now = time.time()
+        if now - self._last_sweep < self.sweep_interval or not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_sweep = now
+            self.backend.sweep(now, self.sweep_batch_size)
+        finally:
+            self._sweep_lock.release()
+
+    def revoke(self, principal_ids):
+        """Delete every session belonging to the given principals"""
+        return self.backend.delete_for_principals(principal_ids)
+
+def init_server_sessions(app):
+    """Install the server-side session interface configured by SESSION_TYPE"""
+    if app.config.get('SESSION_TYPE') != 'sqlite':
+        return None
+    path = app.config.get('SESSION_SQLITE_PATH') or os.path.join(app.instance_path, 'sessions.sqlite')
+    app.session_interface = ServerSideSessionInterface(
+        SQLiteSessionBackend(path),
+        sweep_interval=app.config.get('SESSION_SWEEP_INTERVAL', 300),
+        sweep_batch_size=app.config.get('SESSION_SWEEP_BATCH_SIZE', 1000)
+    )
+    user_logged_in.connect(_regenerate_on_login, app)
+    return app.session_interface
+
+def _regenerate_on_login(sender, user, **extra):
+    if isinstance(session._get_current_object(), ServerSideSession):
+        session.regenerate()
+
+def revoke_sessions(app, principal_ids):
+    """Sign principals out everywhere: void their logins and remember cookies, and delete their server-side sessions
+
+    Users get a revocation stamp (committed here) that load_user checks
+    against the login time stamped in the session and the remember cookie,
+    so this also works with cookie sessions. Returns the number of
+    server-side sessions deleted.
+    """
+    from .. import db
+    from ..models.user import revoke_user_sessions
+    principal_ids = list(principal_ids)
+    revoke_user_sessions([int(principal_id.split('-', 1)[1]) for principal_id in principal_ids
+                          if principal_id.startswith('user-')])
+    db.session.commit()
+    if isinstance(app.session_interface, ServerSideSessionInterface):
+        return app.session_interface.revoke(principal_ids)
+    return 0
@@ -0,0 +1,118 @@
+import json
+import math
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with relative-error guarantees (DDSketch style)
+
+    Values are counted in logarithmically sized buckets, so any quantile is
+    answered within ``relative_accuracy`` of the true value. The number of
+    buckets is capped, which keeps memory constant no matter how many values
+    are added; when the cap is hit the lowest buckets are collapsed together,
+    trading accuracy on the smallest values for the high percentiles we care
+    about.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_bins=1024, min_value=1e-3):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+
+    def _key(self, value):
+        return int(math.ceil(math.log(value) / self._log_gamma))
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value, count=1):
+        """Add a value (negative values are clamped to zero)"""
+        value = max(float(value), 0.0)
+        self.count += count
+        self.total += value * count
+        if value < self.min_value:
+            self.zero_count += count
+            return
+        key = self._key(value)
+        self.bins[key] = self.bins.get(key, 0) + count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def _collapse(self):
+        """Fold the lowest buckets together until the bin cap is respected"""
+        keys = sorted(self.bins)
+        overflow = len(keys) - self.max_bins
+        target = keys[overflow]
+        for key in keys[:overflow]:
+            self.bins[target] += self.bins.pop(key)
+
+    def merge(self, other):
+        """Merge another sketch with the same accuracy into this one"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('Cannot merge sketches with different accuracy')
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+        return self
+
+    def quantile(self, q):
+        """Estimate the q-th quantile (0 <= q <= 1), None if empty"""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.bins))
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def is_empty(self):
+        return self.count == 0
+
+    def to_dict(self):
+        """Convert sketch to a compact dictionary"""
+        return {
+            'a': self.relative_accuracy,
+            'm': self.max_bins,
+            'z': self.zero_count,
+            'n': self.count,
+            's': self.total,
+            'b': {str(key): count for key, count in self.bins.items()}
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), separators=(',', ':'))
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(relative_accuracy=data['a'], max_bins=data['m'])
+        sketch.zero_count = data['z']
+        sketch.count = data['n']
+        sketch.total = data['s']
+        sketch.bins = {int(key): count for key, count in data['b'].items()}
+        return sketch
+
+    @classmethod
+    def from_json(cls, payload):
+        if not payload:
+            return cls()
+        return cls.from_dict(json.loads(payload))
+
+    def __repr__(self):
+        return f'<QuantileSketch n={self.count} bins={len(self.bins)}>'
@@ -0,0 +1,79 @@
+import threading
+import zlib
+
+
+class SocketRegistry:
+    """Track the live Socket.IO sessions (sids) held by each principal in this process"""
+
+    def __init__(self):
+        self._sids = {}
+        self._owners = {}
+        self._lock = threading.Lock()
+
+    def register(self, principal_id, sid):
+        """Remember that a principal (e.g. 'user-5') owns a socket session"""
+        with self._lock:
+            self._sids.setdefault(principal_id, set()).add(sid)
+            self._owners[sid] = principal_id
+
+    def unregister(self, sid):
+        """Forget a socket session, returning its owner if known"""
+        with self._lock:
+            principal_id = self._owners.pop(sid, None)
+            sids = self._sids.get(principal_id)
+            if sids is not None:
+                sids.discard(sid)
+                if not sids:
+                    del self._sids[principal_id]
+            return principal_id
+
+    def sids_for(self, principal_ids):
+        """Get all sids owned by the given principals"""
+        with self._lock:
+            return [sid for principal_id in principal_ids for sid in self._sids.get(principal_id, ())]
+
+    def principals(self):
+        """Get the principals with at least one live socket"""
+        with self._lock:
+            return list(self._sids)
+
+    def connected_count(self):
+        """Get the number of live sockets"""
+        return len(self._owners)
+
+
+socket_registry = SocketRegistry()
+
+
+def disconnect_principals(socketio, principal_ids, rooms=()):
+    """Disconnect every live socket of the given principals
+
+    Sockets held by this process are closed directly; ``force_logout`` is also
+    emitted to the principals' rooms so clients connected to other workers
+    drop their connection too.
+    """
+    sids = socket_registry.sids_for(principal_ids)
+    for room in rooms:
+        socketio.emit('force_logout', {}, room=room)
+    for sid in sids:
+        socketio.server.disconnect(sid, namespace='/')
+    return len(sids)
+
+
+def broadcast_room(shards, user_id=None, sid=None):
+    """Get the broadcast shard room a socket should join"""
+    if user_id is not None:
+        return f'broadcast_{user_id % shards}'
+    return f'broadcast_{zlib.crc32(sid.encode()) % shards}'
+
+
+def paced_broadcast(socketio, event, data, shards, batch_size, pause):
+    """Emit an event to every broadcast shard room, a batch of rooms at a time
+
+    Sleeping between batches yields to the event loop so a broadcast to tens of
+    thousands of sockets never stalls chat and notifications for everyone else.
+    """
+    for start in range(0, shards, batch_size):
+        for shard in range(start, min(start + batch_size, shards)):
+            socketio.emit(event, data, room=f'broadcast_{shard}')
+        socketio.sleep(pause)
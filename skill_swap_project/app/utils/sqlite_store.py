@@ -0,0 +1,47 @@
+import os
+import sqlite3
+import threading
+
+
+class SQLiteStore:
+    """Embedded SQLite file in WAL mode with one connection per thread
+
+    Used for small pieces of state that every worker on a host must share
+    (rate-limit counters, server-side sessions) without a database round trip
+    to the primary.
+    """
+
+    def __init__(self, path, schema=()):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self.connection()
+        for statement in schema:
+            conn.execute(statement)
+
+    def connection(self):
+        """Get this thread's connection (autocommit; use BEGIN/COMMIT explicitly)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def transaction(self):
+        """Context manager running statements in a write (IMMEDIATE) transaction"""
+        return _Transaction(self.connection())
+
+
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
@@ -0,0 +1,164 @@
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+
+# Statuses a swap never leaves
+CLOSED_STATUSES = ('completed', 'cancelled', 'rejected')
+
+def archive_batch(older_than_days, batch_size):
+    """Move up to batch_size swaps closed for `older_than_days` into swap_archives, in one short transaction
+
+    The batch's swap rows are locked (skipping rows another worker holds)
+    only while their chat and transitions are read, compressed into the
+    archive rows and deleted, so live traffic never waits on the mover for
+    long. Returns the number of swaps archived.
+    """
+    from .. import db
+    from ..models import SwapRequest, ChatMessage, SwapTransition, SwapArchive
+
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    swaps = SwapRequest.query.filter(SwapRequest.status.in_(CLOSED_STATUSES),
+                                     SwapRequest.updated_at < cutoff)\
+                             .order_by(SwapRequest.id).limit(batch_size)\
+                             .with_for_update(skip_locked=True).all()
+    if not swaps:
+        db.session.rollback()
+        return 0
+    swap_ids = [swap.id for swap in swaps]
+
+    messages, transitions = defaultdict(list), defaultdict(list)
+    loaded = list(swaps)
+    for message in ChatMessage.query.filter(ChatMessage.swap_id.in_(swap_ids)).order_by(ChatMessage.created_at):
+        messages[message.swap_id].append(message)
+        loaded.append(message)
+    for transition in SwapTransition.query.filter(SwapTransition.swap_id.in_(swap_ids)).order_by(SwapTransition.id):
+        transitions[transition.swap_id].append(transition)
+        loaded.append(transition)
+    archives = [SwapArchive.from_swap(swap, messages[swap.id], transitions[swap.id]) for swap in swaps]
+    loaded.extend(archives)
+
+    try:
+        db.session.add_all(archives)
+        db.session.flush()
+        ChatMessage.query.filter(ChatMessage.swap_id.in_(swap_ids)).delete(synchronize_session=False)
+        SwapTransition.query.filter(SwapTransition.swap_id.in_(swap_ids)).delete(synchronize_session=False)
+        SwapRequest.query.filter(SwapRequest.id.in_(swap_ids)).delete(synchronize_session=False)
+        db.session.commit()
+    except IntegrityError:
+        # Another worker archived the same swaps first (databases without SKIP LOCKED)
+        db.session.rollback()
+        return 0
+    finally:
+        # The bulk deletes bypass the identity map, so drop the rows this batch loaded
+        for obj in loaded:
+            if obj in db.session:
+                db.session.expunge(obj)
+    return len(swap_ids)
+
+def archive_swaps(older_than_days, batch_size=200, pause=0.1, max_batches=None, sleep=None):
+    """Archive closed swaps batch by batch until none is left (or `max_batches` ran), returning the total moved
+
+    ``sleep`` (socketio.sleep in workers) runs between batches so the mover
+    yields to live traffic.
+    """
+    total = batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_batch(older_than_days, batch_size)
+        total += moved
+        batches += 1
+        if moved < batch_size:
+            break
+        if sleep:
+            sleep(pause)
+    return total
+
+class SwapArchiver:
+    """Periodically move old closed swaps and their chat out of the hot tables
+
+    Swaps completed, cancelled or rejected more than SWAP_ARCHIVE_AFTER_DAYS
+    ago are moved to swap_archives with their chat messages and status
+    transitions compressed into one blob, keeping swap_requests,
+    chat_messages and swap_transitions down to live data. Readers go through
+    SwapRequest.get_or_archived(), SwapRequest.get_user_requests() and
+    ChatMessage.get_swap_messages(), which fall back to the archive.
+
+    A worker starts a run in the background after a request once
+    SWAP_ARCHIVE_INTERVAL seconds have passed since its last one;
+    ``flask archive-swaps`` runs it by hand.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.after_days = 180
+        self.batch_size = 200
+        self.pause = 0.1
+        self.interval = 3600
+        self._last_run = time.monotonic()
+        self._running = False
+        self._lock = threading.Lock()
+        self._last_result = None
+
+    def init_app(self, app):
+        self.enabled = app.config.get('SWAP_ARCHIVE_ENABLED', True)
+        self.after_days = app.config.get('SWAP_ARCHIVE_AFTER_DAYS', self.after_days)
+        self.batch_size = app.config.get('SWAP_ARCHIVE_BATCH_SIZE', self.batch_size)
+        self.pause = app.config.get('SWAP_ARCHIVE_PAUSE', self.pause)
+        self.interval = app.config.get('SWAP_ARCHIVE_INTERVAL', self.interval)
+        if not self.enabled:
+            return
+
+        @app.after_request
+        def schedule_swap_archive(response):
+            self.maybe_start(app)
+            return response
+
+    def maybe_start(self, app):
+        """Start a background run when the interval has elapsed and none is running"""
+        if time.monotonic() - self._last_run < self.interval:
+            return
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._last_run = time.monotonic()
+        from .. import socketio
+        socketio.start_background_task(self.run, app)
+
+    def run(self, app):
+        """Background task: archive every swap that is due"""
+        from .. import socketio
+        started = datetime.utcnow()
+        try:
+            with app.app_context():
+                moved = archive_swaps(self.after_days, self.batch_size, self.pause, sleep=socketio.sleep)
+            self._last_result = {'started_at': started.isoformat(), 'archived': moved, 'error': None}
+        except Exception as exc:
+            app.logger.exception('Swap archive run failed')
+            self._last_result = {'started_at': started.isoformat(), 'archived': None,
+                                 'error': f'{type(exc).__name__}: {exc}'}
+        finally:
+            self._running = False
+
+    def stats(self):
+        """Get hot and archived swap counts and this worker's last run"""
+        from .. import db
+        from ..models import SwapRequest, ChatMessage, SwapArchive
+
+        cutoff = datetime.utcnow() - timedelta(days=self.after_days)
+        return {
+            'enabled': self.enabled,
+            'after_days': self.after_days,
+            'hot_swaps': SwapRequest.query.count(),
+            'hot_chat_messages': ChatMessage.query.count(),
+            'due': SwapRequest.query.filter(SwapRequest.status.in_(CLOSED_STATUSES),
+                                            SwapRequest.updated_at < cutoff).count(),
+            'archived_swaps': SwapArchive.query.count(),
+            'archived_chat_messages': int(db.session.query(db.func.sum(SwapArchive.message_count)).scalar() or 0),
+            'running': self._running,
+            'last_run': self._last_result
+        }
+
+
+swap_archiver = SwapArchiver()
@@ -0,0 +1,240 @@
+import atexit
+import ipaddress
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from flask import g, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Innermost open span of the sampled trace running in this context (None when not sampled)
+_current = ContextVar('trace_span', default=None)
+
+MAX_STATEMENT_LENGTH = 200
+
+class Span:
+    """One timed operation of a trace"""
+    __slots__ = ('trace', 'span_id', 'parent', 'name', 'start', 'duration', 'attrs')
+
+    def __init__(self, trace, name, parent=None, attrs=None):
+        self.trace = trace
+        self.span_id = len(trace.spans)
+        self.parent = parent
+        self.name = name
+        self.start = time.perf_counter()
+        self.duration = None
+        self.attrs = attrs or {}
+        trace.spans.append(self)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.start
+
+    def to_list(self):
+        """[id, parent id, name, start offset ms, duration ms, attributes]"""
+        origin = self.trace.spans[0].start
+        return [self.span_id, self.parent.span_id if self.parent else None, self.name,
+                round((self.start - origin) * 1000, 3),
+                round((self.duration or 0) * 1000, 3), self.attrs]
+
+class Trace:
+    """Spans recorded for one sampled request"""
+
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.timestamp = time.time()
+        self.spans = []
+
+    def to_json(self):
+        root = self.spans[0]
+        return json.dumps({
+            'trace': self.trace_id,
+            'ts': round(self.timestamp, 3),
+            'name': root.name,
+            'ms': round((root.duration or 0) * 1000, 3),
+            'attrs': root.attrs,
+            'spans': [span.to_list() for span in self.spans[1:]]
+        }, separators=(',', ':'), default=str)
+
+class Tracer:
+    """Head-sampled request tracing exported as JSON lines
+
+    Whether a request is traced is decided when it starts: an incoming W3C
+    ``traceparent`` header carries the caller's decision when the request
+    comes from TRACE_TRUSTED_SOURCES (e.g. the load balancer), otherwise a
+    TRACE_SAMPLE_RATE share of requests is picked at random, so clients
+    cannot force tracing on. Unsampled
+    requests only pay for that decision. A sampled request records spans for
+    the request, the view, each template render, each DB statement (the
+    parameterized SQL, never its values) and each Socket.IO emit, propagated
+    through a context variable. Finished traces are buffered and appended to
+    TRACE_FILE, one compact JSON object per line; once the file reaches
+    TRACE_FILE_MAX_BYTES it is rotated to TRACE_FILE.1 (replacing the
+    previous one). ``flask slow-traces`` lists the slowest ones.
+    """
+
+    def __init__(self):
+        self.sample_rate = 0.0
+        self.path = None
+        self.max_bytes = 50 * 1024 * 1024
+        self.trusted_sources = []
+        self.buffer_size = 100
+        self.flush_interval = 1.0
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._listening = False
+
+    def init_app(self, app):
+        self.sample_rate = app.config.get('TRACE_SAMPLE_RATE', self.sample_rate)
+        self.path = app.config.get('TRACE_FILE') or os.path.join(app.instance_path, 'traces.jsonl')
+        self.max_bytes = app.config.get('TRACE_FILE_MAX_BYTES', self.max_bytes)
+        self.trusted_sources = [ipaddress.ip_network(source.strip(), strict=False)
+                                for source in (app.config.get('TRACE_TRUSTED_SOURCES') or '').split(',')
+                                if source.strip()]
+        if not self._listening:
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            before_render_template.connect(_before_render_template)
+            template_rendered.connect(_template_rendered)
+            atexit.register(self.flush)
+            self._listening = True
+        # Blueprints are registered by now, so every view gets a span
+        for endpoint, view in list(app.view_functions.items()):
+            app.view_functions[endpoint] = _traced_view(endpoint, view)
+        app.before_request(self._start)
+        app.after_request(self._annotate_response)
+        app.teardown_request(self._finish)
+        app.extensions['tracer'] = self
+
+    def _trusted(self):
+        """Whether the request comes from a source allowed to make the sampling decision"""
+        try:
+            address = ipaddress.ip_address(request.remote_addr or '')
+        except ValueError:
+            return False
+        return any(address in network for network in self.trusted_sources)
+
+    def _sampled(self):
+        """Get (trace id, sampled) from a trusted traceparent header or a coin flip
+
+        An untrusted caller's trace id is kept for correlation, but its
+        sampled flag is not.
+        """
+        parts = request.headers.get('traceparent', '').split('-')
+        if len(parts) == 4 and len(parts[1]) == 32:
+            if self._trusted():
+                return parts[1], parts[3] == '01'
+            return parts[1], random.random() < self.sample_rate
+        return None, random.random() < self.sample_rate
+
+    def _start(self):
+        trace_id, sampled = self._sampled()
+        if not sampled:
+            return
+        trace = Trace(trace_id or '%032x' % random.getrandbits(128))
+        g.trace_root = Span(trace, f'{request.method} {request.path}',
+                            attrs={'endpoint': request.endpoint})
+        _current.set(g.trace_root)
+
+    def _annotate_response(self, response):
+        root = g.get('trace_root')
+        if root is not None:
+            root.attrs['status'] = response.status_code
+            response.headers['X-Trace-Id'] = root.trace.trace_id
+        return response
+
+    def _finish(self, exc):
+        root = g.pop('trace_root', None)
+        if root is None:
+            return
+        if exc is not None:
+            root.attrs['error'] = type(exc).__name__
+        root.finish()
+        _current.set(None)
+        self.export(root.trace)
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """Record a child span of the current span (no-op when the request is not sampled)"""
+        parent = _current.get()
+        if parent is None:
+            yield None
+            return
+        span = Span(parent.trace, name, parent, attrs)
+        _current.set(span)
+        try:
+            yield span
+        finally:
+            span.finish()
+            _current.set(parent)
+
+    def annotate(self, **attrs):
+        """Add attributes to the current span"""
+        span = _current.get()
+        if span is not None:
+            span.attrs.update(attrs)
+
+    def export(self, trace):
+        """Buffer a finished trace, appending the buffer to the trace file when due"""
+        line = trace.to_json()
+        with self._lock:
+            self._buffer.append(line)
+            due = (len(self._buffer) >= self.buffer_size or
+                   time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Append buffered traces to the trace file, rotating it once it is TRACE_FILE_MAX_BYTES"""
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+        if not lines or not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        try:
+            if self.max_bytes and os.path.getsize(self.path) >= self.max_bytes:
+                # Another worker may rotate at the same moment; losing one old file to that is fine
+                os.replace(self.path, self.path + '.1')
+        except FileNotFoundError:
+            pass
+        # One write per batch keeps lines from different workers from interleaving
+        with open(self.path, 'a', encoding='utf-8') as trace_file:
+            trace_file.write('\n'.join(lines) + '\n')
+
+
+tracer = Tracer()
+
+def _traced_view(endpoint, view):
+    @wraps(view)
+    def traced(*args, **kwargs):
+        with tracer.span('view', endpoint=endpoint):
+            return view(*args, **kwargs)
+    return traced
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current.get()
+    if parent is not None:
+        # Statements on a connection run one at a time; a failed one is simply overwritten
+        conn.info['trace_span'] = Span(parent.trace, 'db', parent, {'sql': statement[:MAX_STATEMENT_LENGTH]})
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = conn.info.pop('trace_span', None)
+    if span is not None:
+        span.finish()
+
+def _before_render_template(sender, template, context, **extra):
+    parent = _current.get()
+    if parent is not None:
+        _current.set(Span(parent.trace, 'template', parent, {'name': template.name}))
+
+def _template_rendered(sender, template, context, **extra):
+    span = _current.get()
+    if span is not None and span.name == 'template':
+        span.finish()
+        _current.set(span.parent)
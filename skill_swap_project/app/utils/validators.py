@@ -204,4 +204,17 @@ def format_time(dt):
         except ValueError:
             return dt
     
-    return dt.strftime('%I:%M %p') 
\ No newline at end of file
+    return dt.strftime('%I:%M %p')
+
+def format_duration(seconds):
+    """Format a duration in seconds for display"""
+    if seconds is None:
+        return "-"
+    
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.1f}m"
+    if seconds < 86400:
+        return f"{seconds / 3600:.1f}h"
+    return f"{seconds / 86400:.1f}d"
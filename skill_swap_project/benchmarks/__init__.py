@@ -0,0 +1 @@
+# Benchmarks package - performance scripts, run from the project root with `python -m benchmarks.<name>`
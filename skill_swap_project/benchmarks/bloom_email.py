@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Email Bloom filter benchmark: memory, build time, lookup cost and false positives
+
+Builds the filter used by /api/check-email over N synthetic registered emails,
+then probes N unregistered emails to measure the observed false positive rate.
+
+Usage: python -m benchmarks.bloom_email [--accounts 1000000] [--error-rate 0.01]
+"""
+
+import argparse
+import time
+from app.utils.bloom import BloomFilter
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--accounts', type=int, default=1000000)
+    parser.add_argument('--error-rate', type=float, default=0.01)
+    args = parser.parse_args()
+
+    bloom = BloomFilter(args.accounts, args.error_rate)
+
+    start = time.perf_counter()
+    for i in range(args.accounts):
+        bloom.add(f'user{i}@example.com')
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    false_positives = sum(1 for i in range(args.accounts) if f'visitor{i}@example.org' in bloom)
+    lookup_seconds = time.perf_counter() - start
+
+    misses = sum(1 for i in range(0, args.accounts, 97) if f'user{i}@example.com' not in bloom)
+
+    print(f'accounts:              {args.accounts:,}')
+    print(f'memory:                {bloom.memory_bytes / 1024 / 1024:.2f} MiB '
+          f'({bloom.num_bits:,} bits, {bloom.num_hashes} hashes)')
+    print(f'build:                 {build_seconds:.2f}s ({build_seconds / args.accounts * 1e6:.2f} us/email)')
+    print(f'lookup:                {lookup_seconds / args.accounts * 1e6:.2f} us/email')
+    print(f'expected FP rate:      {bloom.expected_error_rate():.4%}')
+    print(f'observed FP rate:      {false_positives / args.accounts:.4%}')
+    print(f'false negatives:       {misses} (must be 0)')
+
+if __name__ == '__main__':
+    main()
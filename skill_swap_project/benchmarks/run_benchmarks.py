@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark suite: latency percentiles and query counts per endpoint
+
+Drives the real routes (search, profiles, my swaps, chat over HTTP and
+Socket.IO, admin reports) through the Flask and Socket.IO test clients as a
+sample of seeded users and the default admin. Every call is timed and its
+queries counted, and the results are printed per endpoint (optionally saved
+as JSON to compare runs). Rate limiting is switched off for the run.
+
+Chat sends write real rows, so point DATABASE_URL at a scratch database
+seeded with `python -m benchmarks.seed_data` first.
+
+Usage: python -m benchmarks.run_benchmarks [--requests 50] [--users 20] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from benchmarks.login_storm import percentile
+from benchmarks.seed_data import SEED_PASSWORD, EMAIL_DOMAIN, LOCATIONS
+
+REPORT_TYPES = ('users', 'swaps', 'feedback', 'activity')
+
+class Recorder:
+    """Latencies (ms), query counts and errors per endpoint"""
+
+    def __init__(self):
+        self.results = {}
+
+    def measure(self, name, call):
+        from app.utils.query_stats import record_queries
+        with record_queries() as log:
+            start = time.perf_counter()
+            try:
+                ok = call()
+            except Exception:  # Propagated view errors (debug mode) count as failures
+                ok = False
+            elapsed = (time.perf_counter() - start) * 1000
+        result = self.results.setdefault(name, {'latencies': [], 'queries': [], 'errors': 0})
+        result['latencies'].append(elapsed)
+        result['queries'].append(log.count)
+        if not ok:
+            result['errors'] += 1
+
+    def summary(self):
+        rows = []
+        for name, result in self.results.items():
+            latencies, queries = result['latencies'], result['queries']
+            rows.append({
+                'endpoint': name,
+                'requests': len(latencies),
+                'errors': result['errors'],
+                'p50_ms': round(percentile(latencies, 0.5), 2),
+                'p90_ms': round(percentile(latencies, 0.9), 2),
+                'p99_ms': round(percentile(latencies, 0.99), 2),
+                'max_ms': round(max(latencies), 2),
+                'queries_avg': round(sum(queries) / len(queries), 1),
+                'queries_max': max(queries)
+            })
+        return rows
+
+def http_ok(response):
+    return response.status_code < 400
+
+def login(app, email, password, path='/login'):
+    """Get a test client logged in as the given account"""
+    client = app.test_client()
+    response = client.post(path, data={'email': email, 'password': password})
+    if response.status_code != 302:
+        raise SystemExit(f'Could not log in as {email} (status {response.status_code})')
+    return client
+
+def pick_participants(count, rng):
+    """Seeded users paired with an accepted swap they take part in"""
+    from app.models import SwapRequest, User
+    rows = SwapRequest.query.join(User, User.id == SwapRequest.requester_id)\
+                            .filter(SwapRequest.status == 'accepted',
+                                    User.email.like(f'%@{EMAIL_DOMAIN}'),
+                                    User.is_banned == False)\
+                            .with_entities(SwapRequest.requester_id, User.email, SwapRequest.id)\
+                            .limit(count * 20).all()
+    if not rows:
+        raise SystemExit('No seeded accepted swaps found; run `python -m benchmarks.seed_data` first')
+    return rng.sample(rows, min(count, len(rows)))
+
+def run(app, args):
+    from app import socketio
+    from app.models import Skill, User
+
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+
+    with app.app_context():
+        participants = pick_participants(args.users, rng)
+        skill_names = [name for (name,) in Skill.query.with_entities(Skill.name).limit(500)]
+        max_user_id = User.query.with_entities(User.id).order_by(User.id.desc()).first()[0]
+
+    sessions = [(login(app, email, SEED_PASSWORD), user_id, swap_id) for user_id, email, swap_id in participants]
+    admin = login(app, args.admin_email, args.admin_password, path='/admin/login')
+
+    scenarios = [
+        ('search:skill', lambda c, u, s: http_ok(c.get('/search', query_string={'skill': rng.choice(skill_names)}))),
+        ('search:location', lambda c, u, s: http_ok(
+            c.get('/search', query_string={'location': rng.choice([l for l in LOCATIONS if l])}))),
+        ('search:page', lambda c, u, s: http_ok(c.get('/search', query_string={'page': rng.randint(1, 20)}))),
+        ('profile', lambda c, u, s: http_ok(c.get('/profile'))),
+        ('view_user', lambda c, u, s: c.get(f'/user/{rng.randint(1, max_user_id)}').status_code < 500),
+        ('my_swaps', lambda c, u, s: http_ok(c.get('/swaps'))),
+        ('chat:page', lambda c, u, s: http_ok(c.get(f'/swap/{s}/chat'))),
+        ('chat:history', lambda c, u, s: http_ok(c.get(f'/api/swap/{s}/messages'))),
+        ('chat:send', lambda c, u, s: http_ok(c.post(f'/api/swap/{s}/messages', json={'message': 'Benchmark ping'}))),
+    ]
+
+    def socket_round_trip(client, user_id, swap_id):
+        """Connect, join the chat room and wait for our own message to come back"""
+        sio = socketio.test_client(app, flask_test_client=client)
+        sio.emit('join_swap_chat', {'swap_id': swap_id})
+        client.post(f'/api/swap/{swap_id}/messages', json={'message': 'Socket ping'})
+        received = [event for event in sio.get_received() if event['name'] == 'new_message']
+        sio.disconnect()
+        return bool(received)
+
+    for iteration in range(args.warmup + args.requests):
+        target = recorder if iteration >= args.warmup else Recorder()
+        client, user_id, swap_id = rng.choice(sessions)
+        for name, call in scenarios:
+            target.measure(name, lambda: call(client, user_id, swap_id))
+        target.measure('socket:chat_round_trip', lambda: socket_round_trip(client, user_id, swap_id))
+        if iteration % args.report_every == 0:
+            for report_type in REPORT_TYPES:
+                target.measure(f'admin:reports:{report_type}', lambda: http_ok(
+                    admin.get('/admin/reports', query_string={'type': report_type})))
+
+    return recorder.summary()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=50, help='measured iterations per endpoint')
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--users', type=int, default=20, help='number of seeded users to act as')
+    parser.add_argument('--report-every', type=int, default=10, help='run admin reports every N iterations')
+    parser.add_argument('--admin-email', default='admin@skillswap.com')
+    parser.add_argument('--admin-password', default='admin123')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    os.environ['RATE_LIMIT_ENABLED'] = '0'
+    from app import create_app
+    app = create_app()
+
+    rows = run(app, args)
+
+    print(f'{"endpoint":<28} {"n":>5} {"err":>4} {"p50 ms":>9} {"p90 ms":>9} {"p99 ms":>9} {"max ms":>9} '
+          f'{"queries":>8} {"max q":>6}')
+    for row in rows:
+        print(f'{row["endpoint"]:<28} {row["requests"]:>5} {row["errors"]:>4} {row["p50_ms"]:>9.2f} '
+              f'{row["p90_ms"]:>9.2f} {row["p99_ms"]:>9.2f} {row["max_ms"]:>9.2f} '
+              f'{row["queries_avg"]:>8.1f} {row["queries_max"]:>6}')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'args': vars(args), 'results': rows},
+                      f, indent=2)
+
+if __name__ == '__main__':
+    main()
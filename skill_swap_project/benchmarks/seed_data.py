@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Synthetic dataset generator: realistic users, skills, swaps, feedback and chat
+
+Rows are generated in memory and written with bulk multi-row INSERTs in
+batches, with primary keys assigned up front so foreign keys never need a
+round trip. Every generated user shares one password (SEED_PASSWORD), hashed
+once. Each user brings about 18 rows (4 skills, 3 availability slots, 2 swaps,
+1 feedback, 7 chat messages), so --users 10000 gives ~180k rows and
+--users 55000 gives ~1M.
+
+The bulk INSERTs bypass the ORM hooks that keep derived data current, so
+afterwards the skills are filed under taxonomy nodes named by their category
+labels and counted (as ``flask build-taxonomy`` does), and every user's
+"recommended for you" list is computed (``flask refresh-recommendations``);
+--skip-derived leaves both empty. The rest needs no rebuild: missing
+UserVersion rows read as all-zero stamps, trending-skill buckets only fill
+with live traffic, and each worker builds its email Bloom filter from the
+users table at startup.
+
+Usage: python -m benchmarks.seed_data [--users 10000] [--skills 400] [--seed 42]
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, time as dtime
+from app import create_app, db
+from app.models import Admin, User, Skill, UserSkill, Availability, SwapRequest, Feedback, ChatMessage, SkillCategory
+from app.utils.passwords import hash_password
+from app.utils.recommendations import recommender
+
+SEED_PASSWORD = 'seedpass123'
+EMAIL_DOMAIN = 'seed.skillswap.test'
+
+FIRST_NAMES = ['Aarav', 'Maya', 'Liam', 'Sofia', 'Noah', 'Priya', 'Ethan', 'Chloe', 'Arjun', 'Emma',
+               'Lucas', 'Zara', 'Mateo', 'Aisha', 'Oliver', 'Hana', 'Leo', 'Isla', 'Kabir', 'Nora',
+               'Diego', 'Mila', 'Omar', 'Ava', 'Ravi', 'Lena', 'Samuel', 'Yuki', 'Felix', 'Amara']
+LAST_NAMES = ['Sharma', 'Smith', 'Garcia', 'Chen', 'Patel', 'Johnson', 'Kim', 'Nguyen', 'Singh', 'Brown',
+              'Lopez', 'Ahmed', 'Martin', 'Rossi', 'Tanaka', 'Müller', 'Silva', 'Okafor', 'Dubois', 'Khan']
+LOCATIONS = ['Mumbai', 'Bangalore', 'Delhi', 'Pune', 'London', 'Berlin', 'New York', 'San Francisco',
+             'Toronto', 'Sydney', 'Singapore', 'Lagos', 'São Paulo', 'Tokyo', 'Paris', None]
+
+SKILL_CATALOG = {
+    'programming': ['Python', 'JavaScript', 'Rust', 'Go', 'SQL', 'React', 'Django', 'Flask', 'Java', 'C++'],
+    'design': ['Photoshop', 'Figma', 'Illustration', 'UI Design', 'Typography', 'Blender', '3D Modeling'],
+    'music': ['Guitar', 'Piano', 'Singing', 'Drums', 'Music Theory', 'Violin', 'Music Production'],
+    'languages': ['Spanish', 'French', 'German', 'Japanese', 'Hindi', 'Mandarin', 'English Conversation'],
+    'cooking': ['Baking', 'Italian Cooking', 'Indian Cooking', 'Vegan Cooking', 'Sushi', 'Pastry'],
+    'fitness': ['Yoga', 'Running', 'Weightlifting', 'Pilates', 'Swimming', 'Rock Climbing'],
+    'business': ['Excel', 'Public Speaking', 'Marketing', 'Accounting', 'Negotiation', 'Copywriting'],
+    'crafts': ['Knitting', 'Woodworking', 'Pottery', 'Photography', 'Calligraphy', 'Sewing'],
+}
+LEVELS = ['beginner', 'intermediate', 'expert']
+AVAILABILITY = ['available', 'busy', 'unavailable']
+
+# Final status distribution of generated swaps
+SWAP_STATUSES = [('pending', 0.30), ('accepted', 0.20), ('completed', 0.30), ('rejected', 0.12), ('cancelled', 0.08)]
+
+CHAT_LINES = ['Hi! When works for you?', 'How about Saturday morning?', 'Sounds good to me.',
+              'Could we push it by an hour?', 'Thanks, that session was great!', 'See you then.',
+              'I will share some notes before we start.', 'Do you prefer video or in person?']
+COMMENTS = ['Great teacher, very patient.', 'Helpful and well prepared.', 'Fun session, learned a lot.',
+            'Good swap, would do it again.', 'A bit rushed but useful.', None]
+
+class Ids:
+    """Hand out primary keys above the current maximum of each table"""
+
+    def __init__(self, *models):
+        self.next = {model: (db.session.query(db.func.max(model.id)).scalar() or 0) + 1 for model in models}
+
+    def take(self, model):
+        value = self.next[model]
+        self.next[model] += 1
+        return value
+
+class BulkWriter:
+    """Buffer rows per table and flush them as multi-row INSERTs
+
+    Tables are flushed together, in the order they were first seen, so
+    parent rows always reach the database before the rows referencing them.
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.buffers = {}
+        self.counts = {}
+
+    def add(self, model, row):
+        buffer = self.buffers.setdefault(model, [])
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        for model, rows in self.buffers.items():
+            if rows:
+                db.session.execute(db.insert(model.__table__), rows)
+                self.counts[model.__tablename__] = self.counts.get(model.__tablename__, 0) + len(rows)
+                self.buffers[model] = []
+        db.session.commit()
+
+def weighted_status(rng):
+    """Pick a final swap status following SWAP_STATUSES"""
+    roll = rng.random()
+    for status, weight in SWAP_STATUSES:
+        roll -= weight
+        if roll <= 0:
+            return status
+    return SWAP_STATUSES[-1][0]
+
+def seed_skills(writer, ids, rng, count, now):
+    """Create up to ``count`` skills (catalog names, then numbered variants), skipping existing names"""
+    existing = {name for (name,) in db.session.query(Skill.name)}
+    names = []
+    for category, skill_names in SKILL_CATALOG.items():
+        names.extend((name, category) for name in skill_names)
+    level = 2
+    while len(names) < count:
+        names.extend((f'{name} {level}', category) for category, skill_names in SKILL_CATALOG.items()
+                     for name in skill_names)
+        level += 1
+
+    for name, category in names[:count]:
+        if name in existing:
+            continue
+        created = now - timedelta(days=rng.randint(30, 720))
+        writer.add(Skill, {'id': ids.take(Skill), 'name': name, 'description': f'Learn {name}', 'category': category,
+                           'is_approved': rng.random() > 0.03, 'created_at': created, 'updated_at': created})
+
+def seed_users(writer, ids, rng, count, skills, password_hash, now):
+    """Create users with offered/wanted skills and availability slots"""
+    users = []
+    for _ in range(count):
+        user_id = ids.take(User)
+        created = now - timedelta(days=rng.randint(1, 720), seconds=rng.randint(0, 86400))
+        writer.add(User, {
+            'id': user_id,
+            'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'email': f'user{user_id}@{EMAIL_DOMAIN}',
+            'password_hash': password_hash,
+            'location': rng.choice(LOCATIONS),
+            'availability': rng.choice(AVAILABILITY),
+            'is_public': rng.random() > 0.1,
+            'is_banned': rng.random() < 0.01,
+            'created_at': created,
+            'updated_at': created
+        })
+
+        picked = rng.sample(skills, min(len(skills), 4))
+        offered = picked[:rng.randint(1, 3)]
+        for skill_type, chosen in (('offered', offered), ('wanted', picked[len(offered):])):
+            for skill_id, name in chosen:
+                writer.add(UserSkill, {'id': ids.take(UserSkill), 'user_id': user_id, 'skill_id': skill_id,
+                                       'skill_name': name, 'skill_type': skill_type,
+                                       'description': f'{skill_type.title()} {name}',
+                                       'proficiency_level': rng.choice(LEVELS), 'created_at': created})
+
+        for day in rng.sample(range(7), 3):
+            start_hour = rng.choice([8, 10, 14, 18])
+            writer.add(Availability, {'id': ids.take(Availability), 'user_id': user_id, 'day_of_week': day,
+                                      'start_time': dtime(start_hour), 'end_time': dtime(start_hour + 2),
+                                      'is_available': True, 'created_at': created})
+        users.append((user_id, [name for _, name in offered], created))
+    return users
+
+def seed_swaps(writer, ids, rng, users, swaps_per_user, now):
+    """Create swaps in every status, with feedback on completed ones and chat on accepted/completed ones"""
+    for _ in range(int(len(users) * swaps_per_user)):
+        requester, receiver = rng.sample(users, 2)
+        swap_id = ids.take(SwapRequest)
+        status = weighted_status(rng)
+        created = max(requester[2], receiver[2]) + timedelta(hours=rng.randint(1, 24 * 60))
+        created = min(created, now - timedelta(hours=1))
+        updated = created if status == 'pending' else min(created + timedelta(hours=rng.randint(1, 96)), now)
+        completed = min(updated + timedelta(days=rng.randint(1, 14)), now) if status == 'completed' else None
+        writer.add(SwapRequest, {
+            'id': swap_id,
+            'requester_id': requester[0],
+            'receiver_id': receiver[0],
+            'requester_skill': rng.choice(requester[1]),
+            'receiver_skill': rng.choice(receiver[1]),
+            'status': status,
+            'message': 'Would you like to swap skills?',
+            'created_at': created,
+            'updated_at': completed or updated,
+            'completed_at': completed
+        })
+
+        if status in ('accepted', 'completed'):
+            sent_at = updated
+            for _ in range(rng.randint(2, 12)):
+                sent_at = min(sent_at + timedelta(minutes=rng.randint(1, 600)), now)
+                writer.add(ChatMessage, {'id': ids.take(ChatMessage), 'swap_id': swap_id,
+                                         'sender_id': rng.choice((requester[0], receiver[0])),
+                                         'message': rng.choice(CHAT_LINES), 'message_type': 'text',
+                                         'created_at': sent_at})
+
+        if status == 'completed':
+            for rater, rated in ((requester, receiver), (receiver, requester)):
+                if rng.random() < 0.8:
+                    writer.add(Feedback, {'id': ids.take(Feedback), 'swap_id': swap_id, 'rater_id': rater[0],
+                                          'rated_user_id': rated[0], 'rating': rng.choices([1, 2, 3, 4, 5],
+                                                                                           [2, 3, 10, 35, 50])[0],
+                                          'comment': rng.choice(COMMENTS),
+                                          'created_at': min(completed + timedelta(hours=rng.randint(1, 72)), now)})
+
+def rebuild_derived():
+    """Rebuild what the ORM hooks would have kept up to date: taxonomy filing and counts, recommendations"""
+    started = time.perf_counter()
+    SkillCategory.file_by_label()
+    db.session.commit()
+    nodes = SkillCategory.rebuild_counts()
+    print(f'Filed skills and recounted {nodes} categories in {time.perf_counter() - started:.1f}s')
+    started = time.perf_counter()
+    refreshed = recommender.refresh_due()
+    print(f'Computed {refreshed} recommendation lists in {time.perf_counter() - started:.1f}s')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--skills', type=int, default=400)
+    parser.add_argument('--swaps-per-user', type=float, default=2.0)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-derived', action='store_true',
+                        help='Leave taxonomy counts and recommendations empty (see above)')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    app = create_app()
+    with app.app_context():
+        start = time.perf_counter()
+        now = datetime.utcnow()
+        # Tables first: Ids reads the current max(id) of each one
+        db.create_all()
+        Admin.create_default_admin()
+        ids = Ids(User, Skill, UserSkill, Availability, SwapRequest, Feedback, ChatMessage)
+        writer = BulkWriter(args.batch_size)
+        password_hash = hash_password(SEED_PASSWORD)
+
+        seed_skills(writer, ids, rng, args.skills, now)
+        writer.flush()
+        skills = [(skill_id, name) for skill_id, name in db.session.query(Skill.id, Skill.name).order_by(Skill.id)]
+        users = seed_users(writer, ids, rng, args.users, skills, password_hash, now)
+        writer.flush()
+        if len(users) >= 2:
+            seed_swaps(writer, ids, rng, users, args.swaps_per_user, now)
+        writer.flush()
+
+        elapsed = time.perf_counter() - start
+        total = sum(writer.counts.values())
+        for table, count in sorted(writer.counts.items()):
+            print(f'{table:<16} {count:>10,}')
+        print(f'{"total":<16} {total:>10,} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/s)')
+        if not args.skip_derived:
+            rebuild_derived()
+        print(f'Users log in as user<id>@{EMAIL_DOMAIN} with password {SEED_PASSWORD!r}')
+
+if __name__ == '__main__':
+    main()
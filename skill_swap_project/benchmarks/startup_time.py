@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: time to first request for a fresh worker
+
+Each run starts a new Python process (so nothing is cached in memory) that
+imports the app, calls create_app() and serves one request through the test
+client, timing each phase. The --legacy phase also performs what every boot
+used to do, db.create_all() plus default-admin seeding, to show what moving
+them to `flask init-db` / `flask create-admin` saves per worker.
+
+Usage: python -m benchmarks.startup_time [--runs 10] [--path /login]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from benchmarks.login_storm import percentile
+
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+from app import create_app, db
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+if sys.argv[2] == 'legacy':
+    from app.models import Admin
+    with app.app_context():
+        db.create_all()
+        Admin.create_default_admin()
+prepared = time.perf_counter()
+status = app.test_client().get(sys.argv[1]).status_code
+served = time.perf_counter()
+print(json.dumps({'import': imported - start, 'create_app': created - imported, 'boot_db': prepared - created,
+                  'first_request': served - prepared, 'total': served - start, 'status': status}))
+'''
+
+PHASES = ('import', 'create_app', 'boot_db', 'first_request', 'total')
+
+def measure(mode, runs, path):
+    """Start `runs` fresh workers and collect their phase timings (ms)"""
+    samples = {phase: [] for phase in PHASES}
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', CHILD, path, mode],
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        if result['status'] >= 500:
+            raise SystemExit(f'{path} returned {result["status"]}')
+        for phase in PHASES:
+            samples[phase].append(result[phase] * 1000)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--path', default='/login', help='URL of the first request')
+    parser.add_argument('--legacy', action='store_true', help='also time the old boot with create_all + admin seeding')
+    args = parser.parse_args()
+
+    modes = ['current'] + (['legacy'] if args.legacy else [])
+    print(f'{"mode":<9} {"phase":<14} {"p50 ms":>9} {"p90 ms":>9} {"max ms":>9}')
+    for mode in modes:
+        samples = measure(mode, args.runs, args.path)
+        for phase in PHASES:
+            values = samples[phase]
+            print(f'{mode:<9} {phase:<14} {percentile(values, 0.5):>9.1f} {percentile(values, 0.9):>9.1f} '
+                  f'{max(values):>9.1f}')
+
+if __name__ == '__main__':
+    main()
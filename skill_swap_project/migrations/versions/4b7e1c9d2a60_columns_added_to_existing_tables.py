@@ -0,0 +1,102 @@
+"""Columns, indexes and constraints added to tables that predate them
+
+Brings a schema created before these changes up to date: `flask init-db`
+creates the new tables, but create_all never alters existing ones.
+
+- users.deleted_at (indexed): soft-deleted accounts
+- users.sessions_revoked_at: logins issued before it are void
+- skills.category_id (foreign key to skill_categories, indexed): taxonomy node
+- feedback.swap_id: foreign key to swap_requests dropped (reviews outlive
+  archived swaps), indexed instead
+- skill_trend_buckets.updated_at (indexed): read-back watermark
+
+Every step checks the live schema first, so a database created by
+`flask init-db` after these changes is simply stamped.
+
+Revision ID: 4b7e1c9d2a60
+Revises:
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b7e1c9d2a60'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _columns(inspector, table):
+    return {column['name'] for column in inspector.get_columns(table)}
+
+
+def _indexes(inspector, table):
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def _foreign_keys(inspector, table, column):
+    return [fk for fk in inspector.get_foreign_keys(table) if fk['constrained_columns'] == [column]]
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+    sqlite = bind.dialect.name == 'sqlite'
+
+    columns = _columns(inspector, 'users')
+    if 'deleted_at' not in columns:
+        op.add_column('users', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    if 'ix_users_deleted_at' not in _indexes(inspector, 'users'):
+        op.create_index('ix_users_deleted_at', 'users', ['deleted_at'])
+    if 'sessions_revoked_at' not in columns:
+        op.add_column('users', sa.Column('sessions_revoked_at', sa.DateTime(), nullable=True))
+
+    if 'category_id' not in _columns(inspector, 'skills'):
+        op.add_column('skills', sa.Column('category_id', sa.Integer(), nullable=True))
+        # SQLite cannot add a constraint to an existing table (and does not enforce it by default)
+        if not sqlite:
+            op.create_foreign_key('fk_skills_category_id', 'skills', 'skill_categories', ['category_id'], ['id'])
+    if 'ix_skills_category_id' not in _indexes(inspector, 'skills'):
+        op.create_index('ix_skills_category_id', 'skills', ['category_id'])
+
+    # SQLite leaves the (unnamed, unenforced) constraint in place; dropping it would mean rebuilding the table
+    for fk in _foreign_keys(inspector, 'feedback', 'swap_id'):
+        if fk['name']:
+            op.drop_constraint(fk['name'], 'feedback', type_='foreignkey')
+    if 'ix_feedback_swap_id' not in _indexes(inspector, 'feedback'):
+        op.create_index('ix_feedback_swap_id', 'feedback', ['swap_id'])
+
+    if 'skill_trend_buckets' in tables:
+        if 'updated_at' not in _columns(inspector, 'skill_trend_buckets'):
+            op.add_column('skill_trend_buckets', sa.Column('updated_at', sa.DateTime(), nullable=True))
+        if 'ix_skill_trend_buckets_updated_at' not in _indexes(inspector, 'skill_trend_buckets'):
+            op.create_index('ix_skill_trend_buckets_updated_at', 'skill_trend_buckets', ['updated_at'])
+
+
+def downgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+    sqlite = bind.dialect.name == 'sqlite'
+
+    if 'skill_trend_buckets' in tables and 'updated_at' in _columns(inspector, 'skill_trend_buckets'):
+        op.drop_index('ix_skill_trend_buckets_updated_at', 'skill_trend_buckets')
+        op.drop_column('skill_trend_buckets', 'updated_at')
+
+    op.drop_index('ix_feedback_swap_id', 'feedback')
+    if not sqlite and not _foreign_keys(inspector, 'feedback', 'swap_id'):
+        op.create_foreign_key(None, 'feedback', 'swap_requests', ['swap_id'], ['id'])
+
+    for fk in _foreign_keys(inspector, 'skills', 'category_id'):
+        if fk['name']:
+            op.drop_constraint(fk['name'], 'skills', type_='foreignkey')
+    op.drop_index('ix_skills_category_id', 'skills')
+    op.drop_column('skills', 'category_id')
+
+    op.drop_column('users', 'sessions_revoked_at')
+    op.drop_index('ix_users_deleted_at', 'users')
+    op.drop_column('users', 'deleted_at')
@@ -0,0 +1,150 @@
+"""Query budgets of each blueprint's main pages
+
+The seeded data has more rows per page (users, skills, swaps, reviews) than
+any budget below, so a view that queries once per row fails here instead of
+slowing down in production. Budgets are upper bounds: lower them when a view
+gets cheaper, and raise one only with a reason.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.utils.query_stats import assert_max_queries
+
+USERS = 25
+
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp('query_counts')
+    # create_app reads its config from the environment; restored after this module
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        for key, value in {
+            'DATABASE_URL': f'sqlite:///{tmp / "app.db"}',
+            'SESSION_SQLITE_PATH': str(tmp / 'sessions.sqlite'),
+            'IDENTITY_CACHE_STAMP': str(tmp / 'identity_cache.stamp'),
+            'TRACE_SAMPLE_RATE': '0',
+            'RATE_LIMIT_ENABLED': '0',
+            'FRAGMENT_CACHE_ENABLED': '0',  # Budgets cover the uncached render
+            'PROFILER_ENABLED': '0',
+            'SWAP_ARCHIVE_ENABLED': '0',
+            'RECOMMENDATIONS_ENABLED': '0'
+        }.items():
+            monkeypatch.setenv(key, value)
+        from app import create_app, db
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+            _seed(db)
+        yield app
+
+
+def _seed(db):
+    from app.models import Admin, ChatMessage, Feedback, Skill, SwapRequest, User, UserSkill
+
+    Admin.create_default_admin()
+    python = Skill('Python', 'Programming in Python', category='programming')
+    guitar = Skill('Guitar', 'Acoustic guitar', category='music')
+    db.session.add_all([python, guitar])
+    users = [User(f'User {i}', f'user{i}@example.com', 'secret1', location='Berlin') for i in range(USERS)]
+    db.session.add_all([python, guitar] + users)
+    db.session.commit()
+    for user in users:
+        db.session.add(UserSkill(user.id, python.id, python.name, 'offered'))
+        db.session.add(UserSkill(user.id, guitar.id, guitar.name, 'wanted'))
+    alice = users[0]
+    done = datetime.utcnow() - timedelta(days=1)
+    for partner in users[1:]:
+        swap = SwapRequest(alice.id, partner.id, 'Guitar', 'Python', 'Swap?')
+        swap.status, swap.completed_at = 'completed', done
+        db.session.add(swap)
+        db.session.flush()
+        db.session.add(Feedback(swap.id, partner.id, alice.id, 5, 'Great'))
+        db.session.add(Feedback(swap.id, alice.id, partner.id, 4, 'Good'))
+    live = SwapRequest(users[1].id, alice.id, 'Python', 'Guitar', 'Again?')
+    live.status = 'accepted'
+    db.session.add(live)
+    db.session.flush()
+    for i in range(USERS):
+        db.session.add(ChatMessage(live.id, users[1 + i % 2].id if i % 2 else alice.id, f'Message {i}'))
+    db.session.commit()
+
+
+def _login(app, email, password, path='/login'):
+    client = app.test_client()
+    response = client.post(path, data={'email': email, 'password': password})
+    assert response.status_code == 302
+    return client
+
+
+@pytest.fixture(scope='module')
+def anonymous(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope='module')
+def user(app):
+    return _login(app, 'user0@example.com', 'secret1')
+
+
+@pytest.fixture(scope='module')
+def admin(app):
+    return _login(app, 'admin@skillswap.com', 'admin123', '/admin/login')
+
+
+@pytest.mark.parametrize('path, budget', [
+    ('/', 0),
+    ('/login', 0),
+    ('/register', 0)
+])
+def test_public_pages(anonymous, path, budget):
+    with assert_max_queries(budget):
+        assert anonymous.get(path).status_code == 200
+
+
+@pytest.mark.parametrize('path, budget', [
+    ('/profile', 14),
+    ('/search?skill=Python&type=offered', 7),
+    ('/skills/browse', 1),
+    ('/user/2', 12),
+    ('/api/users/2/skills', 4),
+    ('/api/skills/trending', 0)
+])
+def test_user_pages(user, path, budget):
+    with assert_max_queries(budget):
+        assert user.get(path).status_code == 200
+
+
+@pytest.mark.parametrize('path, budget', [
+    ('/swaps', 9),
+    ('/swap/{live}', 3),
+    ('/swap/{live}/chat', 4),
+    ('/api/swap/{live}/messages', 3)
+])
+def test_swap_pages(app, user, path, budget):
+    from app.models import SwapRequest
+    with app.app_context():
+        live = SwapRequest.query.filter_by(status='accepted').first().id
+    with assert_max_queries(budget):
+        assert user.get(path.format(live=live)).status_code == 200
+
+
+@pytest.mark.parametrize('path, budget', [
+    ('/api/user/1/rating', 3)
+])
+def test_feedback_pages(user, path, budget):
+    with assert_max_queries(budget):
+        assert user.get(path).status_code == 200
+
+
+@pytest.mark.parametrize('path, budget', [
+    ('/admin', 16),
+    ('/admin/users', 2),
+    ('/admin/skills', 3),
+    ('/admin/swaps', 2),
+    ('/admin/analytics', 7),
+    ('/metrics', 0)
+])
+def test_admin_pages(admin, path, budget):
+    with assert_max_queries(budget):
+        assert admin.get(path).status_code == 200